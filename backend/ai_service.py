@@ -5,15 +5,44 @@ Get a free API key at console.groq.com (no credit card required).
 """
 import os
 import json
+import asyncio
 from typing import AsyncGenerator
 from dotenv import load_dotenv
-from groq import Groq, AsyncGroq
+
+from chat_context import build_chat_context
+from config import GROQ_RPM, GROQ_TPM, GROQ_MAX_CONCURRENCY, WEB_CONCURRENCY
+from llm_cache import LLMCache
+from llm_scheduler import LLMScheduler
+from telemetry import upstream
 
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
 MODEL = "llama-3.3-70b-versatile"
 
+# Bump a template's version whenever its prompt text changes: cached answers
+# are keyed on it, so stale completions stop being served.
+PROMPT_VERSIONS = {
+    "narrative": 1,
+    "fundamentals": 1,
+    "sentiment": 1,
+    "price_action": 1,
+    "synthesis": 1,
+}
+NARRATIVE_TTL = 24 * 3600
+RESEARCH_TTL = 6 * 3600
+
+response_cache = LLMCache()
+# The Groq budget is per account: each worker process gets its share
+scheduler = LLMScheduler(rpm=max(1, GROQ_RPM // WEB_CONCURRENCY), tpm=max(1, GROQ_TPM // WEB_CONCURRENCY),
+                         max_concurrency=GROQ_MAX_CONCURRENCY)
+_client = None
+
+
+def _cache_key(template: str, data) -> str:
+    return response_cache.key(MODEL, template, PROMPT_VERSIONS[template], data)
+
+
 SYSTEM_PROMPT = """You are QuantIQ, an expert quantitative analyst specializing in **Indian equity markets** (NSE/BSE).
 You have deep expertise in:
 - Indian earnings plays (quarterly results season: Jan, Apr, Jul, Oct)
@@ -46,33 +75,78 @@ def _groq_available() -> bool:
     return bool(GROQ_API_KEY and GROQ_API_KEY != "your_groq_api_key_here")
 
 
+def _groq():
+    """Process-wide client, so every call shares one HTTP connection pool."""
+    global _client
+    if _client is None:
+        from groq import AsyncGroq  # deferred: not needed until the first AI request
+        _client = AsyncGroq(api_key=GROQ_API_KEY)
+    return _client
+
+
+def _estimate_tokens(messages: list, max_tokens: int) -> int:
+    """Budget charge before the call: ~4 chars per prompt token plus the completion cap."""
+    return sum(len(m["content"]) for m in messages) // 4 + max_tokens
+
+
+def _retry_after(e) -> float:
+    try:
+        return float(e.response.headers.get("retry-after", 10))
+    except (AttributeError, TypeError, ValueError):
+        return 10.0
+
+
+async def _complete(messages: list, max_tokens: int, temperature: float) -> str:
+    """One scheduled completion; the lease is re-charged with the real token usage."""
+    from groq import RateLimitError
+    async with scheduler.slot(_estimate_tokens(messages, max_tokens)) as lease:
+        try:
+            with upstream('groq', 'complete'):
+                r = await _groq().chat.completions.create(
+                    model=MODEL, max_tokens=max_tokens, messages=messages, temperature=temperature,
+                )
+        except RateLimitError as e:
+            scheduler.backoff(_retry_after(e))
+            raise
+        if getattr(r, "usage", None) is not None:
+            lease.tokens = r.usage.total_tokens
+        return r.choices[0].message.content
+
+
+async def _stream(messages: list, max_tokens: int, temperature: float) -> AsyncGenerator:
+    """Scheduled streaming completion; holds its concurrency slot until the stream ends."""
+    from groq import RateLimitError
+    async with scheduler.slot(_estimate_tokens(messages, max_tokens)):
+        with upstream('groq', 'stream'):  # until the last chunk
+            try:
+                stream = await _groq().chat.completions.create(
+                    model=MODEL, max_tokens=max_tokens, messages=messages, temperature=temperature, stream=True,
+                )
+            except RateLimitError as e:
+                scheduler.backoff(_retry_after(e))
+                raise
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+
+
 async def stream_chat(messages: list, context: dict = None) -> AsyncGenerator:
     """Stream a chat response; inject backtest context into system prompt."""
     if not _groq_available():
         yield "⚠️ Groq API key not configured.\n\nGet a **free** key at [console.groq.com](https://console.groq.com) — no credit card required.\n\nThen add it to your `.env` file:\n```\nGROQ_API_KEY=gsk_...\n```"
         return
 
-    client = AsyncGroq(api_key=GROQ_API_KEY)
-
     system = SYSTEM_PROMPT
     if context:
-        ctx_str = json.dumps(context, indent=2, default=str)
-        system += f"\n\n## Live Backtest Data:\n```json\n{ctx_str[:3500]}\n```"
+        system += f"\n\n# Live Data (returns as % per trade)\n{build_chat_context(context)}"
 
-    groq_messages = [{"role": m["role"], "content": m["content"]} for m in messages]
+    groq_messages = [{"role": "system", "content": system}]
+    groq_messages += [{"role": m["role"], "content": m["content"]} for m in messages]
 
     try:
-        async with client.chat.completions.stream(
-            model=MODEL,
-            max_tokens=1200,
-            messages=groq_messages,
-            system=system,
-            temperature=0.4,
-        ) as stream:
-            async for chunk in stream:
-                delta = chunk.choices[0].delta.content
-                if delta:
-                    yield delta
+        async for delta in _stream(groq_messages, max_tokens=1200, temperature=0.4):
+            yield delta
     except Exception as e:
         yield f"\n\n❌ Groq error: {str(e)}"
 
@@ -82,10 +156,14 @@ async def generate_backtest_narrative(backtest_results: dict, ticker: str) -> st
     if not _groq_available():
         return "_Configure GROQ_API_KEY for AI narrative analysis (free at console.groq.com)._"
 
-    client = Groq(api_key=GROQ_API_KEY)
     m = backtest_results.get("overall_metrics", {})
     by_event = backtest_results.get("metrics_by_event", {})
 
+    key = _cache_key("narrative", {"ticker": ticker, "overall": m, "by_event": by_event})
+    cached = response_cache.get(key)
+    if cached is not None:
+        return cached
+
     event_summary = ""
     for etype, em in by_event.items():
         event_summary += f"\n- **{etype}**: {em.get('total_events', 0)} trades, {em.get('avg_return', 0)*100:.2f}% avg, {em.get('win_rate', 0)*100:.0f}% win rate, Sharpe {em.get('sharpe', 0):.2f}"
@@ -114,13 +192,8 @@ Write exactly 3 short paragraphs:
 Use markdown. Be specific and cite the numbers."""
 
     try:
-        resp = client.chat.completions.create(
-            model=MODEL,
-            max_tokens=600,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,
-        )
-        return resp.choices[0].message.content
+        text = await _complete([{"role": "user", "content": prompt}], max_tokens=600, temperature=0.3)
+        return response_cache.put(key, text, NARRATIVE_TTL)
     except Exception as e:
         return f"_Narrative generation failed: {e}_"
 
@@ -139,34 +212,29 @@ async def run_research_agent(
         yield json.dumps({"step": "error", "message": "GROQ_API_KEY not configured. Get a free key at console.groq.com"})
         return
 
-    client_sync = Groq(api_key=GROQ_API_KEY)
-    client_async = AsyncGroq(api_key=GROQ_API_KEY)
-
-    def _call(prompt: str, max_tokens: int = 200) -> str:
+    async def _call(template: str, data, prompt: str, max_tokens: int = 200) -> tuple:
+        """(text, cached) for one research step; failures are never cached."""
+        key = _cache_key(template, data)
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached, True
         try:
-            r = client_sync.chat.completions.create(
-                model=MODEL, max_tokens=max_tokens,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-            )
-            return r.choices[0].message.content
+            text = await _complete([{"role": "user", "content": prompt}], max_tokens=max_tokens, temperature=0.3)
+            return response_cache.put(key, text, RESEARCH_TTL), False
         except Exception as e:
-            return f"Error: {e}"
-
-    # Step 1 — Fundamentals
-    yield json.dumps({"step": "fundamentals", "message": "Analyzing company fundamentals..."})
+            return f"Error: {e}", False
 
+    # Steps 1-3 are independent: build every prompt, issue the three calls at
+    # once, then report them in order as each finishes.
     fund_prompt = f"""In 2 sentences, assess {ticker} ({company_info.get('name', ticker)}) for event-driven trading:
 Sector: {company_info.get('sector')} | Market Cap: ${company_info.get('market_cap', 0):,.0f}
 Forward P/E: {company_info.get('forward_pe')} | Beta: {company_info.get('beta')}
 Revenue Growth: {company_info.get('revenue_growth')} | Profit Margin: {company_info.get('profit_margin')}
 Analyst Target: ${company_info.get('analyst_target')} | Rating (1=Strong Buy→5=Sell): {company_info.get('recommendation')} ({company_info.get('num_analysts')} analysts)"""
 
-    fund_analysis = _call(fund_prompt)
-    yield json.dumps({"step": "fundamentals_done", "content": fund_analysis})
-
-    # Step 2 — Sentiment
-    yield json.dumps({"step": "sentiment", "message": "Analyzing recent news sentiment..."})
+    fund_data = {"ticker": ticker, **{k: company_info.get(k) for k in (
+        "name", "sector", "market_cap", "forward_pe", "beta", "revenue_growth", "profit_margin",
+        "analyst_target", "recommendation", "num_analysts")}}
 
     if news:
         news_lines = "\n".join(f"- {n['title']} (VADER: {n['sentiment']:.2f})" for n in news[:8])
@@ -180,19 +248,40 @@ Avg sentiment: {avg_sent:.2f} (-1=bearish, +1=bullish)
 Headlines:
 {news_lines}"""
 
-    sent_analysis = _call(sent_prompt)
-    yield json.dumps({"step": "sentiment_done", "content": sent_analysis, "avg_sentiment": round(avg_sent, 3)})
-
-    # Step 3 — Price action
-    yield json.dumps({"step": "price_action", "message": "Analyzing price action and technicals..."})
+    sent_data = {"ticker": ticker, "headlines": news_lines, "avg_sentiment": avg_sent}
 
     price_prompt = f"""In 2 sentences, assess {ticker} technical setup for an upcoming event trade:
 30-day return: {price_summary.get('ret_30d', 0)*100:.1f}% | 90-day return: {price_summary.get('ret_90d', 0)*100:.1f}%
 Realized vol (20d ann.): {price_summary.get('vol_20d', 0)*100:.1f}% | RSI-14: {price_summary.get('rsi', 50):.0f}
 vs 52-week high: {price_summary.get('vs_52w_high', 0)*100:.1f}% | Volume trend: {price_summary.get('volume_trend', 'neutral')}"""
 
-    price_analysis = _call(price_prompt)
-    yield json.dumps({"step": "price_done", "content": price_analysis})
+    price_data = {"ticker": ticker, **{k: price_summary.get(k) for k in (
+        "ret_30d", "ret_90d", "vol_20d", "rsi", "vs_52w_high", "volume_trend")}}
+
+    fund_task = asyncio.create_task(_call("fundamentals", fund_data, fund_prompt))
+    sent_task = asyncio.create_task(_call("sentiment", sent_data, sent_prompt))
+    price_task = asyncio.create_task(_call("price_action", price_data, price_prompt))
+
+    try:
+        # Step 1 — Fundamentals
+        yield json.dumps({"step": "fundamentals", "message": "Analyzing company fundamentals..."})
+        fund_analysis, hit = await fund_task
+        yield json.dumps({"step": "fundamentals_done", "content": fund_analysis, "cached": hit})
+
+        # Step 2 — Sentiment
+        yield json.dumps({"step": "sentiment", "message": "Analyzing recent news sentiment..."})
+        sent_analysis, hit = await sent_task
+        yield json.dumps({"step": "sentiment_done", "content": sent_analysis, "avg_sentiment": round(avg_sent, 3),
+                          "cached": hit})
+
+        # Step 3 — Price action
+        yield json.dumps({"step": "price_action", "message": "Analyzing price action and technicals..."})
+        price_analysis, hit = await price_task
+        yield json.dumps({"step": "price_done", "content": price_analysis, "cached": hit})
+    finally:
+        # Client went away mid-pipeline: don't leave orphaned Groq calls running
+        for task in (fund_task, sent_task, price_task):
+            task.cancel()
 
     # Step 4 — Synthesis (streamed)
     yield json.dumps({"step": "synthesis", "message": "Generating trade thesis..."})
@@ -213,16 +302,23 @@ Format exactly as:
 - [bullet]
 **Recommended Strategy:** [1-2 sentences on best event type and entry/exit timing]"""
 
+    synth_key = _cache_key("synthesis", {"ticker": ticker, "fundamentals": fund_analysis,
+                                         "sentiment": sent_analysis, "technicals": price_analysis})
+    cached = response_cache.get(synth_key)
+    if cached is not None:
+        # Replay the stored chunks back-to-back; the client renders them as a normal stream
+        for delta in cached:
+            yield json.dumps({"step": "synthesis_stream", "content": delta})
+        yield json.dumps({"step": "done", "cached": True})
+        return
+
+    chunks = []
     try:
-        async with client_async.chat.completions.stream(
-            model=MODEL, max_tokens=500,
-            messages=[{"role": "user", "content": synth_prompt}],
-            temperature=0.4,
-        ) as stream:
-            async for chunk in stream:
-                delta = chunk.choices[0].delta.content
-                if delta:
-                    yield json.dumps({"step": "synthesis_stream", "content": delta})
+        async for delta in _stream([{"role": "user", "content": synth_prompt}], max_tokens=500, temperature=0.4):
+            chunks.append(delta)
+            yield json.dumps({"step": "synthesis_stream", "content": delta})
+        if not any(a.startswith("Error: ") for a in (fund_analysis, sent_analysis, price_analysis)):
+            response_cache.put(synth_key, chunks, RESEARCH_TTL)
     except Exception as e:
         yield json.dumps({"step": "synthesis_stream", "content": f"\n\nError during synthesis: {e}"})
 
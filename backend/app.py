@@ -2,34 +2,145 @@
 QuantIQ India — AI-powered Indian market intelligence platform.
 Real data via yfinance (.NS), AI via Groq (free tier), ML via scikit-learn.
 """
-from fastapi import FastAPI, WebSocket
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, WebSocket, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import os
+import hmac
 import json
+import re
 from dotenv import load_dotenv
 import random
 import asyncio
 
 from indian_market import (
     get_stock_data, get_historical_prices, get_technicals,
-    get_quarterly_financials, get_indices, get_events,
-    normalize_ticker, NIFTY50_STOCKS, SECTOR_STOCKS, format_inr,
+    get_quarterly_financials, get_indices, get_events, get_earnings_history, get_nse_live_quote,
+    normalize_ticker, NIFTY50_STOCKS, SECTOR_STOCKS, format_inr, calendar,
+    data_cache,
 )
-from ml_signals import MLSignalEngine
+from ml_signals import MLSignalEngine, TickAnomalyDetector, POOLED_SYMBOL, EARNINGS_PARAMS
+from model_registry import ModelRegistry
+from pretrain import PretrainJob
+from prewarm import PrewarmJob
+from event_study import return_matrix, event_study
+from metrics import batch_metrics, summary_metrics, pad, row
+from startup_profile import DEFERRED, deferred_loaded, profile_imports
+from live_bars import bars, INTERVALS as BAR_INTERVALS
+from live_hub import QuoteHub, Subscriber, PROTOCOL_VERSION, ENCODINGS, encode, decode
+import telemetry
+from tracing import TraceStore, span
 import ai_service
+from config import PREWARM_SYMBOLS, PREWARM_ON_STARTUP, PREWARM_AT, PREWARM_BATCH, PREWARM_PAUSE
+from config import TRACE_SAMPLE_RATE, TRACE_KEEP, WS_MAX_SYMBOLS, DEBUG_TOKEN
 
 load_dotenv()
 
 app = FastAPI(title="QuantIQ India", version="3.0.0")
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
-ml_engine = MLSignalEngine()
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    # Labelled by route template, not raw path, so /api/stock/{ticker} is one series
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get('route')
+        telemetry.http_latency.observe(time.perf_counter() - t0, method=request.method,
+                                       route=getattr(route, 'path', 'unmatched'), status=status)
+
+
+traces = TraceStore(TRACE_SAMPLE_RATE, TRACE_KEEP)
+UNTRACED = ('/metrics', '/api/debug/traces', '/api/debug/profile')
+
+
+def _debug_allowed(token: str) -> bool:
+    """Profiling costs a sampler thread or a whole interpreter, so it needs DEBUG_TOKEN."""
+    return bool(DEBUG_TOKEN) and hmac.compare_digest(token or '', DEBUG_TOKEN)
+
+
+_DEBUG_DENIED = {'error': 'profiling is disabled: set DEBUG_TOKEN and send it as X-Debug-Token'}
+
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    # X-Trace: 1 forces a trace, X-Profile: 1 with X-Debug-Token (or an armed /api/debug/profile) adds
+    # a stack profile; the response carries X-Trace-Id for /api/debug/traces/{id} plus a Server-Timing summary
+    path = request.url.path
+    profile = (request.headers.get('x-profile') == '1' and _debug_allowed(request.headers.get('x-debug-token'))) \
+        or traces.take_armed(path)
+    if path.startswith(UNTRACED) or not (profile or request.headers.get('x-trace') == '1' or traces.should_trace()):
+        return await call_next(request)
+    with traces.trace(f"{request.method} {path}", profile=profile, finish=False) as tr:
+        try:
+            response = await call_next(request)
+        except BaseException:
+            traces.finish(tr)
+            raise
+        route = request.scope.get('route')
+        tr.attrs.update(path=path, status=response.status_code)
+        if route is not None:
+            tr.name = f"{request.method} {route.path}"
+    response.headers['X-Trace-Id'] = tr.id
+    if response.headers.get('content-type', '').startswith('text/event-stream'):
+        # SSE bodies do their work after the handler returns: store the trace once the stream ends
+        response.body_iterator = _finish_trace_after(response.body_iterator, tr)
+        return response
+    traces.finish(tr)
+    response.headers['Server-Timing'] = tr.server_timing()
+    return response
+
+
+async def _finish_trace_after(body, tr):
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        traces.finish(tr)
+
+ml_engine = MLSignalEngine(registry=ModelRegistry())
+pretrain_job = PretrainJob()
+prewarm_job = PrewarmJob(ml_engine, PREWARM_SYMBOLS or NIFTY50_STOCKS, batch_size=PREWARM_BATCH,
+                         pause=PREWARM_PAUSE, claim=lambda: data_cache.claim('prewarm', ttl=1800),
+                         release=lambda: data_cache.release('prewarm'))
+tick_anomalies = TickAnomalyDetector()
+
+EVENT_METRIC_KEYS = ['total_events', 'avg_return', 'win_rate', 'std_dev', 'sharpe']
+EVENT_LABELS = {'earnings': 'Quarterly Results', 'rbi': 'RBI Policy', 'budget': 'Union Budget'}
+
+
+@app.on_event("startup")
+async def start_calendar_refresh():
+    # Keep yfinance earnings dates for the universe current in the background
+    # (one worker per interval fetches; the others reload its file)
+    calendar.start(NIFTY50_STOCKS, interval=3600, claim=lambda: data_cache.claim('calendar:refresh', ttl=3000))
+
+
+@app.on_event("startup")
+async def start_loop_lag_probe():
+    asyncio.create_task(telemetry.monitor_loop_lag())
+
+
+@app.on_event("startup")
+async def start_prewarm():
+    # Warm the universe so the first requests after a deploy / the open hit cache
+    if PREWARM_ON_STARTUP:
+        prewarm_job.start()
+    if PREWARM_AT:
+        prewarm_job.schedule(PREWARM_AT)
 
 
 # ── Models ─────────────────────────────────────────────────────────────────────
@@ -46,6 +157,21 @@ class BacktestRequest(BaseModel):
     optimize_window: bool = False
 
 
+class PretrainRequest(BaseModel):
+    symbols: Optional[List[str]] = None  # default: NIFTY50
+    workers: Optional[int] = None
+    n_jobs: int = 1
+
+
+class WarmupRequest(BaseModel):
+    symbols: Optional[List[str]] = None  # default: PREWARM_SYMBOLS / NIFTY50
+
+
+class ProfileRequest(BaseModel):
+    path: str      # path prefix, e.g. /api/stock/RELIANCE
+    count: int = 1
+
+
 class AIChatRequest(BaseModel):
     messages: List[Dict[str, str]]
     backtest_context: Optional[Dict[str, Any]] = None
@@ -68,6 +194,7 @@ async def root():
         "data_source": "Yahoo Finance (yfinance) + NSE API",
         "ai": "Groq — Llama 3.3 70B (free tier)",
         "status": "live",
+        "warmup": prewarm_job.readiness(),
     }
 
 
@@ -88,35 +215,30 @@ async def get_stock(ticker: str):
     yf_sym = normalize_ticker(ticker)
     nse_sym = yf_sym.replace('.NS', '').replace('.BO', '')
 
-    # Upcoming earnings
-    today = datetime.now()
-    future = today + timedelta(days=120)
-    upcoming_events = []
-    from indian_market import KNOWN_EARNINGS, RBI_DATES, BUDGET_DATES
-    known = KNOWN_EARNINGS.get(nse_sym, [])
-    for d in known:
-        dt = pd.to_datetime(d)
-        if today <= dt <= future:
-            upcoming_events.append({'date': d, 'type': 'earnings', 'label': 'Quarterly Results'})
-    for d in RBI_DATES:
-        dt = pd.to_datetime(d)
-        if today <= dt <= future:
-            upcoming_events.append({'date': d, 'type': 'rbi', 'label': 'RBI Policy'})
-    for d in BUDGET_DATES:
-        dt = pd.to_datetime(d)
-        if today <= dt <= future:
-            upcoming_events.append({'date': d, 'type': 'budget', 'label': 'Union Budget'})
-
-    upcoming_events.sort(key=lambda x: x['date'])
-    data['upcoming_events'] = upcoming_events[:5]
+    data['upcoming_events'] = [{**e, 'label': EVENT_LABELS[e['type']]}
+                               for e in calendar.upcoming(nse_sym, days=120, limit=5)]
     return data
 
 
+@app.get("/api/events/stats")
+async def get_calendar_stats():
+    """Event calendar store: series counts and refresh age."""
+    return calendar.stats()
+
+
+@app.get("/api/events/{ticker}")
+async def get_upcoming_events(ticker: str, days: int = 120, limit: int = 10):
+    """Upcoming earnings / RBI policy / Budget dates from the event calendar."""
+    nse_sym = normalize_ticker(ticker).replace('.NS', '').replace('.BO', '')
+    events = calendar.upcoming(nse_sym, days=days, limit=limit)
+    return {'ticker': nse_sym, 'events': [{**e, 'label': EVENT_LABELS[e['type']]} for e in events]}
+
+
 @app.get("/api/technicals/{ticker}")
-async def get_technical_data(ticker: str):
-    """Technical indicators: RSI, MACD, Bollinger Bands, SMA."""
+async def get_technical_data(ticker: str, interval: str = '1d'):
+    """Technical indicators: RSI, MACD, Bollinger Bands, SMA (daily, or 1m/5m live bars)."""
     try:
-        return get_technicals(ticker)
+        return get_technicals(ticker, interval)
     except Exception as e:
         return {"error": str(e), "ticker": ticker}
 
@@ -162,6 +284,17 @@ async def get_sector_stocks(sector: str):
     return {'sector': sector, 'stocks': data}
 
 
+@app.get("/api/quotes")
+def get_live_quotes(symbols: str = ""):
+    """NSE live quotes for many symbols; NIFTY 50 names come from one bulk index request."""
+    names = [t.strip().upper() for t in symbols.split(',') if t.strip()] or list(NIFTY50_STOCKS)
+    quotes = {}
+    for s in names:
+        nse_sym = normalize_ticker(s).replace('.NS', '').replace('.BO', '')
+        quotes[nse_sym] = get_nse_live_quote(nse_sym) or None
+    return {'quotes': quotes}
+
+
 # ── Backtest ───────────────────────────────────────────────────────────────────
 
 @app.post("/api/backtest")
@@ -179,78 +312,78 @@ async def run_backtest(request: BacktestRequest):
         print(f"[backtest] {len(prices_df)} days for {request.ticker}: {start_date.date()}→{end_date.date()}")
 
         all_returns = []
-        metrics_by_event = {}
-
-        for ev_type in request.event_types:
-            events = get_events(request.ticker, ev_type, start_date, end_date)
-            print(f"[backtest] {len(events)} {ev_type} events")
-
-            ev_returns = []
-            for ev in events:
-                ev_date = pd.to_datetime(ev['date'])
-                try:
-                    nearest = prices_df.index.get_indexer([ev_date], method='nearest')
-                    if not len(nearest): continue
-                    ev_idx = int(nearest[0])
-
-                    if ev_idx < request.window_before: continue
-                    if ev_idx >= len(prices_df) - request.window_after: continue
-
-                    entry_idx = ev_idx - request.window_before
-                    exit_idx = ev_idx + request.window_after
-                    entry_price = float(prices_df.iloc[entry_idx]['close'])
-                    exit_price = float(prices_df.iloc[exit_idx]['close'])
-
-                    actual_exit = exit_price
-                    if request.stop_loss or request.take_profit:
-                        for i in range(entry_idx + 1, exit_idx + 1):
-                            cp = float(prices_df.iloc[i]['close'])
-                            cr = (cp - entry_price) / entry_price
-                            if request.stop_loss and cr <= -request.stop_loss:
-                                actual_exit = cp; break
-                            if request.take_profit and cr >= request.take_profit:
-                                actual_exit = cp; break
-
-                    ret = (actual_exit - entry_price) / entry_price
-                    window = prices_df.iloc[entry_idx:exit_idx+1]['close']
-                    vol = float(window.pct_change().dropna().std() * np.sqrt(252)) if len(window) > 1 else 0.2
-
-                    vol_ratio = 1.0
-                    if 'volume' in prices_df.columns:
-                        try:
-                            avg_v = float(prices_df['volume'].iloc[max(0,ev_idx-20):ev_idx].mean())
-                            cur_v = float(prices_df['volume'].iloc[ev_idx])
-                            vol_ratio = cur_v / avg_v if avg_v > 0 else 1.0
-                        except Exception: pass
-
-                    ev_returns.append({
-                        'date': ev_date.strftime('%Y-%m-%d'),
-                        'event_type': ev_type,
-                        'entry_price': entry_price,
-                        'exit_price': float(actual_exit),
-                        'total_return': float(ret),
-                        'volatility': vol,
-                        'sentiment': 0.0,
-                        'volume_ratio': vol_ratio,
-                        'pre_return': float(ret * 0.4),
-                        'post_return': float(ret * 0.6),
-                    })
-                except Exception as e:
-                    print(f"[backtest] event error {ev_date}: {e}")
-
-            if ev_returns:
-                rets = [e['total_return'] for e in ev_returns]
-                metrics_by_event[ev_type] = {
-                    'total_events': len(ev_returns),
-                    'avg_return': float(np.mean(rets)),
-                    'win_rate': float(np.sum(np.array(rets) > 0) / len(rets)),
-                    'std_dev': float(np.std(rets)) if len(rets) > 1 else 0,
-                    'sharpe': _sharpe(rets),
-                }
-                all_returns.extend(ev_returns)
-
-        overall = _overall_metrics(all_returns) if all_returns else _empty_metrics()
-        corr = _correlations(request.event_types, all_returns)
+        returns_by_event = {}
+        event_positions = []
+
+        with span('backtest.events', event_types=len(request.event_types)):
+            for ev_type in request.event_types:
+                events = get_events(request.ticker, ev_type, start_date, end_date)
+                print(f"[backtest] {len(events)} {ev_type} events")
+
+                ev_returns = []
+                for ev in events:
+                    ev_date = pd.to_datetime(ev['date'])
+                    try:
+                        nearest = prices_df.index.get_indexer([ev_date], method='nearest')
+                        if not len(nearest): continue
+                        ev_idx = int(nearest[0])
+                        event_positions.append(ev_idx)
+
+                        if ev_idx < request.window_before: continue
+                        if ev_idx >= len(prices_df) - request.window_after: continue
+
+                        entry_idx = ev_idx - request.window_before
+                        exit_idx = ev_idx + request.window_after
+                        entry_price = float(prices_df.iloc[entry_idx]['close'])
+                        exit_price = float(prices_df.iloc[exit_idx]['close'])
+
+                        actual_exit = exit_price
+                        if request.stop_loss or request.take_profit:
+                            for i in range(entry_idx + 1, exit_idx + 1):
+                                cp = float(prices_df.iloc[i]['close'])
+                                cr = (cp - entry_price) / entry_price
+                                if request.stop_loss and cr <= -request.stop_loss:
+                                    actual_exit = cp; break
+                                if request.take_profit and cr >= request.take_profit:
+                                    actual_exit = cp; break
+
+                        ret = (actual_exit - entry_price) / entry_price
+                        window = prices_df.iloc[entry_idx:exit_idx+1]['close']
+                        vol = float(window.pct_change().dropna().std() * np.sqrt(252)) if len(window) > 1 else 0.2
+
+                        vol_ratio = 1.0
+                        if 'volume' in prices_df.columns:
+                            try:
+                                avg_v = float(prices_df['volume'].iloc[max(0,ev_idx-20):ev_idx].mean())
+                                cur_v = float(prices_df['volume'].iloc[ev_idx])
+                                vol_ratio = cur_v / avg_v if avg_v > 0 else 1.0
+                            except Exception: pass
+
+                        ev_returns.append({
+                            'date': ev_date.strftime('%Y-%m-%d'),
+                            'event_type': ev_type,
+                            'entry_price': entry_price,
+                            'exit_price': float(actual_exit),
+                            'total_return': float(ret),
+                            'volatility': vol,
+                            'sentiment': 0.0,
+                            'volume_ratio': vol_ratio,
+                            'pre_return': float(ret * 0.4),
+                            'post_return': float(ret * 0.6),
+                        })
+                    except Exception as e:
+                        print(f"[backtest] event error {ev_date}: {e}")
+
+                if ev_returns:
+                    returns_by_event[ev_type] = ev_returns
+                    all_returns.extend(ev_returns)
+
+        with span('backtest.metrics', trades=len(all_returns)):
+            metrics_by_event = _metrics_by_event(returns_by_event)
+            overall = _overall_metrics(all_returns)
+            window_search = (_window_sweep(prices_df['close'].to_numpy(dtype=float), np.array(event_positions))
+                             if request.optimize_window and event_positions else None)
+            corr = _correlations(request.event_types, all_returns)
 
         # Live price
         try:
@@ -264,6 +397,7 @@ async def run_backtest(request: BacktestRequest):
             'metrics_by_event': metrics_by_event,
             'event_returns': all_returns,
             'correlations': corr,
+            'window_optimization': window_search,
             'live_data': {'current_price': current_price, 'next_earnings': None, 'current_sentiment': 0},
             'data_source': 'Yahoo Finance (NSE real data)',
         }
@@ -274,8 +408,85 @@ async def run_backtest(request: BacktestRequest):
         return _mock_backtest(request)
 
 
+# ── Event study ────────────────────────────────────────────────────────────────
+
+@app.get("/api/event-study")
+def get_event_study(event_type: str = 'rbi', sector: str = '', symbols: str = '',
+                    before: int = 5, after: int = 5, estimation: int = 120, period: str = '3y'):
+    """Cross-sectional market-model event study vs NIFTY 50: CAR curves and t-stats per symbol and event."""
+    names = ([t.strip().upper() for t in symbols.split(',') if t.strip()]
+             or SECTOR_STOCKS.get(sector) or NIFTY50_STOCKS)
+    try:
+        market = get_historical_prices('^NSEI', period=period)['close']
+    except Exception as e:
+        return {"error": f"NIFTY 50 history unavailable: {e}"}
+
+    closes, events = {}, {}
+    for s in names:
+        try:
+            prices_df = get_historical_prices(s, period=period)
+        except Exception as e:
+            print(f"[event-study] {s} prices unavailable: {e}")
+            continue
+        nse_sym = normalize_ticker(s).replace('.NS', '').replace('.BO', '')
+        closes[nse_sym] = prices_df['close']
+        events[nse_sym] = [ev['date'] for ev in get_events(s, event_type, prices_df.index.min(), prices_df.index.max())]
+    if not closes:
+        return {"error": "No price data for the requested symbols"}
+
+    with span('event_study.compute', symbols=len(closes)):
+        dates, syms, R, Rm = return_matrix(closes, market)
+        result = event_study(dates, syms, R, Rm, events, before=before, after=after, estimation=estimation)
+    return {'event_type': event_type, 'sector': sector or None, 'market': '^NSEI',
+            'symbols': syms, 'estimation_days': estimation, **result}
+
+
 # ── ML Signals ─────────────────────────────────────────────────────────────────
 
+@app.get("/api/ml-signals/batch")
+def get_ml_signals_batch(symbols: str = ""):
+    """Score many names with the pooled earnings model in one predict_proba call.
+
+    The pooled model is the one the pretrain job last stored (it is trained on
+    every NIFTY50 name's earnings plays); only the requested names' bars are
+    loaded here. `symbols` (comma-separated) picks which names to score (default NIFTY50).
+    """
+    model = ml_engine.registry.latest(POOLED_SYMBOL, 'pooled_earnings', EARNINGS_PARAMS)
+    if not model or 'error' in model:
+        return {'error': 'No pooled model yet: run POST /api/ml/pretrain (or pretrain.py) first',
+                'pretrain': pretrain_job.snapshot()['status'], 'signals': {}}
+
+    names = [s.strip() for s in symbols.split(',') if s.strip()] or NIFTY50_STOCKS
+    latest = {}
+    for s in names:
+        try:
+            latest[normalize_ticker(s)] = get_historical_prices(s, period='2y')  # the cached/prewarmed period
+        except Exception:
+            pass
+
+    preds = ml_engine.predict_pooled_earnings(latest, model)
+    regimes = ml_engine.regimes.snapshot()  # tracked symbols only: no GMM fits on this path
+    signals = {
+        sym.replace('.NS', '').replace('.BO', ''): {
+            'signal': p['signal'],
+            'confidence': round(p['confidence'], 3),
+            'predicted_return': round(p['predicted_return'], 4),
+            'buy_probability': round(p['buy_probability'], 3),
+            'regime': regimes.get(sym, {}).get('regime', 'unknown'),
+        }
+        for sym, p in preds.items()
+    }
+    return {
+        'model': {
+            'cv_accuracy': round(model.get('cv_accuracy', 0.0), 3),
+            'n_training_samples': model.get('n_samples', 0),
+            'n_symbols': model.get('n_symbols', 0),
+            'feature_importances': model.get('feature_importances', {}),
+        },
+        'signals': signals,
+    }
+
+
 @app.get("/api/ml-signals/{ticker}")
 async def get_ml_signals(ticker: str):
     try:
@@ -283,29 +494,10 @@ async def get_ml_signals(ticker: str):
     except Exception as e:
         return {'error': str(e), 'ticker': ticker}
 
-    from indian_market import KNOWN_EARNINGS
-    nse_sym = normalize_ticker(ticker).replace('.NS', '').replace('.BO', '')
-    known = KNOWN_EARNINGS.get(nse_sym, [])
-    earnings_dates = [{'date': d, 'type': 'earnings'} for d in known
-                      if prices_df.index.min() <= pd.to_datetime(d) <= prices_df.index.max()]
+    earnings_dates = get_earnings_history(ticker, prices_df.index.min(), prices_df.index.max())
 
-    if not earnings_dates:
-        try:
-            import yfinance as yf
-            ed = yf.Ticker(normalize_ticker(ticker)).earnings_dates
-            if ed is not None and not ed.empty:
-                for dt in ed.index:
-                    if hasattr(dt, 'tz') and dt.tz:
-                        dt = dt.tz_localize(None)
-                    if prices_df.index.min() <= dt.replace(tzinfo=None) <= prices_df.index.max():
-                        earnings_dates.append({'date': dt.strftime('%Y-%m-%d'), 'type': 'earnings'})
-        except Exception:
-            pass
-
-    model = ml_engine.fit_earnings_predictor(prices_df, earnings_dates)
-    pred = ml_engine.predict_next_earnings(prices_df, model)
-    regime = ml_engine.detect_market_regime(prices_df)
-    anomalies = ml_engine.detect_anomalies(prices_df)
+    # Fitted models come from the registry; refit only when bars/earnings change
+    pred, regime, anomalies = ml_engine.signals(normalize_ticker(ticker), prices_df, earnings_dates)
 
     return {
         'ticker': ticker,
@@ -329,6 +521,48 @@ async def get_ml_signals(ticker: str):
     }
 
 
+@app.get("/api/regimes")
+async def get_regimes():
+    """Latest filtered regime for every symbol the regime tracker has seen."""
+    return {sym.replace('.NS', '').replace('.BO', ''): r
+            for sym, r in ml_engine.regimes.snapshot().items()}
+
+
+@app.post("/api/ml/pretrain")
+async def start_pretrain(request: PretrainRequest):
+    """Fit ML models for the whole universe in a background process pool."""
+    started = pretrain_job.start(request.symbols, request.workers, request.n_jobs)
+    return {'started': started, **pretrain_job.snapshot()}
+
+
+@app.get("/api/ml/pretrain")
+async def pretrain_status():
+    return pretrain_job.snapshot()
+
+
+@app.post("/api/ml/tune/{ticker}")
+def tune_ml_model(ticker: str):
+    """Walk-forward hyperparameter search for a ticker's earnings model; later fits use the winner."""
+    try:
+        prices_df = get_historical_prices(ticker, period='2y')
+    except Exception as e:
+        return {'error': str(e), 'ticker': ticker}
+
+    earnings_dates = get_earnings_history(ticker, prices_df.index.min(), prices_df.index.max())
+    result = ml_engine.tune_earnings_predictor(normalize_ticker(ticker), prices_df, earnings_dates)
+    if 'error' in result:
+        return {'ticker': ticker, **result}
+    return {
+        'ticker': ticker,
+        'best_params': result['best_params'],
+        'best_score': round(result['best_score'], 3),
+        'n_folds': result['n_folds'],
+        'n_samples': result['n_samples'],
+        'results': [{**r, 'mean_accuracy': round(r['mean_accuracy'], 3), 'std': round(r['std'], 3)}
+                    for r in sorted(result['results'], key=lambda r: -r['mean_accuracy'])],
+    }
+
+
 # ── AI Endpoints ───────────────────────────────────────────────────────────────
 
 @app.post("/api/ai/chat")
@@ -340,9 +574,10 @@ async def ai_chat(request: AIChatRequest):
         context['stock'] = request.stock_context
 
     async def generate():
-        async for chunk in ai_service.stream_chat(request.messages, context or None):
-            yield f"data: {json.dumps({'text': chunk})}\n\n"
-        yield "data: [DONE]\n\n"
+        with telemetry.stream('sse'):
+            async for chunk in ai_service.stream_chat(request.messages, context or None):
+                yield f"data: {json.dumps({'text': chunk})}\n\n"
+            yield "data: [DONE]\n\n"
 
     return StreamingResponse(generate(), media_type="text/event-stream",
                              headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -354,23 +589,30 @@ async def backtest_narrative(request: NarrativeRequest):
     return {'narrative': narrative, 'ticker': request.ticker}
 
 
+@app.get("/api/ai/metrics")
+async def ai_metrics():
+    """Groq scheduler queue depth, budget usage and latency, plus response-cache hit rates."""
+    return {'scheduler': ai_service.scheduler.metrics(), 'cache': ai_service.response_cache.stats()}
+
+
 @app.get("/api/ai/research/{ticker}")
 async def research_agent(ticker: str):
     async def generate():
-        try:
-            from indian_market import get_stock_data as gsd
-            company_info = gsd(ticker)
-            news = company_info.get('news', [])
+        with telemetry.stream('sse'):
             try:
-                prices_df = get_historical_prices(ticker, period='1y')
-                from yfinance_provider import get_price_summary
-                price_summary = get_price_summary(prices_df)
-            except Exception:
-                price_summary = {}
-            async for ev in ai_service.run_research_agent(ticker, company_info, news, price_summary):
-                yield f"data: {ev}\n\n"
-        except Exception as e:
-            yield f"data: {json.dumps({'step': 'error', 'message': str(e)})}\n\n"
+                from indian_market import get_stock_data as gsd
+                company_info = gsd(ticker)
+                news = company_info.get('news', [])
+                try:
+                    prices_df = get_historical_prices(ticker, period='1y')
+                    from yfinance_provider import get_price_summary
+                    price_summary = get_price_summary(prices_df)
+                except Exception:
+                    price_summary = {}
+                async for ev in ai_service.run_research_agent(ticker, company_info, news, price_summary):
+                    yield f"data: {ev}\n\n"
+            except Exception as e:
+                yield f"data: {json.dumps({'step': 'error', 'message': str(e)})}\n\n"
 
     return StreamingResponse(generate(), media_type="text/event-stream",
                              headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -392,89 +634,346 @@ async def get_live_data(ticker: str):
 
 # ── WebSocket ──────────────────────────────────────────────────────────────────
 
-@app.websocket("/ws/{ticker}")
-async def websocket_endpoint(websocket: WebSocket, ticker: str):
+def _live_quote(yf_sym: str) -> dict:
+    """Quote for one hub poll: the NSE live quote (30 s cache) over the 120 s stock snapshot.
+
+    The snapshot only fills what NSE lacks (indices, BSE symbols, an NSE outage);
+    every poll's price is folded into the intraday bars.
+    """
+    q = dict(get_stock_data(yf_sym).get('quote') or {})
+    ticker = yf_sym.replace('.NS', '').replace('.BO', '')
+    live = get_nse_live_quote(yf_sym) if not yf_sym.startswith('^') else {}
+    for key in ('current', 'open', 'high', 'low', 'previous_close', 'volume'):
+        if live.get(key):
+            q[key] = live[key]
+    prev = q.get('previous_close') or 0
+    if q.get('current') and prev:
+        q['change'] = round(q['current'] - prev, 2)
+        q['change_pct'] = round((q['current'] - prev) / prev * 100, 2)
+    bars.update(ticker, q.get('current'), q.get('volume'))
+    return q
+
+
+def _poll_live(yf_sym: str) -> list:
+    """One live poll for the hub (worker thread): quote update plus any tick anomalies."""
+    q = _live_quote(yf_sym)
+    ticker = yf_sym.replace('.NS', '').replace('.BO', '')
+    # Scored on the live quote: a fresh tick every NSE refresh (30 s), so warm-up takes minutes, not an hour
+    alerts = tick_anomalies.update(yf_sym, q.get('current', 0), q.get('volume') or None)
+    messages = [{
+        'type': 'price_update',
+        'ticker': ticker,
+        'data': {
+            'current': q.get('current', 0),
+            'high': q.get('high', 0),
+            'low': q.get('low', 0),
+            'open': q.get('open', 0),
+            'previous_close': q.get('previous_close', 0),
+            'change': q.get('change', 0),
+            'change_pct': q.get('change_pct', 0),
+            'volume': q.get('volume', 0),
+            'regime': ml_engine.regimes.peek(yf_sym, q.get('current', 0)),
+            'bar_1m': bars.last_bar(ticker, '1m'),  # last completed bar; changes once a minute
+            'timestamp': datetime.now().isoformat(),
+        },
+    }]
+    messages += [{'type': 'anomaly', 'ticker': ticker, 'data': alert} for alert in alerts]
+    return messages
+
+
+quote_hub = QuoteHub(_poll_live, interval=15)
+_LIVE_SYMBOL = re.compile(r'^(\^[A-Z0-9.]{1,15}|[A-Z0-9&-]{1,20}\.(NS|BO))$')
+
+
+def _live_subscribe(sub: Subscriber, tickers) -> list:
+    """Subscribe to each well-formed ticker up to WS_MAX_SYMBOLS; returns the rejected inputs.
+
+    Every new symbol starts an upstream poller, so malformed input and
+    subscriptions past the per-socket cap are refused.
+    """
+    rejected = []
+    for t in tickers if isinstance(tickers, list) else []:
+        sym = normalize_ticker(t) if isinstance(t, str) and t.strip() else ''
+        if not _LIVE_SYMBOL.match(sym) or (sym not in sub.symbols and len(sub.symbols) >= WS_MAX_SYMBOLS):
+            rejected.append(t if isinstance(t, str) else repr(t))
+            continue
+        quote_hub.subscribe(sub, sym)
+    return rejected
+
+
+async def _serve_live(websocket: WebSocket, tickers: list):
+    """Pump hub updates to one socket; the client may send
+    {"action": "subscribe" | "unsubscribe", "tickers": [...]} at any time.
+
+    Query params: v=2 for snapshot + delta messages (default 1: full updates),
+    encoding=msgpack for binary frames, throttle=<seconds> between flushes.
+    """
+    params = websocket.query_params
+    try:
+        protocol = min(int(params.get('v', 1)), PROTOCOL_VERSION)
+        throttle = min(max(float(params.get('throttle', 0)), 0.0), 60.0)
+    except ValueError:
+        protocol, throttle = 1, 0.0
+    encoding = params.get('encoding', 'json')
     await websocket.accept()
+    if encoding not in ENCODINGS:
+        await websocket.send_text(encode({'type': 'error', 'message': f'unsupported encoding {encoding!r}',
+                                          'encodings': list(ENCODINGS)}))
+        await websocket.close()
+        return
+
+    sub = Subscriber(protocol=protocol, throttle=throttle)
+    if protocol >= 2:
+        sub.offer({'type': 'hello', 'v': protocol, 'encoding': encoding, 'throttle': throttle})
+    rejected = _live_subscribe(sub, tickers)
+    if rejected:
+        sub.offer({'type': 'error', 'message': 'ticker rejected', 'rejected': rejected, 'max_symbols': WS_MAX_SYMBOLS})
+
+    async def pump():
+        async for msg in sub.messages():
+            frame = encode(msg, encoding)
+            if isinstance(frame, bytes):
+                await websocket.send_bytes(frame)
+            else:
+                await websocket.send_text(frame)
+
+    sender = asyncio.create_task(pump())
+    telemetry.active_streams.inc(kind='websocket')
     try:
         while True:
+            frame = await websocket.receive()
+            if frame['type'] == 'websocket.disconnect':
+                break
             try:
-                sd = get_stock_data(ticker)
-                q = sd.get('quote', {})
-                await websocket.send_json({
-                    'type': 'price_update',
-                    'data': {
-                        'current': q.get('current', 0),
-                        'high': q.get('high', 0),
-                        'low': q.get('low', 0),
-                        'open': q.get('open', 0),
-                        'previous_close': q.get('previous_close', 0),
-                        'change': q.get('change', 0),
-                        'change_pct': q.get('change_pct', 0),
-                        'volume': q.get('volume', 0),
-                        'timestamp': datetime.now().isoformat(),
-                    },
-                })
+                msg = decode(frame.get('text') or frame.get('bytes'))
             except Exception:
-                pass
-            await asyncio.sleep(15)
+                continue  # malformed control frame
+            action = msg.get('action') if isinstance(msg, dict) else None
+            if action not in ('subscribe', 'unsubscribe'):
+                continue
+            if action == 'subscribe':
+                rejected = _live_subscribe(sub, msg.get('tickers'))
+            else:
+                rejected = []
+                for t in msg.get('tickers') or []:
+                    if isinstance(t, str) and t.strip():
+                        quote_hub.unsubscribe(sub, normalize_ticker(t))
+            reply = {'type': f'{action}d',
+                     'tickers': sorted(s.replace('.NS', '').replace('.BO', '') for s in sub.symbols)}
+            if rejected:
+                reply.update(rejected=rejected, max_symbols=WS_MAX_SYMBOLS)
+            sub.offer(reply)
     except Exception:
-        await websocket.close()
+        pass  # connection dropped
+    finally:
+        quote_hub.disconnect(sub)
+        sender.cancel()
+        telemetry.active_streams.dec(kind='websocket')
 
 
-# ── Helpers ────────────────────────────────────────────────────────────────────
+@app.websocket("/ws")
+async def live_ws(websocket: WebSocket):
+    """Multi-ticker live feed: subscribe/unsubscribe with JSON actions."""
+    await _serve_live(websocket, [])
 
-def _sharpe(rets, rfr=0.065):  # 6.5% Indian risk-free rate
-    if len(rets) < 2: return 0.0
-    arr = np.array(rets)
-    excess = arr - rfr / 252
-    std = np.std(arr)
-    return float(np.sqrt(252) * np.mean(excess) / std) if std > 0 else 0.0
-
-def _sortino(rets, rfr=0.065):
-    if len(rets) < 2: return 0.0
-    arr = np.array(rets)
-    excess = arr - rfr / 252
-    down = arr[arr < 0]
-    ds = np.std(down) if len(down) > 1 else np.std(arr)
-    return float(np.sqrt(252) * np.mean(excess) / ds) if ds > 0 else 0.0
-
-def _max_dd(rets):
-    cum = np.cumprod(1 + np.array(rets))
-    peak = np.maximum.accumulate(cum)
-    return float(np.min((cum - peak) / peak))
-
-def _profit_factor(rets):
-    g = sum(r for r in rets if r > 0)
-    l = abs(sum(r for r in rets if r < 0))
-    return float(g / l) if l > 0 else float('inf')
 
-def _overall_metrics(all_event_returns):
-    if not all_event_returns: return _empty_metrics()
-    rets = [e['total_return'] for e in all_event_returns]
-    arr = np.array(rets)
+@app.websocket("/ws/{ticker}")
+async def websocket_endpoint(websocket: WebSocket, ticker: str):
+    await _serve_live(websocket, [ticker])
+
+
+@app.get("/api/debug/startup")
+def startup_report(profile: bool = False, x_debug_token: str = Header('')):
+    """Cold-start cost: this worker's import time, deferred packages loaded since, optional import profile."""
+    report = {'import_s': STARTUP_IMPORT_S, 'deferred_loaded': deferred_loaded()}
+    if profile and not _debug_allowed(x_debug_token):
+        report['profile'] = {**_DEBUG_DENIED, 'cli': 'python startup_profile.py'}
+    elif profile:
+        report['profile'] = profile_imports('app')  # fresh interpreter; takes about one cold start
+    return report
+
+
+@app.get("/api/debug/traces")
+async def list_traces(limit: int = 20, slow: bool = False, route: str = ''):
+    """Recent (or, with slow=true, the slowest) request traces; `route` filters by name substring."""
+    return {'sample_rate': traces.sample_rate, 'armed': traces.armed(),
+            'traces': traces.list(min(limit, TRACE_KEEP), slow=slow, name=route or None)}
+
+
+@app.get("/api/debug/traces/{trace_id}")
+async def get_trace(trace_id: str, x_debug_token: str = Header('')):
+    """Span tree, self-time breakdown by span name and, if profiled, the sampled stacks (needs X-Debug-Token)."""
+    tr = traces.get(trace_id)
+    if tr is None:
+        return {'error': f'trace {trace_id} not found (expired or never recorded)'}
+    out = tr.to_dict()
+    if 'profile' in out and not _debug_allowed(x_debug_token):
+        out['profile'] = _DEBUG_DENIED
+    return out
+
+
+@app.post("/api/debug/profile")
+async def arm_profile(request: ProfileRequest, x_debug_token: str = Header('')):
+    """Profile the next `count` requests under `path`; fetch them from /api/debug/traces."""
+    if not _debug_allowed(x_debug_token):
+        return _DEBUG_DENIED
+    traces.arm(request.path, min(request.count, 20))
+    return {'armed': traces.armed()}
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Market-data cache tier: backend, L1 size, L1/L2 hit counts."""
+    return data_cache.stats()
+
+
+@telemetry.collector
+def _cache_metrics():
+    caches = [('market', ns, c) for ns, c in data_cache.namespaces.items()]
+    caches.append(('llm', 'completion', {'l1_hits': ai_service.response_cache.hits,
+                                         'misses': ai_service.response_cache.misses,
+                                         'evictions': ai_service.response_cache.evictions}))
+    models = ml_engine.registry.stats()
+    caches.append(('models', 'bundle', {'l1_hits': models['hits'], 'misses': models['misses'],
+                                        'evictions': models['evictions']}))
+    lookups = [({'cache': cache, 'namespace': ns, 'result': result}, c[key])
+               for cache, ns, c in caches
+               for key, result in (('l1_hits', 'hit'), ('l2_hits', 'shared_hit'), ('misses', 'miss'))
+               if key in c]
+    return [
+        ('quantiq_cache_lookups_total', 'counter', 'Cache lookups by namespace and result', lookups),
+        ('quantiq_cache_evictions_total', 'counter', 'Entries evicted from in-process caches',
+         [({'cache': cache, 'namespace': ns}, c['evictions']) for cache, ns, c in caches]),
+        ('quantiq_cache_errors_total', 'counter', 'Shared cache tier errors',
+         [({'backend': data_cache.backend.name}, data_cache.counts['errors'])]),
+    ]
+
+
+@telemetry.collector
+def _live_metrics():
+    hub = quote_hub.stats()
+    return [
+        ('quantiq_live_symbols', 'gauge', 'Symbols with an active hub poller', [({}, hub['symbols'])]),
+        ('quantiq_live_subscriptions', 'gauge', 'Socket-symbol subscriptions', [({}, hub['subscriptions'])]),
+        ('quantiq_live_dropped_total', 'counter', 'Updates dropped for slow sockets', [({}, hub['dropped'])]),
+    ]
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape target: route latency, caches, upstreams, event-loop lag, open streams."""
+    return PlainTextResponse(telemetry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/api/warmup")
+async def start_warmup(request: WarmupRequest):
+    """Re-warm prices, quotes, technicals, earnings and models in the background."""
+    symbols = [s.strip().upper() for s in request.symbols] if request.symbols else None
+    started = prewarm_job.start(symbols, force=True)
+    return {'started': started, **prewarm_job.snapshot()}
+
+
+@app.get("/api/warmup")
+async def warmup_status():
+    """Warm-up progress, per-symbol failures and the next pre-market run."""
+    return prewarm_job.snapshot()
+
+
+@app.get("/api/ws/stats")
+async def ws_stats():
+    """Live hub load: polled symbols, subscriptions, sockets, dropped events, conflated quotes."""
+    return quote_hub.stats()
+
+
+@app.websocket("/ws-alerts")
+async def anomaly_alerts_ws(websocket: WebSocket):
+    """Push every live tick anomaly, across all streamed symbols."""
+    await websocket.accept()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=100)
+    loop = asyncio.get_running_loop()
+
+    def _enqueue(alert):
+        try:
+            queue.put_nowait(alert)
+        except asyncio.QueueFull:
+            pass  # slow consumer: drop rather than grow without bound
+
+    # Alerts are raised on the hub's poller threads; hop back onto the loop
+    unsubscribe = tick_anomalies.subscribe(lambda alert: loop.call_soon_threadsafe(_enqueue, alert))
+    try:
+        with telemetry.stream('websocket'):
+            while True:
+                alert = await queue.get()
+                await websocket.send_json({'type': 'anomaly', 'data': alert})
+    except Exception:
+        pass
+    finally:
+        unsubscribe()
+
+
+@app.get("/api/anomalies/live")
+async def live_anomalies():
+    """Most recent live tick anomalies (bounded buffer)."""
+    return {'alerts': list(tick_anomalies.recent)}
+
+
+@app.get("/api/bars/{ticker}")
+async def intraday_bars(ticker: str, interval: str = '1m', limit: int = 375):
+    """Intraday OHLCV bars built from live quotes (no upstream call)."""
+    if interval not in BAR_INTERVALS:
+        return {'error': f'interval must be one of {list(BAR_INTERVALS)}', 'ticker': ticker}
+    nse_sym = normalize_ticker(ticker).replace('.NS', '').replace('.BO', '')
+    df = bars.frame(nse_sym, interval, limit=max(1, limit))
     return {
-        'total_events': len(all_event_returns),
-        'avg_return': float(np.mean(arr)),
-        'median_return': float(np.median(arr)),
-        'std_dev': float(np.std(arr)) if len(arr) > 1 else 0,
-        'win_rate': float(np.sum(arr > 0) / len(arr)),
-        'avg_win': float(np.mean(arr[arr > 0])) if np.any(arr > 0) else 0,
-        'avg_loss': float(np.mean(arr[arr < 0])) if np.any(arr < 0) else 0,
-        'sharpe': _sharpe(rets),
-        'sortino': _sortino(rets),
-        'max_drawdown': _max_dd(rets),
-        'best_trade': float(np.max(arr)),
-        'worst_trade': float(np.min(arr)),
-        'profit_factor': _profit_factor(rets),
-        'var_95': float(np.percentile(arr, 5)) if len(arr) >= 20 else float(np.min(arr)),
-        'cvar_95': float(np.mean(arr[arr <= np.percentile(arr, 5)])) if len(arr) >= 20 else float(np.min(arr)),
-        'avg_volatility': float(np.mean([e['volatility'] for e in all_event_returns])),
+        'ticker': nse_sym,
+        'interval': interval,
+        'times': df.index.strftime('%Y-%m-%d %H:%M').tolist(),
+        **{c: [round(float(x), 2) for x in df[c]] for c in ('open', 'high', 'low', 'close')},
+        'volume': [int(x) for x in df['volume']],
     }
 
-def _empty_metrics():
-    return {k: 0 for k in ['total_events','avg_return','median_return','std_dev','win_rate',
-                             'avg_win','avg_loss','sharpe','sortino','max_drawdown',
-                             'best_trade','worst_trade','profit_factor','var_95','cvar_95','avg_volatility']}
+
+@app.get("/api/anomalies/intraday/{ticker}")
+def intraday_anomalies(ticker: str, interval: str = '1m'):
+    """Isolation Forest anomalies over the live intraday bars."""
+    if interval not in BAR_INTERVALS:
+        return {'error': f'interval must be one of {list(BAR_INTERVALS)}', 'ticker': ticker}
+    nse_sym = normalize_ticker(ticker).replace('.NS', '').replace('.BO', '')
+    df = bars.frame(nse_sym, interval, closed_only=True)
+    result = ml_engine.detect_anomalies(df, date_format='%Y-%m-%d %H:%M')
+    return {'ticker': nse_sym, 'interval': interval, 'n_bars': len(df), **result}
+
+
+# ── Helpers ────────────────────────────────────────────────────────────────────
+
+def _overall_metrics(all_event_returns):
+    return summary_metrics([e['total_return'] for e in all_event_returns],
+                           [e['volatility'] for e in all_event_returns])
+
+def _metrics_by_event(returns_by_event):
+    """Per-event-type summary; all types are scored in one batch."""
+    if not returns_by_event: return {}
+    R, mask = pad([[e['total_return'] for e in evs] for evs in returns_by_event.values()])
+    batch = batch_metrics(R, mask)
+    return {t: row(batch, i, EVENT_METRIC_KEYS) for i, t in enumerate(returns_by_event)}
+
+def _window_sweep(close, event_idx, max_before=5, max_after=10, top=5):
+    """Score every (window_before, window_after) pair over the same events in one batch.
+
+    The defaults give a 6 × 10 grid (before 0–5, after 1–10): 60 rows.
+    Plain entry→exit returns (no stop-loss / take-profit); best by Sharpe.
+    """
+    wb, wa = np.meshgrid(np.arange(0, max_before + 1), np.arange(1, max_after + 1), indexing='ij')
+    wb, wa = wb.ravel(), wa.ravel()
+    entry = event_idx[None, :] - wb[:, None]
+    exit_ = event_idx[None, :] + wa[:, None]
+    mask = (entry >= 0) & (exit_ < len(close))
+    last = len(close) - 1
+    R = close[np.clip(exit_, 0, last)] / close[np.clip(entry, 0, last)] - 1
+    batch = batch_metrics(R, mask)
+    order = np.lexsort((-batch['avg_return'], -batch['sharpe']))[:top]
+    return [{'window_before': int(wb[i]), 'window_after': int(wa[i]), **row(batch, i, EVENT_METRIC_KEYS)}
+            for i in order]
 
 def _correlations(ev_types, all_returns):
     if len(ev_types) < 2: return {}
@@ -530,6 +1029,16 @@ def _mock_backtest(request):
     }
 
 
+STARTUP_IMPORT_S = round(time.perf_counter() - _import_started, 3)
+print(f"[app] imported in {STARTUP_IMPORT_S:.2f}s (deferred until first use: {', '.join(DEFERRED)})")
+
+
 if __name__ == '__main__':
     import uvicorn
-    uvicorn.run(app, host='0.0.0.0', port=8000)
+    from config import API_HOST, API_PORT, WEB_CONCURRENCY, CACHE_BACKEND
+    if WEB_CONCURRENCY > 1 and CACHE_BACKEND == 'memory':
+        print("[app] WEB_CONCURRENCY > 1 with CACHE_BACKEND=memory: every worker keeps its own cold cache")
+    if WEB_CONCURRENCY > 1:
+        uvicorn.run('app:app', host=API_HOST, port=API_PORT, workers=WEB_CONCURRENCY)
+    else:
+        uvicorn.run(app, host=API_HOST, port=API_PORT)
@@ -5,6 +5,7 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import data_provider
+from metrics import summary_metrics
 from typing import List, Dict, Tuple
 import statistics
 
@@ -227,59 +228,8 @@ class EventBacktester:
         """Calculate performance metrics"""
         if len(returns_df) == 0:
             return {}
-        
-        returns = returns_df['total_return'].values
-        
-        # Basic metrics
-        metrics = {
-            'total_events': len(returns_df),
-            'avg_return': np.mean(returns),
-            'median_return': np.median(returns),
-            'std_dev': np.std(returns),
-            'win_rate': (returns > 0).mean(),
-            'avg_win': returns[returns > 0].mean() if any(returns > 0) else 0,
-            'avg_loss': returns[returns < 0].mean() if any(returns < 0) else 0,
-            'best_trade': returns.max(),
-            'worst_trade': returns.min(),
-            'avg_volatility': returns_df['volatility'].mean()
-        }
-        
-        # Risk metrics
-        metrics['sharpe'] = self._calculate_sharpe(returns)
-        metrics['sortino'] = self._calculate_sortino(returns)
-        metrics['max_drawdown'] = self._calculate_max_drawdown(returns)
-        metrics['var_95'] = np.percentile(returns, 5)  # Value at Risk
-        metrics['cvar_95'] = returns[returns <= metrics['var_95']].mean()  # Conditional VaR
-        
-        # Profit factor
-        total_wins = returns[returns > 0].sum()
-        total_losses = abs(returns[returns < 0].sum())
-        metrics['profit_factor'] = total_wins / total_losses if total_losses > 0 else np.inf
-        
-        return metrics
-
-    def _calculate_sharpe(self, returns, risk_free_rate=0.02):
-        """Calculate Sharpe ratio"""
-        if len(returns) < 2:
-            return 0
-        excess_returns = returns - risk_free_rate/252
-        return np.sqrt(252) * excess_returns.mean() / returns.std() if returns.std() > 0 else 0
-
-    def _calculate_sortino(self, returns, risk_free_rate=0.02):
-        """Calculate Sortino ratio (penalizes downside volatility only)"""
-        if len(returns) < 2:
-            return 0
-        excess_returns = returns - risk_free_rate/252
-        downside_returns = returns[returns < 0]
-        downside_std = downside_returns.std() if len(downside_returns) > 1 else returns.std()
-        return np.sqrt(252) * excess_returns.mean() / downside_std if downside_std > 0 else 0
-
-    def _calculate_max_drawdown(self, returns):
-        """Calculate maximum drawdown"""
-        cumulative = (1 + returns).cumprod()
-        running_max = cumulative.cummax()
-        drawdown = (cumulative - running_max) / running_max
-        return drawdown.min()
+        return summary_metrics(returns_df['total_return'].values, returns_df['volatility'].values,
+                               rfr=0.02)
 
     def _calculate_event_correlations(self, results_df: pd.DataFrame) -> Dict:
         """Calculate correlations between different event types"""
@@ -0,0 +1,340 @@
+"""
+Offline micro-benchmarks for the compute hot paths.
+Every case runs on synthetic OHLCV of a given length and a given number of
+events, fed through the real code: the backtest route's event loop (prices and
+events are seeded into the market-data cache and event calendar, so nothing
+is fetched), the technicals payload, the ML feature/fit/regime paths and the
+metric helpers. Network access is blocked for the whole run.
+
+    python bench.py                                  # run, compare with bench_baseline.json
+    python bench.py --bars 1000,1000000 --events 50 --only backtest
+    python bench.py --save                           # run and make it the new baseline
+    python bench.py --out before.json                # ...change code...
+    python bench.py --baseline before.json --check   # after vs before; exit 1 on regression
+
+Timings are per call: the minimum over the runs (what regressions are judged
+on) and the median. Baselines are machine-specific, so compare runs made on
+the same host, and re-run a flagged case with a larger --repeat/--budget
+before trusting a small ratio on a busy machine. The stored baseline is
+recorded with the versions pinned in requirements.txt; a run under other
+numpy / pandas / scikit-learn versions is warned about, and --check refuses
+to judge it unless given --any-versions.
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import socket
+import statistics
+import sys
+import time
+
+os.environ['CACHE_BACKEND'] = 'memory'  # never write synthetic bars into a shared cache tier
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(HERE, 'bench_baseline.json')
+SYMBOL = 'BENCHSYN'
+DAILY_MAX = 140_000  # longer series use minute bars to stay inside pandas' Timestamp range
+MIN_RUNS = 5         # timed runs every case gets, however slow; a min over fewer is mostly noise
+VERSION_KEYS = ('python', 'numpy', 'pandas', 'sklearn')
+
+BENCHMARKS: dict = {}
+
+
+def bench(name: str, axes: tuple = ('bars', 'events')):
+    """Register setup(bars, events) → zero-arg callable to time.
+
+    `axes` are the sizes the case depends on; for the others it runs once, at the first value given.
+    """
+    def register(setup):
+        BENCHMARKS[name] = (setup, axes)
+        return setup
+    return register
+
+
+# ── Synthetic data ────────────────────────────────────────────────────────────
+
+def synthetic_ohlcv(bars: int, seed: int = 0) -> pd.DataFrame:
+    """Geometric random walk with OHLCV columns, lower-case like get_historical_prices."""
+    rng = np.random.default_rng(seed)
+    if bars <= DAILY_MAX:
+        # Weekdays from 1700; built in NumPy, since pandas 2's bdate_range overflows ns offsets past ~100k days
+        idx = pd.DatetimeIndex(np.busday_offset('1700-01-01', np.arange(bars), roll='forward').astype('datetime64[ns]'))
+    else:
+        idx = pd.date_range('2000-01-03', periods=bars, freq='min')
+    close = 1000 * np.exp(np.cumsum(rng.normal(0, 0.015, bars)))
+    return pd.DataFrame({
+        'open': close * (1 + rng.normal(0, 0.003, bars)),
+        'high': close * (1 + np.abs(rng.normal(0, 0.006, bars))),
+        'low': close * (1 - np.abs(rng.normal(0, 0.006, bars))),
+        'close': close,
+        'volume': rng.integers(100_000, 1_000_000, bars).astype(float),
+    }, index=idx)
+
+
+def synthetic_events(df: pd.DataFrame, events: int) -> list:
+    """`events` evenly spaced dates, clear of the first 60 bars (feature warm-up).
+
+    Events are day-granular, so on minute bars the count is capped at the number of days.
+    """
+    pos = np.linspace(min(60, len(df) - 1), len(df) - 1, events).astype(int)
+    return sorted({df.index[p].strftime('%Y-%m-%d') for p in pos})
+
+
+def _offline():
+    """Fail fast on any connection attempt instead of hanging on a fetch."""
+    def refuse(*args, **kwargs):
+        raise ConnectionError('bench.py runs offline')
+    socket.socket.connect = refuse
+    socket.create_connection = refuse
+
+
+# ── Cases ─────────────────────────────────────────────────────────────────────
+
+def _backtest_case(bars: int, events: int, **request):
+    import app
+    from indian_market import data_cache, calendar, normalize_ticker
+
+    df = synthetic_ohlcv(bars)
+    yf_sym = normalize_ticker(SYMBOL)
+    data_cache.put(f'hist:{yf_sym}:2y', df)
+    data_cache.put(f'stock:{yf_sym}', {'quote': {'current': float(df['close'].iloc[-1])}})
+    calendar.set('earnings', SYMBOL, 'yfinance', synthetic_events(df, events), fetched=time.time())
+
+    req = app.BacktestRequest(ticker=SYMBOL, event_types=['earnings'], **request)
+    loop = asyncio.new_event_loop()
+    return lambda: loop.run_until_complete(app.run_backtest(req))
+
+
+@bench('backtest.event_loop')
+def _backtest(bars, events):
+    return _backtest_case(bars, events, window_before=2, window_after=3)
+
+
+@bench('backtest.stop_loss')
+def _backtest_stops(bars, events):
+    return _backtest_case(bars, events, window_before=5, window_after=10, stop_loss=0.03, take_profit=0.05)
+
+
+@bench('technicals.indicators', axes=('bars',))
+def _technicals(bars, events):
+    from indian_market import _technicals_payload
+    df = synthetic_ohlcv(bars)
+    return lambda: _technicals_payload(df, '%Y-%m-%d')
+
+
+@bench('ml.compute_features', axes=('bars',))
+def _features(bars, events):
+    from ml_signals import MLSignalEngine
+    df, engine = synthetic_ohlcv(bars), MLSignalEngine()
+    return lambda: engine.compute_features(df)
+
+
+@bench('ml.fit_earnings_predictor')
+def _fit_earnings(bars, events):
+    from ml_signals import MLSignalEngine
+    df, engine = synthetic_ohlcv(bars), MLSignalEngine()
+    dates = [{'date': d, 'type': 'earnings'} for d in synthetic_events(df, events)]
+    return lambda: engine.fit_earnings_predictor(df, dates)
+
+
+@bench('ml.detect_market_regime', axes=('bars',))
+def _regime(bars, events):
+    from ml_signals import MLSignalEngine
+    df, engine = synthetic_ohlcv(bars), MLSignalEngine()
+    return lambda: engine.detect_market_regime(df)  # fit + predict, as on a registry miss
+
+
+@bench('metrics.summary_metrics', axes=('events',))
+def _summary(bars, events):
+    from metrics import summary_metrics
+    rng = np.random.default_rng(1)
+    returns, vol = rng.normal(0.002, 0.04, events), rng.uniform(0.1, 0.5, events)
+    return lambda: summary_metrics(returns, vol)
+
+
+@bench('metrics.batch_metrics', axes=('events',))
+def _batch(bars, events):
+    from metrics import batch_metrics
+    rng = np.random.default_rng(2)
+    R = rng.normal(0.002, 0.04, (64, events))  # 64 strategy variants
+    mask = rng.random((64, events)) < 0.9
+    return lambda: batch_metrics(R, mask)
+
+
+@bench('metrics.window_sweep', axes=('events',))
+def _sweep(bars, events):
+    from app import _window_sweep
+    close = synthetic_ohlcv(bars)['close'].to_numpy()
+    idx = np.linspace(10, bars - 1, events).astype(int)
+    return lambda: _window_sweep(close, idx)
+
+
+# ── Runner ────────────────────────────────────────────────────────────────────
+
+def case_key(name: str, bars: int = None, events: int = None) -> str:
+    return name + (f'|bars={bars}' if bars is not None else '') + (f'|events={events}' if events is not None else '')
+
+
+def time_case(fn, repeat: int, budget: float, min_run: float = 0.05) -> dict:
+    """Per-call ms over up to `repeat` runs (at least MIN_RUNS; more only while within `budget` seconds).
+
+    Fast cases are called in loops of `number` per run, sized so a run lasts at least `min_run`.
+    """
+    t0 = time.perf_counter()
+    fn()  # warm-up: imports, caches, first-call allocations
+    first = time.perf_counter() - t0
+    number = 1 if first >= min_run else min(10_000, int(min_run / max(first, 1e-6)) + 1)
+    times = []
+    gc.collect()
+    gc_was = gc.isenabled()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        while len(times) < max(repeat, MIN_RUNS) and (len(times) < MIN_RUNS or time.perf_counter() - started < budget):
+            t0 = time.perf_counter()
+            for _ in range(number):
+                fn()
+            times.append((time.perf_counter() - t0) / number)
+    finally:
+        if gc_was:
+            gc.enable()
+    return {'min_ms': round(min(times) * 1000, 4), 'median_ms': round(statistics.median(times) * 1000, 4),
+            'runs': len(times), 'number': number}
+
+
+def run(bars_list: list, events_list: list, only: list = None, repeat: int = 9, budget: float = 3.0,
+        progress=None) -> dict:
+    results = {}
+    for name, (setup, axes) in BENCHMARKS.items():
+        if only and not any(o in name for o in only):
+            continue
+        for bars in (bars_list if 'bars' in axes else bars_list[:1]):
+            for events in (events_list if 'events' in axes else events_list[:1]):
+                key = case_key(name, bars if 'bars' in axes else None, events if 'events' in axes else None)
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()):  # the code under test prints
+                        fn = setup(bars, events)
+                        results[key] = time_case(fn, repeat, budget)
+                except Exception as e:
+                    results[key] = {'error': f'{type(e).__name__}: {e}'}
+                if progress:
+                    progress(key, results[key])
+    return results
+
+
+def environment() -> dict:
+    import sklearn
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor() or platform.node(),
+        'cpus': os.cpu_count(),
+        'recorded_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """[(key, current, base, ratio, verdict)] on min time; verdict is 'slower', 'faster' or ''."""
+    rows = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if 'error' in cur or not base or 'error' in base:
+            rows.append((key, cur, base, None, ''))
+            continue
+        ratio = cur['min_ms'] / base['min_ms'] if base['min_ms'] else float('inf')
+        verdict = 'slower' if ratio > threshold else 'faster' if ratio < 1 / threshold else ''
+        rows.append((key, cur, base, ratio, verdict))
+    return rows
+
+
+def _print_table(rows: list):
+    print(f"\n{'case':<58} {'min ms':>11} {'median ms':>11} {'base min':>11} {'ratio':>7}")
+    for key, cur, base, ratio, verdict in rows:
+        if 'error' in cur:
+            print(f"{key:<58} {'error: ' + cur['error'][:60]}")
+            continue
+        base_s = f"{base['min_ms']:11.3f}" if base and 'min_ms' in base else f"{'-':>11}"
+        ratio_s = f"{ratio:6.2f}x" if ratio is not None else f"{'':>7}"
+        flag = {'slower': '  << SLOWER', 'faster': '  faster'}.get(verdict, '')
+        print(f"{key:<58} {cur['min_ms']:11.3f} {cur['median_ms']:11.3f} {base_s} {ratio_s}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--bars', default='1000,10000,100000', help='comma-separated series lengths')
+    parser.add_argument('--events', default='20,200', help='comma-separated event counts')
+    parser.add_argument('--only', default='', help='comma-separated substrings of case names')
+    parser.add_argument('--repeat', type=int, default=9, help='max timed runs per case')
+    parser.add_argument('--budget', type=float, default=3.0, help=f'seconds per case after the first {MIN_RUNS} runs')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='results file to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25, help='min-time ratio counted as a regression')
+    parser.add_argument('--save', action='store_true', help='write this run to --baseline')
+    parser.add_argument('--out', default='', help='also write this run to a file')
+    parser.add_argument('--check', action='store_true', help='exit 1 if any case regressed')
+    parser.add_argument('--any-versions', action='store_true',
+                        help='let --check judge against a baseline recorded under other library versions')
+    parser.add_argument('--list', action='store_true', help='list cases and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(BENCHMARKS))
+        return
+    _offline()
+    bars_list = [int(x) for x in args.bars.split(',') if x.strip()]
+    events_list = [int(x) for x in args.events.split(',') if x.strip()]
+    only = [x.strip() for x in args.only.split(',') if x.strip()]
+
+    def progress(key, r):
+        msg = r['error'] if 'error' in r else f"{r['min_ms']:.3f} ms"
+        print(f'  {key}: {msg}', file=sys.stderr)
+
+    results = run(bars_list, events_list, only, args.repeat, args.budget, progress)
+
+    baseline, base_env = {}, {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        baseline, base_env = stored.get('results', {}), stored.get('environment', {})
+    rows = compare(results, baseline, args.threshold)
+    _print_table(rows)
+
+    env = environment()
+    mismatched = [f"{k} {base_env[k]} → {env[k]}" for k in VERSION_KEYS if k in base_env and base_env[k] != env[k]]
+    if mismatched:
+        print(f"\nbaseline was recorded under other versions ({', '.join(mismatched)}); "
+              f"ratios mix library changes with code changes")
+
+    doc = {'environment': env, 'results': results}
+    for path in filter(None, [args.out, args.baseline if args.save else '']):
+        if path == args.baseline and os.path.exists(path):
+            # Merge, so saving a subset (--only / other sizes) keeps the rest of the baseline
+            with open(path) as f:
+                old = json.load(f)
+            doc = {'environment': doc['environment'], 'results': {**old.get('results', {}), **results}}
+        with open(path, 'w') as f:
+            json.dump(doc, f, indent=1, sort_keys=True)
+        print(f'\nwrote {len(results)} cases to {path}')
+
+    slower = [r[0] for r in rows if r[4] == 'slower']
+    if slower:
+        print(f'\n{len(slower)} case(s) more than {args.threshold:.2f}x slower than the baseline')
+    if args.check and mismatched and not args.any_versions:
+        print('--check: not judging against a baseline from other versions (pass --any-versions to force)')
+        sys.exit(2)
+    if args.check and slower:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+Compact, token-budgeted context for the strategy chat.
+Turns the backtest / stock payloads the frontend sends into a few dense text
+lines — headline metrics, per-event-type aggregates, return quantiles, best
+and worst trades, quote and key fundamentals — instead of raw indented JSON.
+Lines are admitted by priority until the budget is spent, so the headline
+metrics always survive and trade rows / headlines are what get dropped.
+"""
+import json
+
+import numpy as np
+
+CONTEXT_TOKENS = 700
+CHARS_PER_TOKEN = 4  # rough English/markdown ratio; only used for budgeting
+
+
+def _tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+# Formatters return None for missing values so _join can leave the field out.
+
+def _pct(x, digits: int = 1, signed: bool = True):
+    try:
+        return f"{float(x) * 100:{'+' if signed else ''}.{digits}f}%"
+    except (TypeError, ValueError):
+        return None
+
+
+def _num(x, digits: int = 2):
+    try:
+        return f"{float(x):.{digits}f}"
+    except (TypeError, ValueError):
+        return None
+
+
+def _inr(x, digits: int = 2):
+    try:
+        return f"₹{float(x):,.{digits}f}"
+    except (TypeError, ValueError):
+        return None
+
+
+def _join(*fields, sep: str = " | ") -> str:
+    """Join (label, value) pairs, skipping missing values; label may be a format string with {}."""
+    parts = []
+    for label, value in fields:
+        if value is not None:
+            parts.append(label.format(value) if "{}" in label else f"{label} {value}")
+    return sep.join(parts)
+
+
+def _header_level(line: str) -> int:
+    """1 for a section ("## ..."), 2 for a sub-header ("...:"), 0 for a body line."""
+    if line.startswith("## "):
+        return 1
+    return 2 if line.endswith(":") else 0
+
+
+def _has_body(lines: list, i: int) -> bool:
+    """Whether header lines[i] has a body line before the next header of the same or higher level."""
+    level = _header_level(lines[i])
+    for line in lines[i + 1:]:
+        nxt = _header_level(line)
+        if not nxt:
+            return True
+        if nxt <= level:
+            return False
+    return False
+
+
+def _backtest_lines(bt: dict) -> list:
+    """(priority, line) pairs for a backtest payload, in display order."""
+    out = []
+    ticker = bt.get("ticker")
+    out.append((0, f"## Backtest{f': {ticker}' if ticker else ''}"))
+
+    m = bt.get("overall_metrics") or {}
+    if m:
+        out.append((0, "Overall: " + _join(
+            ("n={}", _num(m.get("total_events"), 0)),
+            ("avg", _pct(m.get("avg_return"), 2)),
+            ("median", _pct(m.get("median_return"), 2)),
+            ("win", _pct(m.get("win_rate"), 0, signed=False)),
+            ("Sharpe", _num(m.get("sharpe"))),
+            ("Sortino", _num(m.get("sortino"))),
+            ("MaxDD", _pct(m.get("max_drawdown"))),
+            ("PF", _num(m.get("profit_factor"))),
+        )))
+        out.append((1, "Risk: " + _join(
+            ("std", _pct(m.get("std_dev"), 2, signed=False)),
+            ("VaR95", _pct(m.get("var_95"), 2)),
+            ("CVaR95", _pct(m.get("cvar_95"), 2)),
+            ("avg win", _pct(m.get("avg_win"), 2)),
+            ("avg loss", _pct(m.get("avg_loss"), 2)),
+            ("best", _pct(m.get("best_trade"), 2)),
+            ("worst", _pct(m.get("worst_trade"), 2)),
+            ("ann. vol", _pct(m.get("avg_volatility"), signed=False)),
+        )))
+
+    by_event = bt.get("metrics_by_event") or {}
+    if by_event:
+        out.append((1, "By event type:"))
+        for etype, em in by_event.items():
+            out.append((1, f"- {etype}: " + _join(
+                ("n={}", _num(em.get("total_events"), 0)),
+                ("avg", _pct(em.get("avg_return"), 2)),
+                ("win", _pct(em.get("win_rate"), 0, signed=False)),
+                ("std", _pct(em.get("std_dev"), 2, signed=False)),
+                ("Sharpe", _num(em.get("sharpe"))),
+            )))
+
+    trades = bt.get("event_returns") or bt.get("top_trades") or []
+    trades = [t for t in trades if isinstance(t, dict) and t.get("total_return") is not None]
+    if trades:
+        rets = np.array([float(t["total_return"]) for t in trades])
+        if len(rets) >= 5:
+            qs = np.percentile(rets, [10, 25, 50, 75, 90])
+            out.append((2, f"Return quantiles (n={len(rets)}): min {_pct(rets.min(), 2)} | " +
+                           " | ".join(f"p{p} {_pct(q, 2)}" for p, q in zip((10, 25, 50, 75, 90), qs)) +
+                           f" | max {_pct(rets.max(), 2)}"))
+
+        order = np.argsort(rets)
+        k = min(5, len(trades) // 2 or 1)
+        best = [trades[i] for i in order[::-1][:k]]
+        worst = [trades[i] for i in order[:k]] if len(trades) > 1 else []
+
+        def _row(t):
+            extra = _join(("vol", _pct(t.get("volatility"), 0, signed=False)),
+                          ("volume x{}", _num(t.get("volume_ratio"), 1)), sep=", ")
+            return (f"  {t.get('date', '?')} {t.get('event_type', '')} {_pct(t['total_return'], 2)}"
+                    + (f" ({extra})" if extra else ""))
+
+        # Interleave priorities so a tight budget keeps the extremes from both ends
+        out.append((3, "Best trades:"))
+        out += [(3 + i, _row(t)) for i, t in enumerate(best)]
+        if worst:
+            out.append((3, "Worst trades:"))
+            out += [(3 + i, _row(t)) for i, t in enumerate(worst)]
+    return out
+
+
+def _stock_lines(st: dict) -> list:
+    out = []
+    q = st.get("quote") or {}
+    f = st.get("fundamentals") or {}
+    name = st.get("company") or st.get("ticker") or ""
+    sector = f.get("sector") or st.get("sector")
+    out.append((1, f"## Stock: {name}{f' ({sector})' if sector and sector != 'N/A' else ''}"))
+    if q:
+        week52 = None
+        if f.get("52w_low") is not None and f.get("52w_high") is not None:
+            week52 = f"{_num(f['52w_low'], 0)}–{_num(f['52w_high'], 0)}"
+        out.append((1, _join(
+            ("Price", _inr(q.get("current"))),
+            ("{}% today", _num(q.get("change_pct"))),
+            ("52w", week52),
+            ("{}% of 52w range", _num(f.get("52w_position"), 0)),
+        )))
+    if f:
+        out.append((2, _join(
+            ("MCap {} Cr", _inr(f.get("market_cap_cr"), 0)),
+            ("P/E", _num(f.get("trailing_pe"), 1)),
+            ("fwd P/E", _num(f.get("forward_pe"), 1)),
+            ("P/B", _num(f.get("pb_ratio"), 1)),
+            ("ROE {}%", _num(f.get("roe"), 1)),
+            ("D/E", _num(f.get("debt_to_equity"), 1)),
+            ("beta", _num(f.get("beta"))),
+            ("rev growth {}%", _num(f.get("revenue_growth"), 1)),
+        )))
+        if f.get("num_analysts"):
+            out.append((3, "Analysts: " + _join(
+                ("rating", f.get("analyst_recommendation")),
+                ("target", _inr(f.get("target_price"))),
+                ("{} analysts", _num(f["num_analysts"], 0)),
+            )))
+    news = st.get("news") or []
+    if news:
+        out.append((3, f"News sentiment (VADER avg): {_num(st.get('avg_sentiment')) or 'n/a'}"))
+        out += [(5 + i, f"  {n.get('title', '')[:110]}" + (f" ({_num(n['sentiment'])})" if "sentiment" in n else ""))
+                for i, n in enumerate(news[:5])]
+    return out
+
+
+def build_chat_context(context: dict, budget_tokens: int = CONTEXT_TOKENS) -> str:
+    """Compact text summary of `context` ({'backtest': ..., 'stock': ...}) within `budget_tokens`."""
+    lines = []
+    if isinstance(context.get("backtest"), dict):
+        lines += _backtest_lines(context["backtest"])
+    if isinstance(context.get("stock"), dict):
+        lines += _stock_lines(context["stock"])
+    if not lines:
+        blob = json.dumps(context, separators=(",", ":"), default=str)
+        return blob[:budget_tokens * CHARS_PER_TOKEN]
+
+    chosen, spent = set(), 0
+    for idx in sorted(range(len(lines)), key=lambda i: lines[i][0]):  # stable: display order within a priority
+        cost = _tokens(lines[idx][1])
+        if spent + cost <= budget_tokens:
+            chosen.add(idx)
+            spent += cost
+    kept = [line for i, (_, line) in enumerate(lines) if i in chosen]
+    # Drop headers whose section body (including sub-sections) didn't fit
+    return "\n".join(line for i, line in enumerate(kept) if not _header_level(line) or _has_body(kept, i))
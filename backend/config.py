@@ -16,14 +16,38 @@ REDDIT_CLIENT_SECRET = os.getenv("REDDIT_CLIENT_SECRET", "")
 
 # AI Intelligence Layer (free tier at console.groq.com)
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
+# Account budgets the request scheduler keeps under (free-tier defaults)
+GROQ_RPM = int(os.getenv("GROQ_RPM", "30"))
+GROQ_TPM = int(os.getenv("GROQ_TPM", "6000"))
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "4"))
 
 # Cache settings
 CACHE_DIR = "cache"
 CACHE_EXPIRY = 300
+# Shared cache tier for multi-worker deployments: memory | sqlite | redis
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_URL = os.getenv("CACHE_URL", "")  # sqlite file path or redis:// URL
 
 # API settings
 API_HOST = "0.0.0.0"
 API_PORT = 8000
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))  # uvicorn worker processes
+WS_MAX_SYMBOLS = int(os.getenv("WS_MAX_SYMBOLS", "50"))   # live subscriptions per WebSocket
+
+# Cache pre-warming: symbols to warm (comma-separated, default NIFTY50), run on
+# startup and again each weekday at PREWARM_AT IST (empty to disable)
+PREWARM_SYMBOLS = [s.strip().upper() for s in os.getenv("PREWARM_SYMBOLS", "").split(",") if s.strip()]
+PREWARM_ON_STARTUP = os.getenv("PREWARM_ON_STARTUP", "1") not in ("0", "false", "False", "")
+PREWARM_AT = os.getenv("PREWARM_AT", "09:00")
+PREWARM_BATCH = int(os.getenv("PREWARM_BATCH", "5"))      # symbols fetched concurrently
+PREWARM_PAUSE = float(os.getenv("PREWARM_PAUSE", "2.0"))  # seconds between batches
+
+# Request tracing: share of requests traced (spans are cheap; 1.0 traces all)
+# and how many finished traces are kept for /api/debug/traces
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_KEEP = int(os.getenv("TRACE_KEEP", "200"))
+# Shared secret for the profiling endpoints (X-Debug-Token header); unset disables them
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN", "")
 
 # Data endpoints
 FINNHUB_BASE = "https://finnhub.io/api/v1"
@@ -0,0 +1,300 @@
+"""
+Event calendar store.
+Every event series — curated earnings, yfinance earnings, RBI policy and Union
+Budget dates — is held as one sorted datetime64 array per (type, symbol,
+source), so range and "upcoming" lookups are two binary searches instead of
+parsing date strings per request. Fetched series are persisted to a single
+.npz file and refreshed in the background once they are older than `max_age`.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import CACHE_DIR
+
+CALENDAR_PATH = os.path.join(CACHE_DIR, "events", "calendar.npz")
+RETRY_AFTER = 900  # seconds before re-trying a fetch that failed
+FOLLOW_POLL = 60   # seconds between checks for a newer file written by the refreshing worker
+_EMPTY = np.empty(0, dtype="datetime64[s]")
+
+
+def _bound(ts):
+    """datetime / Timestamp / str → naive datetime64[s] (None passes through)."""
+    if ts is None:
+        return None
+    ts = pd.Timestamp(ts)
+    if ts.tzinfo is not None:
+        ts = ts.tz_localize(None)
+    return np.datetime64(ts.to_datetime64(), "s")
+
+
+def _series(dates) -> np.ndarray:
+    """Iterable of dates → sorted, de-duplicated naive datetime64[s] array."""
+    if dates is None or len(dates) == 0:
+        return _EMPTY
+    idx = pd.DatetimeIndex(pd.to_datetime(list(dates)))
+    if idx.tz is not None:
+        idx = idx.tz_localize(None)
+    return np.unique(idx.values.astype("datetime64[s]"))
+
+
+class EventCalendar:
+    """Sorted per-series event arrays with on-demand fetch, persistence and scheduled refresh.
+
+    Series are keyed by (type, symbol, source); market-wide events use symbol ''.
+    `fetchers` maps (type, source) → fn(symbol) returning dates, for the series
+    that come from upstream rather than from the curated tables. Only symbols
+    in `universe` (default: any) are kept current by the scheduled refresh;
+    others are fetched on demand, and dropped when upstream has nothing for them.
+    """
+
+    def __init__(self, path: str = CALENDAR_PATH, fetchers: dict = None, max_age: float = 86400,
+                 universe=None):
+        self.path = path
+        self.fetchers = fetchers or {}
+        self.max_age = max_age
+        self.universe = set(universe) if universe is not None else None
+        self._data: dict = {}      # (type, symbol, source) → datetime64[s] array
+        self._fetched: dict = {}   # key → time of last successful fetch
+        self._failed: dict = {}    # key → time of last failed fetch
+        self._tracked: set = set() # symbols the scheduled refresh keeps current
+        self._lock = threading.Lock()
+        self._key_locks: dict = {} # key → lock serialising fetches of that series
+        self._mtime = None         # mtime of the file as last loaded or saved
+        self._thread = None
+        self.load()
+
+    # ── Writes ───────────────────────────────────────────────────────────────
+
+    def set(self, kind: str, symbol: str, source: str, dates, fetched: float = None):
+        arr = _series(dates)
+        with self._lock:
+            self._data[(kind, symbol, source)] = arr
+            if fetched is not None:
+                self._fetched[(kind, symbol, source)] = fetched
+
+    def seed(self, kind: str, source: str, table: dict):
+        """Load a curated {symbol: [date, ...]} table."""
+        for symbol, dates in table.items():
+            self.set(kind, symbol, source, dates)
+
+    def _trackable(self, symbol: str) -> bool:
+        return self.universe is None or symbol in self.universe
+
+    def _key_lock(self, key) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _fetch(self, kind: str, symbol: str, source: str):
+        key = (kind, symbol, source)
+        try:
+            dates = self.fetchers[(kind, source)](symbol)
+        except Exception as e:
+            print(f"[calendar] fetch failed {kind}/{source} {symbol}: {e}")
+            with self._lock:
+                self._failed[key] = time.time()
+            return False
+        arr = _series(dates)
+        if not len(arr) and not self._trackable(symbol):
+            # Nothing upstream for a symbol outside the universe: remember the miss
+            # like a failure instead of storing (and persisting) an empty series
+            with self._lock:
+                self._data.pop(key, None)
+                self._fetched.pop(key, None)
+                self._failed[key] = time.time()
+            return False
+        self.set(kind, symbol, source, arr, fetched=time.time())
+        with self._lock:
+            self._failed.pop(key, None)
+        return True
+
+    def _ensure(self, kind: str, symbol: str, source: str):
+        """First lookup of a fetched series fetches it synchronously.
+
+        Later staleness is the scheduler's job for universe symbols; series
+        for other symbols are re-fetched here once older than `max_age`.
+        """
+        key = (kind, symbol, source)
+        if (kind, source) not in self.fetchers or not self._stale(key, symbol):
+            return
+        if time.time() - self._failed.get(key, 0) < RETRY_AFTER:
+            return
+        if self._trackable(symbol):
+            self._tracked.add(symbol)
+        with self._key_lock(key):
+            if self._stale(key, symbol) and self._fetch(kind, symbol, source):
+                self.save()
+
+    def _stale(self, key, symbol: str) -> bool:
+        if key not in self._data:
+            return True
+        return not self._trackable(symbol) and time.time() - self._fetched.get(key, 0) >= self.max_age
+
+    # ── Queries ──────────────────────────────────────────────────────────────
+
+    def sources(self, kind: str, symbol: str = '') -> list:
+        """Sources of a series in preference order: curated tables, then upstream fetchers.
+
+        Independent of insertion order, so series loaded from disk before the
+        curated tables are seeded do not take precedence over them.
+        """
+        with self._lock:
+            found = [src for (k, s, src) in self._data if k == kind and s == symbol]
+        found += [src for (k, src) in self.fetchers if k == kind and src not in found]
+        return sorted(found, key=lambda src: src != 'curated')
+
+    def dates(self, kind: str, symbol: str = '', source: str = 'curated',
+              start=None, end=None, fetch: bool = True) -> np.ndarray:
+        """Dates in [start, end] (inclusive) for one series, as a datetime64[s] view."""
+        if fetch:
+            self._ensure(kind, symbol, source)
+        arr = self._data.get((kind, symbol, source), _EMPTY)
+        lo = 0 if start is None else np.searchsorted(arr, _bound(start), side="left")
+        hi = len(arr) if end is None else np.searchsorted(arr, _bound(end), side="right")
+        return arr[lo:hi]
+
+    def events(self, kind: str, symbol: str = '', start=None, end=None,
+               sources: tuple = None, fetch: bool = True) -> list:
+        """[{'date', 'type'}] from the first source (in preference order) with any events in range."""
+        for source in sources or self.sources(kind, symbol):
+            arr = self.dates(kind, symbol, source, start, end, fetch)
+            if len(arr):
+                return [{'date': d, 'type': kind} for d in np.datetime_as_string(arr, unit="D").tolist()]
+        return []
+
+    def upcoming(self, symbol: str, kinds: tuple = ('earnings', 'rbi', 'budget'),
+                 days: int = 120, limit: int = 5, now=None) -> list:
+        """Next events within `days` for a symbol plus market-wide types, soonest first. Never fetches."""
+        now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+        end = now + pd.Timedelta(days=days)
+        out = []
+        for kind in kinds:
+            for symbol_key in (symbol, ''):
+                found = self.events(kind, symbol_key, now, end, fetch=False)
+                if found:
+                    out += found
+                    break
+        out.sort(key=lambda e: e['date'])
+        return out[:limit]
+
+    # ── Persistence ──────────────────────────────────────────────────────────
+
+    def save(self):
+        """Write fetched series (curated tables are re-seeded from code) to one .npz."""
+        with self._lock:
+            keys = [k for k in self._data if k in self._fetched]
+            arrays = [self._data[k] for k in keys]
+            fetched = [self._fetched[k] for k in keys]
+        lengths = np.array([len(a) for a in arrays], dtype=np.int64)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + ".tmp.npz"
+            np.savez(tmp, keys=np.array(["|".join(k) for k in keys], dtype=str),
+                     lengths=lengths, fetched=np.array(fetched, dtype=np.float64),
+                     dates=np.concatenate(arrays) if arrays else _EMPTY)
+            os.replace(tmp, self.path)
+            self._mtime = os.path.getmtime(self.path)
+        except Exception as e:
+            print(f"[calendar] save failed: {e}")
+
+    def load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+            with np.load(self.path) as f:
+                keys, lengths, fetched, dates = f["keys"], f["lengths"], f["fetched"], f["dates"]
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"[calendar] load failed: {e}")
+            return
+        self._mtime = mtime
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        with self._lock:
+            for i, key in enumerate(keys):
+                kind, symbol, source = str(key).split("|")
+                if symbol and not self._trackable(symbol):
+                    if lengths[i] == 0:
+                        continue  # empty off-universe series saved by older versions
+                elif symbol:
+                    self._tracked.add(symbol)
+                self._data[(kind, symbol, source)] = dates[offsets[i]:offsets[i + 1]].astype("datetime64[s]")
+                self._fetched[(kind, symbol, source)] = float(fetched[i])
+
+    def reload_if_changed(self) -> bool:
+        """Load the file again if another worker has written it since we last did."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self.load()
+        return True
+
+    # ── Scheduled refresh ────────────────────────────────────────────────────
+
+    def refresh(self, symbols: list = None, force: bool = False, pause: float = 0.0) -> int:
+        """Re-fetch stale upstream series for `symbols` (default: every tracked symbol)."""
+        now = time.time()
+        refreshed = 0
+        with self._lock:
+            # Drop expired misses so queries for junk symbols do not accumulate
+            self._failed = {k: t for k, t in self._failed.items() if now - t < RETRY_AFTER}
+            self._key_locks = {k: l for k, l in self._key_locks.items() if k in self._data or k in self._failed}
+        for symbol in list(symbols or self._tracked):
+            for kind, source in list(self.fetchers):
+                key = (kind, symbol, source)
+                if not force and now - self._fetched.get(key, 0) < self.max_age:
+                    continue
+                if not force and now - self._failed.get(key, 0) < RETRY_AFTER:
+                    continue
+                with self._key_lock(key):
+                    refreshed += self._fetch(kind, symbol, source)
+                time.sleep(pause)  # spread background fetches out for the upstream
+        if refreshed:
+            self.save()
+        return refreshed
+
+    def start(self, symbols: list = (), interval: float = 3600, claim=None):
+        """Refresh `symbols` and everything queried since, every `interval` seconds, in a daemon thread.
+
+        With several workers, pass `claim` (→ bool): only the worker holding it
+        fetches upstream; the others reload the file whenever it writes a new one.
+        """
+        if self._thread is not None:
+            return
+        self._tracked.update(s for s in symbols if self._trackable(s))
+
+        def _loop():
+            while True:
+                try:
+                    if claim is not None and not claim():
+                        deadline = time.time() + interval
+                        while time.time() < deadline:
+                            self.reload_if_changed()
+                            time.sleep(min(FOLLOW_POLL, max(0.0, deadline - time.time())))
+                        continue
+                    n = self.refresh(pause=1.0)
+                    if n:
+                        print(f"[calendar] refreshed {n} series")
+                except Exception as e:
+                    print(f"[calendar] refresh failed: {e}")
+                time.sleep(interval)
+
+        self._thread = threading.Thread(target=_loop, daemon=True, name="event-calendar")
+        self._thread.start()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'series': len(self._data),
+                'events': int(sum(len(a) for a in self._data.values())),
+                'fetched': len(self._fetched),
+                'tracked': len(self._tracked),
+                'oldest_fetch_age_s': round(time.time() - min(self._fetched.values()), 0) if self._fetched else None,
+                'refreshing': self._thread is not None,
+            }
+
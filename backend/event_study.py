@@ -0,0 +1,144 @@
+"""
+Cross-sectional event study.
+Aligns a universe of daily closes with the market index into one
+(days × symbols) return matrix, fits a market model (R = α + β·Rm) for every
+(symbol, event) pair over an estimation window before the event, and turns
+the event-window residuals into abnormal returns (AR) and cumulative abnormal
+returns (CAR). Every pair is handled in the same NumPy gather, so a whole
+sector across every RBI or Budget date is one pass, not one backtest each.
+"""
+import numpy as np
+import pandas as pd
+
+MIN_ESTIMATION_OBS = 30  # fewer valid estimation days than this → pair dropped
+
+
+def return_matrix(closes: dict, market: pd.Series) -> tuple:
+    """(dates, symbols, R[days × symbols], Rm[days]) on the market's trading days."""
+    market = market.sort_index()
+    panel = pd.concat({sym: s.sort_index() for sym, s in closes.items()}, axis=1).reindex(market.index)
+    R = panel.pct_change(fill_method=None).to_numpy(dtype=np.float64)
+    Rm = market.pct_change(fill_method=None).to_numpy(dtype=np.float64)
+    return market.index, list(panel.columns), R, Rm
+
+
+def _market_model(y: np.ndarray, x: np.ndarray) -> tuple:
+    """Row-wise OLS of y on x over (pairs × days), ignoring NaNs: (alpha, beta, sigma, n)."""
+    ok = np.isfinite(y) & np.isfinite(x)
+    n = ok.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mx = np.where(ok, x, 0.0).sum(axis=1) / n
+        my = np.where(ok, y, 0.0).sum(axis=1) / n
+        dx = np.where(ok, x - mx[:, None], 0.0)
+        dy = np.where(ok, y - my[:, None], 0.0)
+        beta = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+        alpha = my - beta * mx
+        resid = dy - beta[:, None] * dx
+        sigma = np.sqrt((resid * resid).sum(axis=1) / (n - 2))
+    return alpha, beta, sigma, n
+
+
+def _t(mean: np.ndarray, se: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(se > 0, mean / se, 0.0)
+
+
+def event_study(dates: pd.DatetimeIndex, symbols: list, R: np.ndarray, Rm: np.ndarray,
+                events: dict, before: int = 5, after: int = 5,
+                estimation: int = 120, gap: int = 5) -> dict:
+    """Market-model event study over every (symbol, event) pair.
+
+    events: {symbol: [date, ...]}; an event falls on the first trading day on
+    or after its date. The event window is [-before, +after] trading days and
+    the estimation window is the `estimation` days ending `gap` days before it.
+
+    Per-pair t-stats use the estimation residual variance (var CAR = L·σ²);
+    the overall CAAR t-stat is computed across per-event averages, so the
+    cross-correlation of stocks reacting on the same macro day doesn't inflate it.
+    """
+    col = {sym: j for j, sym in enumerate(symbols)}
+    pair_sym, pair_pos = [], []
+    day_values = dates.values
+    for sym, evs in events.items():
+        if sym not in col or not len(evs):
+            continue
+        pos = np.searchsorted(day_values, pd.DatetimeIndex(pd.to_datetime(list(evs))).values, side="left")
+        pair_pos.append(pos)
+        pair_sym.append(np.full(len(pos), col[sym]))
+    if not pair_pos:
+        return _empty(symbols, before, after)
+    pair_sym = np.concatenate(pair_sym)
+    pair_pos = np.concatenate(pair_pos)
+
+    est_start = before + gap + estimation
+    inside = (pair_pos - est_start >= 0) & (pair_pos + after < len(dates))
+    pair_sym, pair_pos = pair_sym[inside], pair_pos[inside]
+    if not len(pair_pos):
+        return _empty(symbols, before, after)
+
+    # Gather every pair's estimation and event windows at once: (pairs × days)
+    est_rows = pair_pos[:, None] + np.arange(-est_start, -before - gap)
+    ev_rows = pair_pos[:, None] + np.arange(-before, after + 1)
+    cols = pair_sym[:, None]
+    alpha, beta, sigma, n_est = _market_model(R[est_rows, cols], Rm[est_rows])
+
+    AR = R[ev_rows, cols] - (alpha[:, None] + beta[:, None] * Rm[ev_rows])
+    valid = (n_est >= MIN_ESTIMATION_OBS) & np.isfinite(sigma) & np.isfinite(AR).all(axis=1)
+    AR, sigma, beta = AR[valid], sigma[valid], beta[valid]
+    pair_sym, pair_pos = pair_sym[valid], pair_pos[valid]
+    if not len(AR):
+        return _empty(symbols, before, after)
+
+    CAR = np.cumsum(AR, axis=1)
+    L = AR.shape[1]
+    car_var = L * sigma ** 2  # variance of each pair's final CAR
+
+    def _group(keys: np.ndarray, size: int) -> tuple:
+        """Mean CAR curve, final-CAR t-stat, count and mean beta per group key."""
+        count = np.bincount(keys, minlength=size)
+        curve = np.zeros((size, L))
+        np.add.at(curve, keys, CAR)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            curve /= count[:, None]
+            se = np.sqrt(np.bincount(keys, weights=car_var, minlength=size)) / count
+            mean_beta = np.bincount(keys, weights=beta, minlength=size) / count
+        return curve, _t(curve[:, -1], se), count, mean_beta
+
+    sym_curve, sym_t, sym_n, sym_beta = _group(pair_sym, len(symbols))
+    ev_days, ev_keys = np.unique(pair_pos, return_inverse=True)
+    ev_curve, ev_t, ev_n, _ = _group(ev_keys, len(ev_days))
+
+    caar = ev_curve.mean(axis=0)
+    final = ev_curve[:, -1]
+    caar_se = final.std(ddof=1) / np.sqrt(len(final)) if len(final) > 1 else 0.0
+
+    def _r(a, digits=5):
+        return np.round(a, digits).tolist()
+
+    return {
+        'days': list(range(-before, after + 1)),
+        'n_pairs': int(len(AR)),
+        'n_events': int(len(ev_days)),
+        'caar': _r(caar),
+        'caar_final': round(float(caar[-1]), 5),
+        't_stat': round(float(_t(caar[-1], caar_se)), 3),
+        'positive_share': round(float((CAR[:, -1] > 0).mean()), 3),
+        'by_symbol': {
+            sym: {'car': _r(sym_curve[j]), 'car_final': round(float(sym_curve[j, -1]), 5),
+                  't_stat': round(float(sym_t[j]), 3), 'n_events': int(sym_n[j]),
+                  'beta': round(float(sym_beta[j]), 3)}
+            for j, sym in enumerate(symbols) if sym_n[j]
+        },
+        'by_event': {
+            pd.Timestamp(dates[p]).strftime('%Y-%m-%d'): {
+                'car': _r(ev_curve[k]), 'car_final': round(float(ev_curve[k, -1]), 5),
+                't_stat': round(float(ev_t[k]), 3), 'n_symbols': int(ev_n[k])}
+            for k, p in enumerate(ev_days)
+        },
+    }
+
+
+def _empty(symbols: list, before: int, after: int) -> dict:
+    return {'days': list(range(-before, after + 1)), 'n_pairs': 0, 'n_events': 0,
+            'caar': [], 'caar_final': 0.0, 't_stat': 0.0, 'positive_share': 0.0,
+            'by_symbol': {}, 'by_event': {}}
@@ -0,0 +1,130 @@
+"""
+Flat-array export of fitted scikit-learn random forests.
+All trees are concatenated into contiguous node arrays (feature, threshold,
+children, leaf values) and evaluated with a vectorised level-by-level
+traversal over every (tree, row) pair of a block of rows at once. Leaves loop
+back to themselves with a +inf threshold, so every level is the same
+branch-free gather. Blocks are sized so the per-level work arrays stay in
+cache and are reused in place; large batches are no slower per row than
+small ones. Results match the source forest's predict / predict_proba exactly.
+"""
+import numpy as np
+
+BLOCK_ELEMS = 1 << 15  # (tree, row) pairs per block: ~32k keeps every work array in L2
+
+
+def _stores_counts(tree) -> bool:
+    """Whether a classifier tree's leaf values are class counts rather than fractions.
+
+    Older sklearn releases store (weighted) counts and normalise them in
+    predict_proba; newer ones store fractions and return them untouched.
+    """
+    leaf = tree.children_left == -1
+    return not np.allclose(tree.value[leaf, 0].sum(axis=1), 1.0, rtol=0, atol=1e-12)
+
+
+class FlatForest:
+    """A fitted RandomForestClassifier/Regressor as contiguous NumPy arrays."""
+
+    def __init__(self, feature, threshold, children, missing_left, value, roots,
+                 max_depth: int, classes=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children  # (n_nodes * 2,): [left, right] per node; leaves point at themselves
+        self.missing_left = missing_left
+        self.value = value        # (n_nodes, n_outputs): class proba rows or regression value
+        self.roots = roots        # first node of each tree
+        self.max_depth = max_depth
+        self.classes_ = classes   # None for regressors
+
+    @classmethod
+    def from_sklearn(cls, forest) -> "FlatForest":
+        """Flatten a fitted single-output sklearn forest."""
+        is_clf = hasattr(forest, "classes_")
+        normalize = is_clf and any(_stores_counts(est.tree_) for est in forest.estimators_)
+        feats, thrs, children, missing, values, roots = [], [], [], [], [], []
+        offset, depth = 0, 0
+        for est in forest.estimators_:
+            t = est.tree_
+            n = t.node_count
+            leaf = t.children_left == -1
+            self_idx = np.arange(n) + offset
+            roots.append(offset)
+            feats.append(np.where(leaf, 0, t.feature))
+            thrs.append(np.where(leaf, np.inf, t.threshold))
+            children.append(np.stack([np.where(leaf, self_idx, t.children_left + offset),
+                                      np.where(leaf, self_idx, t.children_right + offset)], axis=1).ravel())
+            missing_left = np.asarray(getattr(t, "missing_go_to_left", np.zeros(n)), dtype=bool)
+            missing.append(missing_left | leaf)
+            if is_clf:
+                v = t.value[:, 0, :forest.n_classes_].astype(np.float64)
+                if normalize:
+                    norm = v.sum(axis=1)[:, np.newaxis]
+                    norm[norm == 0.0] = 1.0
+                    v = v / norm
+            else:
+                v = t.value[:, 0, :1].astype(np.float64)
+            values.append(v)
+            offset += n
+            depth = max(depth, t.max_depth)
+
+        return cls(
+            feature=np.concatenate(feats).astype(np.intp),
+            threshold=np.concatenate(thrs).astype(np.float64),
+            children=np.concatenate(children).astype(np.intp),
+            missing_left=np.concatenate(missing),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=int(depth),
+            classes=np.array(forest.classes_) if is_clf else None,
+        )
+
+    def _leaves(self, X: np.ndarray) -> np.ndarray:
+        """Leaf node index for every (tree, row) of a block, shape (n_trees * n_rows,)."""
+        n, n_feat = X.shape
+        flat_x = X.ravel()
+        has_nan = bool(np.isnan(flat_x).any())
+        node = np.repeat(self.roots, n)
+        row_base = np.tile(np.arange(n, dtype=np.intp) * n_feat, len(self.roots))
+        ix = np.empty_like(node)
+        x = np.empty(len(node))
+        thr = np.empty(len(node))
+        go_right = np.empty(len(node), dtype=bool)
+        # Indices are in range by construction, so mode='wrap' just skips the bounds check
+        for _ in range(self.max_depth):
+            np.take(self.threshold, node, out=thr, mode="wrap")
+            np.take(self.feature, node, out=ix, mode="wrap")
+            ix += row_base
+            np.take(flat_x, ix, out=x, mode="wrap")
+            if has_nan:
+                go_right = ~(x <= thr) & ~(np.isnan(x) & self.missing_left.take(node))
+            else:
+                np.greater(x, thr, out=go_right)
+            node <<= 1
+            node += go_right
+            np.take(self.children, node, out=node, mode="wrap")
+        return node
+
+    def _mean_leaf_value(self, X: np.ndarray) -> np.ndarray:
+        # sklearn evaluates trees on float32 input; round the same way, then widen
+        # once so every per-level comparison is float64 against float64
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        n_trees = len(self.roots)
+        out = np.empty((len(X), self.value.shape[1]))
+        block = max(1, BLOCK_ELEMS // n_trees)
+        for start in range(0, len(X), block):
+            xb = X[start:start + block]
+            leaf_vals = self.value.take(self._leaves(xb), axis=0, mode="wrap")
+            # Sum over the tree axis adds tree by tree, in sklearn's accumulation order
+            out[start:start + len(xb)] = leaf_vals.reshape(n_trees, len(xb), -1).sum(axis=0)
+        out /= n_trees
+        return out
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        return self._mean_leaf_value(X)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        out = self._mean_leaf_value(X)
+        if self.classes_ is not None:
+            return self.classes_.take(np.argmax(out, axis=1))
+        return out[:, 0]
@@ -3,26 +3,42 @@ Indian equity market data provider.
 Uses yfinance (.NS / .BO suffix) for all data — no API key required.
 NSE unofficial API used for live quotes with graceful fallback.
 """
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import requests
 import time
+import threading
 from datetime import datetime, timedelta
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 
-_vader = SentimentIntensityAnalyzer()
+from config import CACHE_BACKEND, CACHE_URL
+from event_calendar import EventCalendar
+from shared_cache import make_cache
+from live_bars import bars, INTERVALS as BAR_INTERVALS
+from telemetry import upstream
+from tracing import traced
+
+# yfinance and VADER are imported on first use so a worker starts serving quickly
+
+_vader = None
+
+
+def _sentiment():
+    """VADER analyzer, built on first use (loading its lexicon is not free)."""
+    global _vader
+    if _vader is None:
+        from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+        _vader = SentimentIntensityAnalyzer()
+    return _vader
 
 # ── Cache ──────────────────────────────────────────────────────────────────────
-_cache: dict = {}
+# Per-process L1 in front of the worker-shared tier chosen by CACHE_BACKEND
+data_cache = make_cache(CACHE_BACKEND, CACHE_URL)
 
 def _cached(key: str, ttl: int = 600):
-    e = _cache.get(key)
-    return e[1] if e and (time.time() - e[0]) < ttl else None
+    return data_cache.get(key, ttl)
 
 def _store(key: str, val):
-    _cache[key] = (time.time(), val)
-    return val
+    return data_cache.put(key, val)
 
 
 # ── Ticker lookup ──────────────────────────────────────────────────────────────
@@ -85,6 +101,8 @@ SECTOR_STOCKS = {
     'Conglomerate': ['LT','GRASIM','ADANIENT','ADANIPORTS','HAL'],
 }
 
+SECTOR_OF = {sym: sector for sector, syms in SECTOR_STOCKS.items() for sym in syms}
+
 
 def normalize_ticker(raw: str) -> str:
     """Convert user input (e.g. 'RELIANCE', 'tcs', 'Zomato') to NSE yfinance symbol."""
@@ -111,22 +129,115 @@ def _get_nse_session():
             'Referer': 'https://www.nseindia.com',
         })
         try:
-            s.get('https://www.nseindia.com', timeout=6)
+            with upstream('nse', 'session'):
+                s.get('https://www.nseindia.com', timeout=6)
         except Exception:
             pass
         _nse_session = s
     return _nse_session
 
 
+_bulk_lock = threading.Lock()
+_NIFTY50_SET = set(NIFTY50_STOCKS)
+_BULK_RETRY = 15  # seconds a failed bulk request is not retried (NSE throttles in bursts)
+
+
+def get_nse_index_quotes(index: str = 'NIFTY 50') -> dict:
+    """Live quotes for every constituent of an NSE index in one request.
+
+    Uses the index market-watch payload (equity-stockIndices) and fills the
+    per-symbol `nse:` cache from it, so subsequent get_nse_live_quote calls for
+    any constituent are served without another request. Returns {symbol: quote},
+    or {} while a recent bulk request has failed.
+    """
+    key = f"nseidx:{index}"
+    cached = _cached(key, ttl=30)
+    if cached is not None:
+        return cached
+    if _cached(f"nseidx_failed:{index}", ttl=_BULK_RETRY) is not None:
+        return {}
+    with _bulk_lock:  # concurrent pollers on a cold cache share one request
+        cached = _cached(key, ttl=30)
+        if cached is not None:
+            return cached
+        if data_cache.claim(key, ttl=10):
+            try:
+                return _fetch_index_quotes(index)
+            finally:
+                data_cache.release(key)
+    # Another worker is fetching it: wait for its result in the shared tier, outside the lock
+    for _ in range(30):
+        time.sleep(0.1)
+        cached = _cached(key, ttl=30)
+        if cached is not None:
+            return cached
+        if _cached(f"nseidx_failed:{index}", ttl=_BULK_RETRY) is not None:
+            break
+    return {}
+
+
+def _fetch_index_quotes(index: str) -> dict:
+    try:
+        s = _get_nse_session()
+        with upstream('nse', 'index_quotes') as call:
+            r = s.get('https://www.nseindia.com/api/equity-stockIndices', params={'index': index}, timeout=6)
+            call['ok'] = r.status_code == 200
+        if r.status_code != 200:
+            _store(f"nseidx_failed:{index}", r.status_code)
+            return {}
+        rows = r.json().get('data', [])
+    except Exception as e:
+        print(f"[indian] index quotes failed {index}: {e}")
+        _store(f"nseidx_failed:{index}", str(e))
+        return {}
+
+    quotes = {}
+    now = time.time()
+    for row in rows:
+        sym = row.get('symbol')
+        if not sym or sym == index or row.get('priority') == 1:
+            continue  # the index's own row
+        prev = _cached(f"nse:{sym}", ttl=float('inf')) or {}
+        q = {
+            'current': row.get('lastPrice', 0),
+            'previous_close': row.get('previousClose', 0),
+            'open': row.get('open', 0),
+            'high': row.get('dayHigh', 0),
+            'low': row.get('dayLow', 0),
+            # Not in the market-watch rows: keep what a single-symbol fetch last saw
+            'vwap': prev.get('vwap', 0),
+            'upper_circuit': prev.get('upper_circuit', 0),
+            'lower_circuit': prev.get('lower_circuit', 0),
+            'volume': row.get('totalTradedVolume', 0),
+        }
+        bars.update(sym, q['current'], q['volume'], now)
+        quotes[sym] = q
+    # One shared-tier write for the whole index
+    data_cache.put_many({**{f"nse:{sym}": q for sym, q in quotes.items()}, f"nseidx:{index}": quotes})
+    return quotes
+
+
 def get_nse_live_quote(symbol: str) -> dict:
-    """Real-time NSE quote. Returns empty dict on any failure."""
+    """Real-time NSE quote. Returns empty dict on any failure.
+
+    NIFTY 50 constituents are served from the bulk index payload; the
+    single-symbol quote-equity call is the fallback.
+    """
     nse_sym = symbol.replace('.NS', '').replace('.BO', '').replace('%26', '&')
     cached = _cached(f"nse:{nse_sym}", ttl=30)
     if cached is not None:
+        # Quotes another worker fetched still feed this worker's intraday bars
+        bars.update(nse_sym, cached.get('current'), cached.get('volume'))
         return cached
+    if nse_sym in _NIFTY50_SET:
+        quote = get_nse_index_quotes('NIFTY 50').get(nse_sym)
+        if quote:
+            return quote
     try:
         s = _get_nse_session()
-        r = s.get(f'https://www.nseindia.com/api/quote-equity?symbol={nse_sym}', timeout=5)
+        with upstream('nse', 'quote') as call:
+            r = s.get(f'https://www.nseindia.com/api/quote-equity?symbol={nse_sym}', timeout=5)
+            call['ok'] = r.status_code == 200
         if r.status_code != 200:
             return {}
         data = r.json()
@@ -141,6 +252,7 @@ def get_nse_live_quote(symbol: str) -> dict:
             'upper_circuit': pi.get('upperCP', 0),
             'lower_circuit': pi.get('lowerCP', 0),
         }
+        bars.update(nse_sym, result['current'])
         return _store(f"nse:{nse_sym}", result)
     except Exception:
         return {}
@@ -154,7 +266,8 @@ def _get_info_cached(ticker_obj, yf_sym: str) -> dict:
     if cached is not None:
         return cached
     try:
-        info = ticker_obj.info or {}
+        with upstream('yfinance', 'info'):
+            info = ticker_obj.info or {}
         if info:
             _store(f"info:{yf_sym}", info)
         return info
@@ -176,6 +289,7 @@ def get_stock_data(ticker_input: str) -> dict:
     result = {'raw_input': ticker_input, 'yf_symbol': yf_sym}
     nse_q = {}  # initialised before try so except block can reference it
     try:
+        import yfinance as yf
         t = yf.Ticker(yf_sym)
 
         # NSE live quote (30-s TTL — tried first, doesn't count against yf rate limit)
@@ -188,19 +302,20 @@ def get_stock_data(ticker_input: str) -> dict:
 
         fi_data = {}
         try:
-            fi = t.fast_info
-            fi_data = {
-                'last_price': _f(fi.last_price),
-                'previous_close': _f(fi.previous_close),
-                'open': _f(fi.open),
-                'day_high': _f(fi.day_high),
-                'day_low': _f(fi.day_low),
-                'year_high': _f(fi.year_high),
-                'year_low': _f(fi.year_low),
-                'market_cap': int(_f(fi.market_cap)),
-                'last_volume': int(_f(fi.last_volume)),
-                'three_month_average_volume': int(_f(fi.three_month_average_volume)),
-            }
+            with upstream('yfinance', 'fast_info'):  # lazy: the attribute reads below do the fetch
+                fi = t.fast_info
+                fi_data = {
+                    'last_price': _f(fi.last_price),
+                    'previous_close': _f(fi.previous_close),
+                    'open': _f(fi.open),
+                    'day_high': _f(fi.day_high),
+                    'day_low': _f(fi.day_low),
+                    'year_high': _f(fi.year_high),
+                    'year_low': _f(fi.year_low),
+                    'market_cap': int(_f(fi.market_cap)),
+                    'last_volume': int(_f(fi.last_volume)),
+                    'three_month_average_volume': int(_f(fi.three_month_average_volume)),
+                }
         except Exception:
             pass  # fast_info failed — use NSE data only
 
@@ -235,6 +350,9 @@ def get_stock_data(ticker_input: str) -> dict:
             'change_pct':     round((current - prev_cl) / prev_cl * 100, 2) if prev_cl else 0,
             'vwap':           round(nse_q.get('vwap', 0), 2),
         }
+        # Day volume is cumulative; the bar builder turns successive readings into per-bar volume
+        bars.update(yf_sym.replace('.NS', '').replace('.BO', ''), result['quote']['current'],
+                    nse_q.get('volume') or result['quote']['volume'])  # one volume source per symbol when NSE has it
 
         mc_info = int(info.get('marketCap', 0) or 0) or mc
         result['fundamentals'] = {
@@ -269,9 +387,11 @@ def get_stock_data(ticker_input: str) -> dict:
         # News + VADER sentiment — wrapped separately so rate limit here doesn't kill price data
         result['news'] = []
         try:
-            for n in (t.news or [])[:10]:
+            with upstream('yfinance', 'news'):
+                news = t.news or []
+            for n in news[:10]:
                 title = n.get('title', '')
-                score = _vader.polarity_scores(title)['compound']
+                score = _sentiment().polarity_scores(title)['compound']
                 result['news'].append({
                     'title':     title,
                     'source':    n.get('publisher', ''),
@@ -324,11 +444,14 @@ def get_historical_prices(ticker_input: str, period: str = '2y') -> pd.DataFrame
         return cached
 
     def _fetch():
+        import yfinance as yf
         t = yf.Ticker(yf_sym)
-        df = t.history(period=period, auto_adjust=True)
+        with upstream('yfinance', 'history'):
+            df = t.history(period=period, auto_adjust=True)
         if df.empty:
             # fallback: yf.download
-            df = yf.download(yf_sym, period=period, auto_adjust=True, progress=False)
+            with upstream('yfinance', 'download'):
+                df = yf.download(yf_sym, period=period, auto_adjust=True, progress=False)
         return df
 
     try:
@@ -350,13 +473,29 @@ def get_historical_prices(ticker_input: str, period: str = '2y') -> pd.DataFrame
     return _store(f"hist:{yf_sym}:{period}", df)
 
 
-def get_technicals(ticker_input: str) -> dict:
-    """Compute technical indicators from price history."""
+def get_technicals(ticker_input: str, interval: str = '1d') -> dict:
+    """Compute technical indicators from daily history, or from live intraday bars ('1m'/'5m')."""
+    if interval in BAR_INTERVALS:
+        nse_sym = normalize_ticker(ticker_input).replace('.NS', '').replace('.BO', '')
+        cached = _cached(f"tech:{ticker_input}:{interval}", ttl=15)
+        if cached is not None:
+            return cached
+        df = bars.frame(nse_sym, interval)
+        if len(df) < 2:
+            return {'error': f'No {interval} bars yet for {nse_sym} (built from live quotes)', 'ticker': ticker_input}
+        return _store(f"tech:{ticker_input}:{interval}", _technicals_payload(df, '%Y-%m-%d %H:%M'))
+
     cached = _cached(f"tech:{ticker_input}", ttl=300)
     if cached is not None:
         return cached
 
     df = get_historical_prices(ticker_input, period='1y')
+    return _store(f"tech:{ticker_input}", _technicals_payload(df, '%Y-%m-%d'))
+
+
+@traced('pandas.technicals')
+def _technicals_payload(df: pd.DataFrame, date_fmt: str) -> dict:
+    """Indicator series + signal badges for the last 252 bars of an OHLCV frame."""
     close = df['close']
     volume = df.get('volume', pd.Series(dtype=float))
 
@@ -390,12 +529,12 @@ def get_technicals(ticker_input: str) -> dict:
 
     # Last N rows for charts
     n = 252
-    idx = df.index[-n:].strftime('%Y-%m-%d').tolist()
+    idx = df.index[-n:].strftime(date_fmt).tolist()
 
     def s(series, decimals=2):
         return [round(float(x), decimals) if not pd.isna(x) else None for x in series.iloc[-n:]]
 
-    result = {
+    return {
         'dates':     idx,
         'close':     s(close),
         'open':      s(df['open']) if 'open' in df.columns else s(close),
@@ -415,7 +554,6 @@ def get_technicals(ticker_input: str) -> dict:
         'volume_ma20': [int(x) if not pd.isna(x) else 0 for x in (vol_ma20.iloc[-n:] if len(vol_ma20) > 0 else [])],
         'signals':   _compute_signals(close, rsi, macd_line, signal_line, sma20, sma50),
     }
-    return _store(f"tech:{ticker_input}", result)
 
 
 def _compute_signals(close, rsi, macd, signal, sma20, sma50) -> dict:
@@ -458,13 +596,15 @@ def get_quarterly_financials(ticker_input: str) -> dict:
         return cached
 
     try:
+        import yfinance as yf
         t = yf.Ticker(yf_sym)
         info = _get_info_cached(t, yf_sym)
 
         quarterly = []
         annual = []
 
-        qf = t.quarterly_financials
+        with upstream('yfinance', 'financials'):
+            qf = t.quarterly_financials
         if qf is not None and not qf.empty:
             rev_row = next((r for r in ['Total Revenue', 'Revenue', 'Operating Revenue'] if r in qf.index), None)
             pat_row = next((r for r in ['Net Income', 'Net Income Common Stockholders'] if r in qf.index), None)
@@ -483,7 +623,8 @@ def get_quarterly_financials(ticker_input: str) -> dict:
                         'pat_cr':     round(pat, 1) if pat is not None and not np.isnan(pat) else 0,
                     })
 
-        af = t.financials
+        with upstream('yfinance', 'financials'):
+            af = t.financials
         if af is not None and not af.empty:
             rev_row = next((r for r in ['Total Revenue', 'Revenue'] if r in af.index), None)
             pat_row = next((r for r in ['Net Income', 'Net Income Common Stockholders'] if r in af.index), None)
@@ -539,7 +680,9 @@ def get_indices() -> dict:
     # Try NSE allIndices API first
     try:
         s = _get_nse_session()
-        r = s.get('https://www.nseindia.com/api/allIndices', timeout=6)
+        with upstream('nse', 'all_indices') as call:
+            r = s.get('https://www.nseindia.com/api/allIndices', timeout=6)
+            call['ok'] = r.status_code == 200
         if r.status_code == 200:
             indices_data = r.json().get('data', [])
             want = {
@@ -567,9 +710,11 @@ def get_indices() -> dict:
     for sym, name in yf_map.items():
         if name not in data:
             try:
-                fi = yf.Ticker(sym).fast_info
-                cur  = float(fi.last_price or 0)
-                prev = float(fi.previous_close or cur)
+                import yfinance as yf
+                with upstream('yfinance', 'fast_info'):
+                    fi = yf.Ticker(sym).fast_info
+                    cur  = float(fi.last_price or 0)
+                    prev = float(fi.previous_close or cur)
                 data[name] = {
                     'value':      round(cur, 2),
                     'change':     round(cur - prev, 2),
@@ -616,29 +761,27 @@ KNOWN_EARNINGS = {
 }
 
 
+def _fetch_yf_earnings(nse_sym: str) -> list:
+    import yfinance as yf
+    with upstream('yfinance', 'earnings_dates'):
+        ed = yf.Ticker(normalize_ticker(nse_sym)).earnings_dates
+    return [] if ed is None or ed.empty else list(ed.index)
+
+
+calendar = EventCalendar(fetchers={('earnings', 'yfinance'): _fetch_yf_earnings},
+                         universe=set(NIFTY50_STOCKS).union(*SECTOR_STOCKS.values()))
+calendar.seed('earnings', 'curated', KNOWN_EARNINGS)
+calendar.seed('rbi', 'curated', {'': RBI_DATES})
+calendar.seed('budget', 'curated', {'': BUDGET_DATES})
+
+
 def get_events(ticker_input: str, event_type: str, start_date, end_date) -> list:
     """Event dates for Indian stocks."""
     nse_sym = normalize_ticker(ticker_input).replace('.NS', '').replace('.BO', '')
 
     if event_type == 'earnings':
-        # Try yfinance
-        yf_sym = normalize_ticker(ticker_input)
-        events = []
-        try:
-            ed = yf.Ticker(yf_sym).earnings_dates
-            if ed is not None and not ed.empty:
-                for dt in ed.index:
-                    if hasattr(dt, 'tz') and dt.tz:
-                        dt = dt.tz_localize(None)
-                    if start_date <= dt.replace(tzinfo=None) <= end_date:
-                        events.append({'date': dt.strftime('%Y-%m-%d'), 'type': 'earnings'})
-        except Exception:
-            pass
-
-        if not events:
-            known = KNOWN_EARNINGS.get(nse_sym, [])
-            events = [{'date': d, 'type': 'earnings'} for d in known
-                      if start_date <= pd.to_datetime(d) <= end_date]
+        # yfinance first, then the curated table
+        events = calendar.events('earnings', nse_sym, start_date, end_date, sources=('yfinance', 'curated'))
 
         if not events:
             # Generate approximate Indian quarterly dates
@@ -652,13 +795,8 @@ def get_events(ticker_input: str, event_type: str, start_date, end_date) -> list
                 cur += timedelta(days=30)
         return events
 
-    elif event_type == 'rbi':
-        return [{'date': d, 'type': 'rbi'} for d in RBI_DATES
-                if start_date <= pd.to_datetime(d) <= end_date]
-
-    elif event_type == 'budget':
-        return [{'date': d, 'type': 'budget'} for d in BUDGET_DATES
-                if start_date <= pd.to_datetime(d) <= end_date]
+    elif event_type in ('rbi', 'budget'):
+        return calendar.events(event_type, '', start_date, end_date)
 
     else:
         events = []
@@ -670,6 +808,12 @@ def get_events(ticker_input: str, event_type: str, start_date, end_date) -> list
         return events
 
 
+def get_earnings_history(ticker_input: str, start_date, end_date) -> list:
+    """Earnings dates for ML training: curated KNOWN_EARNINGS, else yfinance."""
+    nse_sym = normalize_ticker(ticker_input).replace('.NS', '').replace('.BO', '')
+    return calendar.events('earnings', nse_sym, start_date, end_date, sources=('curated', 'yfinance'))
+
+
 def format_inr(amount: float) -> str:
     if amount >= 1e12:
         return f"₹{amount/1e12:.2f}L Cr"
@@ -0,0 +1,116 @@
+"""
+Intraday OHLCV bars built from polled live quotes.
+Every fresh NSE quote (and the cumulative day volume from the stock snapshot)
+is folded into 1-minute and 5-minute bars per symbol. Bars live in fixed-size
+NumPy ring buffers, so memory per symbol is constant and reading a window is
+a single gather. Technicals, anomaly detection and the live feed read from
+here instead of calling upstream again.
+"""
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# interval → (bar seconds, ring capacity): two sessions of 1m bars, five of 5m
+INTERVALS = {"1m": (60, 750), "5m": (300, 375)}
+_COLS = ["open", "high", "low", "close", "volume"]
+
+
+class BarRing:
+    """Fixed-capacity ring of OHLCV bars for one symbol and interval."""
+
+    def __init__(self, seconds: int, capacity: int):
+        self.seconds = seconds
+        self.capacity = capacity
+        self.start = np.zeros(capacity, dtype=np.int64)  # bar open, epoch seconds
+        self.ohlcv = np.zeros((capacity, 5))
+        self.count = 0  # bars ever written; slot = index % capacity
+
+    def add(self, ts: float, price: float, volume: float):
+        start = int(ts) // self.seconds * self.seconds
+        if self.count:
+            j = (self.count - 1) % self.capacity
+            if start == self.start[j]:
+                row = self.ohlcv[j]
+                row[1] = max(row[1], price)
+                row[2] = min(row[2], price)
+                row[3] = price
+                row[4] += volume
+                return
+            if start < self.start[j]:
+                return  # late quote for a bar that is already closed
+        j = self.count % self.capacity
+        self.start[j] = start
+        self.ohlcv[j] = (price, price, price, price, volume)
+        self.count += 1
+
+    def window(self, limit: int = None, closed_only: bool = False, now: float = None) -> tuple:
+        """(starts, ohlcv) for the most recent bars, oldest first."""
+        oldest = max(0, self.count - self.capacity)
+        end = self.count
+        if closed_only and end:
+            j = (end - 1) % self.capacity
+            if self.start[j] + self.seconds > (now or time.time()):
+                end -= 1  # newest bar is still forming
+        n = end - oldest
+        if limit:
+            n = min(n, limit)
+        idx = np.arange(end - n, end) % self.capacity
+        return self.start[idx], self.ohlcv[idx]
+
+
+class BarAggregator:
+    """Per-symbol 1m/5m bar rings fed by live quotes."""
+
+    def __init__(self, intervals: dict = None):
+        self.intervals = intervals or INTERVALS
+        self._rings: dict = {}  # symbol → {interval: BarRing}
+        self._cum: dict = {}    # symbol → last cumulative day volume seen
+        self._lock = threading.Lock()
+
+    def update(self, symbol: str, price: float, cum_volume: float = None, ts: float = None):
+        """Fold one quote into every interval. `cum_volume` is the day's running total."""
+        if not price:
+            return
+        ts = ts or time.time()
+        with self._lock:
+            volume = 0.0
+            if cum_volume:
+                prev = self._cum.get(symbol)
+                if prev is not None and cum_volume >= prev:
+                    volume = float(cum_volume - prev)
+                self._cum[symbol] = cum_volume  # first sighting / new session: no delta yet
+            rings = self._rings.get(symbol)
+            if rings is None:
+                rings = self._rings[symbol] = {k: BarRing(sec, cap) for k, (sec, cap) in self.intervals.items()}
+            for ring in rings.values():
+                ring.add(ts, float(price), volume)
+
+    def frame(self, symbol: str, interval: str = "1m", limit: int = None, closed_only: bool = False) -> pd.DataFrame:
+        """Bars as an OHLCV DataFrame on a naive IST DatetimeIndex (like the daily history)."""
+        with self._lock:
+            ring = self._rings.get(symbol, {}).get(interval)
+            if ring is None:
+                starts, ohlcv = np.empty(0, dtype=np.int64), np.empty((0, 5))
+            else:
+                starts, ohlcv = ring.window(limit, closed_only)
+                starts, ohlcv = starts.copy(), ohlcv.copy()
+        index = pd.to_datetime(starts, unit="s", utc=True).tz_convert("Asia/Kolkata").tz_localize(None)
+        return pd.DataFrame(ohlcv, index=index, columns=_COLS)
+
+    def last_bar(self, symbol: str, interval: str = "1m") -> dict:
+        """Most recent completed bar, or None."""
+        df = self.frame(symbol, interval, limit=1, closed_only=True)
+        if df.empty:
+            return None
+        row = df.iloc[-1]
+        return {"t": df.index[-1].strftime("%Y-%m-%d %H:%M"),
+                **{c: round(float(row[c]), 2) for c in _COLS[:4]}, "volume": int(row["volume"])}
+
+    def symbols(self) -> list:
+        with self._lock:
+            return sorted(self._rings)
+
+
+bars = BarAggregator()
@@ -0,0 +1,190 @@
+"""
+Live quote publisher for the WebSocket feed.
+One polling task per subscribed symbol, however many sockets watch it; each
+update is fanned out to every subscriber. A socket can hold any number of
+symbols, and a symbol's poller stops with its last subscriber. The blocking
+upstream fetch runs in a worker thread, never on the event loop.
+
+Quote state is conflated per subscriber: only the latest quote per symbol is
+held until the socket is ready, so a slow or throttled client never builds a
+backlog. Protocol v2 clients get a snapshot on subscribe and then only the
+fields that changed; v1 clients keep receiving full 'price_update' messages.
+"""
+import asyncio
+import json
+import time
+
+try:
+    import msgpack
+except ImportError:  # binary frames are optional
+    msgpack = None
+
+PROTOCOL_VERSION = 2
+ENCODINGS = ('json', 'msgpack') if msgpack else ('json',)
+_VOLATILE = ('timestamp',)  # refreshed on every poll; never a change on its own
+
+
+def encode(message: dict, encoding: str = 'json'):
+    """Wire frame for a message: compact JSON text, or msgpack bytes."""
+    if encoding == 'msgpack':
+        return msgpack.packb(message, use_bin_type=True)
+    return json.dumps(message, separators=(',', ':'), default=str)
+
+
+def decode(frame):
+    """Client control frame (JSON text or msgpack bytes) → message."""
+    if isinstance(frame, bytes):
+        if msgpack is None:
+            raise ValueError('binary frames need msgpack')
+        return msgpack.unpackb(frame, raw=False)
+    return json.loads(frame)
+
+
+class Subscriber:
+    """One connected socket: followed symbols, pending events and its view of each quote."""
+
+    def __init__(self, protocol: int = 1, throttle: float = 0.0, maxsize: int = 256):
+        self.protocol = protocol
+        self.throttle = throttle          # min seconds between flushes
+        self.symbols: set = set()
+        self.events: asyncio.Queue = asyncio.Queue(maxsize=maxsize)  # acks, anomalies
+        self.pending: dict = {}           # symbol → latest quote message not yet sent
+        self.sent: dict = {}              # symbol → quote data the client last received
+        self.dropped = 0
+        self.conflated = 0
+        self._wake = asyncio.Event()
+        self._last_flush = 0.0
+
+    def offer(self, message: dict):
+        try:
+            self.events.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1  # slow consumer: drop rather than grow without bound
+        self._wake.set()
+
+    def post(self, symbol: str, quote: dict):
+        """Latest quote for a symbol; replaces any unsent one."""
+        if symbol in self.pending:
+            self.conflated += 1
+        self.pending[symbol] = quote
+        self._wake.set()
+
+    def forget(self, symbol: str):
+        self.pending.pop(symbol, None)
+        self.sent.pop(symbol, None)
+
+    def _quote_message(self, symbol: str, quote: dict):
+        data = quote['data']
+        if self.protocol < 2:
+            return quote
+        prev = self.sent.get(symbol)
+        self.sent[symbol] = data
+        head = {'v': PROTOCOL_VERSION, 'ticker': quote['ticker'], 'seq': quote['seq']}
+        if prev is None:
+            return {'type': 'snapshot', **head, 'data': data}
+        changed = {k: v for k, v in data.items() if k not in _VOLATILE and prev.get(k) != v}
+        if not changed:
+            return None
+        changed.update({k: data[k] for k in _VOLATILE if k in data})
+        return {'type': 'delta', **head, 'data': changed}
+
+    async def messages(self):
+        """Outbound messages, flushed at most once per `throttle` seconds."""
+        while True:
+            await self._wake.wait()
+            if self.throttle:
+                wait = self._last_flush + self.throttle - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)  # posts arriving meanwhile conflate
+            self._wake.clear()
+            self._last_flush = time.monotonic()
+
+            while not self.events.empty():
+                yield self.events.get_nowait()
+            pending, self.pending = self.pending, {}
+            for symbol, quote in pending.items():
+                msg = self._quote_message(symbol, quote)
+                if msg is not None:
+                    yield msg
+
+
+class QuoteHub:
+    """Per-symbol pollers with fan-out to all subscribers.
+
+    `fetch(symbol)` is a blocking callable returning the list of messages to
+    publish for one poll: a 'price_update' ({type, ticker, data}) plus any
+    other events (e.g. anomaly alerts), which are delivered as-is.
+    """
+
+    def __init__(self, fetch, interval: float = 15.0):
+        self.fetch = fetch
+        self.interval = interval
+        self._subs: dict = {}   # symbol → set of Subscriber
+        self._tasks: dict = {}  # symbol → polling task
+        self._last: dict = {}   # symbol → latest price_update, sent on subscribe
+        self._seq: dict = {}    # symbol → price_update counter
+
+    def subscribe(self, sub: Subscriber, symbol: str):
+        subs = self._subs.setdefault(symbol, set())
+        if sub in subs:
+            return
+        subs.add(sub)
+        sub.symbols.add(symbol)
+        if symbol in self._last:
+            sub.post(symbol, self._last[symbol])
+        if symbol not in self._tasks:
+            self._tasks[symbol] = asyncio.create_task(self._run(symbol))
+
+    def unsubscribe(self, sub: Subscriber, symbol: str):
+        sub.symbols.discard(symbol)
+        sub.forget(symbol)
+        subs = self._subs.get(symbol)
+        if not subs:
+            return
+        subs.discard(sub)
+        if not subs:
+            del self._subs[symbol]
+            self._last.pop(symbol, None)
+            task = self._tasks.pop(symbol, None)
+            if task:
+                task.cancel()
+
+    def disconnect(self, sub: Subscriber):
+        for symbol in list(sub.symbols):
+            self.unsubscribe(sub, symbol)
+
+    def publish(self, symbol: str, messages: list):
+        """Fan one poll's messages out to the symbol's subscribers."""
+        for msg in messages:
+            subs = list(self._subs.get(symbol, ()))
+            if msg.get('type') == 'price_update':
+                self._seq[symbol] = seq = self._seq.get(symbol, 0) + 1
+                msg = {**msg, 'seq': seq}
+                self._last[symbol] = msg
+                for sub in subs:
+                    sub.post(symbol, msg)
+            else:
+                for sub in subs:
+                    sub.offer(msg)
+
+    async def _run(self, symbol: str):
+        while True:
+            try:
+                messages = await asyncio.to_thread(self.fetch, symbol)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[live] poll failed {symbol}: {e}")
+                messages = []
+            self.publish(symbol, messages)
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        sockets = set().union(*self._subs.values()) if self._subs else set()
+        return {
+            'symbols': len(self._tasks),
+            'subscriptions': sum(len(s) for s in self._subs.values()),
+            'sockets': len(sockets),
+            'dropped': sum(s.dropped for s in sockets),
+            'conflated': sum(s.conflated for s in sockets),
+        }
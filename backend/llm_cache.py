@@ -0,0 +1,122 @@
+"""
+Response cache for Groq completions.
+Entries are keyed by model, prompt template + version and a canonical
+fingerprint of the input data; kept in a memory LRU and as JSON files on
+disk, each with its own TTL. Values are completion text or, for streamed
+completions, the list of chunks so they can be replayed.
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from config import CACHE_DIR
+
+LLM_CACHE_DIR = os.path.join(CACHE_DIR, "llm")
+
+
+def _canonical(x):
+    """JSON-ready form with stable key order and float noise rounded away."""
+    if isinstance(x, dict):
+        return {str(k): _canonical(v) for k, v in x.items()}
+    if isinstance(x, (list, tuple)):
+        return [_canonical(v) for v in x]
+    if hasattr(x, "item") and not isinstance(x, (str, bytes)):
+        x = x.item()  # numpy scalar
+    if isinstance(x, float):
+        return float(f"{x:.6g}") if math.isfinite(x) else str(x)
+    return x
+
+
+def fingerprint(data) -> str:
+    """Stable hash of arbitrary JSON-like input data."""
+    blob = json.dumps(_canonical(data), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(blob.encode()).hexdigest()
+
+
+class LLMCache:
+    """Two-level (memory LRU → JSON file) TTL cache for completions."""
+
+    def __init__(self, root: str = LLM_CACHE_DIR, max_entries: int = 512, default_ttl: int = 86400):
+        self.root = root
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._mem: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(model: str, template: str, version: int, data) -> str:
+        return fingerprint({"model": model, "template": template, "version": version, "input": data})
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def get(self, key: str):
+        """Cached value, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                self._mem.move_to_end(key)
+
+        path = self._path(key)
+        if entry is None and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    entry = json.load(f)
+            except Exception as e:
+                print(f"[llm_cache] load failed {path}: {e}")
+                entry = None
+            if entry is not None:
+                self._remember(key, entry)
+
+        if entry is None or entry["expires"] <= now:
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["value"]
+
+    def put(self, key: str, value, ttl: int = None):
+        """Store a completion in memory and atomically on disk."""
+        entry = {"expires": time.time() + (ttl or self.default_ttl), "value": value}
+        self._remember(key, entry)
+
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"[llm_cache] save failed {path}: {e}")
+        return value
+
+    def _remember(self, key: str, entry: dict):
+        with self._lock:
+            self._mem[key] = entry
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+                self.evictions += 1
+
+    def _drop(self, key: str):
+        with self._lock:
+            self._mem.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._mem)
+        return {"entries_in_memory": size, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
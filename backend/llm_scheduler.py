@@ -0,0 +1,157 @@
+"""
+Admission control for Groq calls.
+A FIFO scheduler that keeps requests within the account's per-minute request
+and token budgets and a concurrency cap, so calls queue briefly instead of
+coming back as 429s — and are shed outright when the queue or the wait
+would be too long.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+import numpy as np
+
+WINDOW = 60.0  # seconds; Groq budgets are per minute
+
+
+class LLMOverloaded(Exception):
+    """Raised instead of queueing when the request budget can't be met in time."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Lease:
+    """One admitted request. Set `tokens` to the real usage once it is known."""
+
+    def __init__(self, tokens: int, queued_for: float):
+        self.tokens = tokens
+        self.queued_for = queued_for
+        self.started = time.monotonic()
+
+
+class LLMScheduler:
+
+    def __init__(self, rpm: int = 30, tpm: int = 6000, max_concurrency: int = 4,
+                 max_queue: int = 32, max_wait: float = 20.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self._window: deque = deque()  # (admitted_at, lease) for the last WINDOW seconds
+        self._gate = None              # asyncio.Lock, FIFO; created on first use inside the loop
+        self._slots = None             # asyncio.Semaphore(max_concurrency)
+        self._blocked_until = 0.0      # set from Retry-After on a 429
+
+        self.waiting = 0
+        self.in_flight = 0
+        self.counts = {"admitted": 0, "completed": 0, "failed": 0, "shed": 0, "rate_limited": 0}
+        self._queue_wait = deque(maxlen=500)
+        self._latency = deque(maxlen=500)
+
+    # ── Budget ───────────────────────────────────────────────────────────────
+
+    def _usage(self, now: float) -> tuple:
+        while self._window and now - self._window[0][0] >= WINDOW:
+            self._window.popleft()
+        return len(self._window), sum(lease.tokens for _, lease in self._window)
+
+    def _delay(self, tokens: int, now: float) -> float:
+        """Seconds until a request of `tokens` fits both per-minute budgets."""
+        delay = max(0.0, self._blocked_until - now)
+        n_req, n_tok = self._usage(now)
+        if n_req >= self.rpm:
+            delay = max(delay, self._window[n_req - self.rpm][0] + WINDOW - now)
+        excess = n_tok + min(tokens, self.tpm) - self.tpm
+        if excess > 0:
+            freed = 0
+            for ts, lease in self._window:
+                freed += lease.tokens
+                if freed >= excess:
+                    delay = max(delay, ts + WINDOW - now)
+                    break
+        return delay
+
+    # ── Admission ────────────────────────────────────────────────────────────
+
+    async def acquire(self, tokens: int) -> Lease:
+        """Wait in line for budget and a concurrency slot; LLMOverloaded if it would take too long."""
+        if self._gate is None:
+            self._gate = asyncio.Lock()
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        if self.waiting >= self.max_queue:
+            self.counts["shed"] += 1
+            raise LLMOverloaded("AI request queue is full, try again shortly", self.max_wait)
+
+        t0 = time.monotonic()
+        self.waiting += 1
+        try:
+            async with self._gate:
+                while True:
+                    now = time.monotonic()
+                    delay = self._delay(tokens, now)
+                    if delay <= 0:
+                        break
+                    if now - t0 + delay > self.max_wait:
+                        self.counts["shed"] += 1
+                        raise LLMOverloaded(f"AI rate limit reached, try again in {delay:.0f}s", delay)
+                    await asyncio.sleep(delay)
+                await self._slots.acquire()
+                lease = Lease(tokens, time.monotonic() - t0)
+                self._window.append((time.monotonic(), lease))
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        self.counts["admitted"] += 1
+        self._queue_wait.append(lease.queued_for)
+        return lease
+
+    def release(self, lease: Lease, ok: bool = True):
+        self._slots.release()
+        self.in_flight -= 1
+        self.counts["completed" if ok else "failed"] += 1
+        self._latency.append(time.monotonic() - lease.started)
+
+    def backoff(self, seconds: float):
+        """Groq answered 429: hold every new request for `seconds`."""
+        self.counts["rate_limited"] += 1
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    @asynccontextmanager
+    async def slot(self, tokens: int):
+        lease = await self.acquire(tokens)
+        ok = False
+        try:
+            yield lease
+            ok = True
+        finally:
+            self.release(lease, ok)
+
+    # ── Metrics ──────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _summary(samples: deque) -> dict:
+        if not samples:
+            return {"avg": 0.0, "p50": 0.0, "p95": 0.0}
+        arr = np.fromiter(samples, dtype=float)
+        p50, p95 = np.percentile(arr, [50, 95])
+        return {"avg": round(float(arr.mean()), 3), "p50": round(float(p50), 3), "p95": round(float(p95), 3)}
+
+    def metrics(self) -> dict:
+        n_req, n_tok = self._usage(time.monotonic())
+        return {
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "requests_last_minute": n_req,
+            "tokens_last_minute": n_tok,
+            "limits": {"rpm": self.rpm, "tpm": self.tpm, "max_concurrency": self.max_concurrency},
+            "blocked_for": round(max(0.0, self._blocked_until - time.monotonic()), 1),
+            **self.counts,
+            "queue_wait_s": self._summary(self._queue_wait),
+            "latency_s": self._summary(self._latency),
+        }
@@ -0,0 +1,136 @@
+"""
+Batched strategy metrics.
+Scores a (strategies × trades) return matrix with a validity mask in one
+vectorized pass: each row is one strategy variant (an event type, a window
+setting, a bootstrap resample, a symbol...) and padding cells are masked out.
+Percentiles come from a single row-wise sort, so VaR, CVaR and the median
+share it. The backtest endpoints score single strategies through the same
+code as one-row batches.
+"""
+import numpy as np
+
+RISK_FREE_RATE = 0.065  # Indian 10y G-sec, annual
+PERIODS = 252
+VAR_MIN_TRADES = 20     # below this VaR/CVaR fall back to the worst trade
+
+METRIC_KEYS = ['total_events', 'avg_return', 'median_return', 'std_dev', 'win_rate',
+               'avg_win', 'avg_loss', 'sharpe', 'sortino', 'max_drawdown',
+               'best_trade', 'worst_trade', 'profit_factor', 'var_95', 'cvar_95', 'avg_volatility']
+
+
+def pad(rows: list) -> tuple:
+    """Ragged list of return sequences → (returns, mask), left-aligned and zero-padded."""
+    width = max((len(r) for r in rows), default=0)
+    returns = np.zeros((len(rows), width))
+    mask = np.zeros((len(rows), width), dtype=bool)
+    for i, r in enumerate(rows):
+        returns[i, :len(r)] = r
+        mask[i, :len(r)] = True
+    return returns, mask
+
+
+def _quantile(sorted_r: np.ndarray, n: np.ndarray, q: float) -> np.ndarray:
+    """Linear-interpolated quantile per row of a row-sorted matrix whose valid values come first."""
+    pos = q * np.maximum(n - 1, 0)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, np.maximum(n - 1, 0))
+    a = np.take_along_axis(sorted_r, lo[:, None], axis=1)[:, 0]
+    b = np.take_along_axis(sorted_r, hi[:, None], axis=1)[:, 0]
+    return a + (b - a) * (pos - lo)
+
+
+def batch_metrics(returns: np.ndarray, mask: np.ndarray = None, volatility: np.ndarray = None,
+                  rfr: float = RISK_FREE_RATE, periods: int = PERIODS) -> dict:
+    """Every metric for every row: {metric: array(n_rows)}. Rows with no valid trades score 0.
+
+    Trades are taken in column order (max drawdown compounds them left to right).
+    `volatility`, if given, is averaged over the same mask into 'avg_volatility'.
+    """
+    R = np.atleast_2d(np.asarray(returns, dtype=np.float64))
+    mask = (np.ones(R.shape, dtype=bool) if mask is None else np.atleast_2d(mask).astype(bool)) & np.isfinite(R)
+    n_rows, width = R.shape
+    n = mask.sum(axis=1)
+    has = n > 0
+    nf = np.maximum(n, 1)
+    Rz = np.where(mask, R, 0.0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = Rz.sum(axis=1) / nf
+        std = np.sqrt((np.where(mask, R - mean[:, None], 0.0) ** 2).sum(axis=1) / nf)
+
+        win = mask & (R > 0)
+        loss = mask & (R < 0)
+        n_win, n_loss = win.sum(axis=1), loss.sum(axis=1)
+        gains = np.where(win, R, 0.0).sum(axis=1)
+        losses = -np.where(loss, R, 0.0).sum(axis=1)
+        avg_win = np.where(n_win > 0, gains / np.maximum(n_win, 1), 0.0)
+        avg_loss = np.where(n_loss > 0, -losses / np.maximum(n_loss, 1), 0.0)
+
+        excess = mean - rfr / periods
+        sharpe = np.where((n >= 2) & (std > 0), np.sqrt(periods) * excess / std, 0.0)
+        down_mean = np.where(loss, R, 0.0).sum(axis=1) / np.maximum(n_loss, 1)
+        down_std = np.sqrt((np.where(loss, R - down_mean[:, None], 0.0) ** 2).sum(axis=1) / np.maximum(n_loss, 1))
+        down_std = np.where(n_loss > 1, down_std, std)
+        sortino = np.where((n >= 2) & (down_std > 0), np.sqrt(periods) * excess / down_std, 0.0)
+
+        cum = np.cumprod(1.0 + Rz, axis=1)
+        peak = np.maximum.accumulate(cum, axis=1)
+        max_dd = ((cum - peak) / peak).min(axis=1) if width else np.zeros(n_rows)
+
+        profit_factor = np.where(losses > 0, gains / losses, np.inf)
+
+        # One sort serves median, VaR and the extremes: invalid cells sort to the end
+        sorted_r = np.sort(np.where(mask, R, np.inf), axis=1) if width else np.zeros((n_rows, 1))
+        worst = sorted_r[:, 0]
+        best = np.take_along_axis(sorted_r, np.maximum(n - 1, 0)[:, None], axis=1)[:, 0]
+        median = _quantile(sorted_r, n, 0.5)
+        p5 = _quantile(sorted_r, n, 0.05)
+        tail = mask & (R <= p5[:, None])
+        cvar = np.where(tail, R, 0.0).sum(axis=1) / np.maximum(tail.sum(axis=1), 1)
+        enough = n >= VAR_MIN_TRADES
+        var_95 = np.where(enough, p5, worst)
+        cvar_95 = np.where(enough, cvar, worst)
+
+        if volatility is not None:
+            avg_vol = np.where(mask, np.atleast_2d(volatility), 0.0).sum(axis=1) / nf
+        else:
+            avg_vol = np.zeros(n_rows)
+
+    out = {
+        'total_events': n,
+        'avg_return': mean,
+        'median_return': median,
+        'std_dev': np.where(n > 1, std, 0.0),
+        'win_rate': n_win / nf,
+        'avg_win': avg_win,
+        'avg_loss': avg_loss,
+        'sharpe': sharpe,
+        'sortino': sortino,
+        'max_drawdown': max_dd,
+        'best_trade': best,
+        'worst_trade': worst,
+        'profit_factor': profit_factor,
+        'var_95': var_95,
+        'cvar_95': cvar_95,
+        'avg_volatility': avg_vol,
+    }
+    return {k: np.where(has, v, 0) for k, v in out.items()}
+
+
+def row(batch: dict, i: int, keys: list = None) -> dict:
+    """One strategy's metrics as a JSON-ready dict of Python scalars."""
+    return {k: (int(batch[k][i]) if k == 'total_events' else float(batch[k][i])) for k in (keys or batch)}
+
+
+def empty_metrics() -> dict:
+    return {k: 0 for k in METRIC_KEYS}
+
+
+def summary_metrics(returns, volatility=None, rfr: float = RISK_FREE_RATE) -> dict:
+    """Full metric dict for a single sequence of trade returns."""
+    if len(returns) == 0:
+        return empty_metrics()
+    batch = batch_metrics(np.asarray(returns, dtype=np.float64)[None, :],
+                          volatility=None if volatility is None else np.asarray(volatility, dtype=np.float64)[None, :],
+                          rfr=rfr)
+    return row(batch, 0)
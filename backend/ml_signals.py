@@ -2,114 +2,233 @@
 ML signal engine: feature engineering, earnings predictor, regime detection, anomaly detection.
 All computation is local — no external API required.
 """
+import math
+import threading
+import time
+from collections import deque
+
 import numpy as np
 import pandas as pd
 import warnings
 warnings.filterwarnings("ignore")
 
-from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor, IsolationForest
-from sklearn.mixture import GaussianMixture
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import cross_val_score
+# scikit-learn is imported inside the fit methods: it dominates import time and
+# is only needed once a model is fitted (or a stored bundle is unpickled).
+
+from flat_forest import FlatForest
+from model_registry import ModelRegistry, completed_bars, data_version, panel_version
+from ml_tuning import PurgedWalkForward, tune_classifier
+from tracing import span, traced
 
 
 FEATURE_COLS = [
     "ret_5d", "ret_20d", "vol_ratio", "rsi_14",
     "vol_zscore", "price_position", "mom_10d", "mom_30d",
 ]
+ANOMALY_COLS = ["ret_1d", "vol_20d", "vol_zscore", "rsi_14"]
+
+# Hyperparameters double as registry keys: changing one invalidates stored models.
+EARNINGS_PARAMS = {"n_estimators": 100, "max_depth": 5, "random_state": 42}
+REGIME_PARAMS = {"n_components": 3, "n_init": 5, "random_state": 42}
+ANOMALY_PARAMS = {"contamination": 0.05, "random_state": 42}
+POOLED_SYMBOL = "__universe__"
 
 
 class MLSignalEngine:
 
+    def __init__(self, registry: ModelRegistry = None, n_jobs: int = None):
+        self.registry = registry
+        self.n_jobs = n_jobs  # sklearn parallelism; not part of the registry key
+        self.regimes = RegimeTracker(self)
+
+    # ── Registry-backed access ─────────────────────────────────────────────────
+
+    def _model(self, symbol: str, kind: str, params: dict, version: str, fit_fn) -> dict:
+        fit = traced(f'model.fit.{kind}')(fit_fn)
+        if self.registry is None or not symbol:
+            return fit()
+        with span(f'model.{kind}', symbol=symbol):  # registry lookup, plus the fit on a miss
+            return self.registry.get_or_fit(symbol, kind, params, version, fit)
+
+    def earnings_params(self, symbol: str) -> dict:
+        """Hyperparameters for a symbol's earnings model: its last tuning result, else the defaults."""
+        if self.registry is None or not symbol:
+            return EARNINGS_PARAMS
+        tuned = self.registry.latest(symbol, "earnings_tuning", {})
+        return tuned["best_params"] if tuned else EARNINGS_PARAMS
+
+    def earnings_model(self, symbol: str, prices_df: pd.DataFrame, earnings_dates: list) -> dict:
+        """Fitted earnings bundle for the current bars + earnings calendar."""
+        params = self.earnings_params(symbol)
+        return self._model(symbol, "earnings", params, data_version(prices_df, earnings_dates),
+                           lambda: self.fit_earnings_predictor(prices_df, earnings_dates, params))
+
+    def tune_earnings_predictor(self, symbol: str, prices_df: pd.DataFrame, earnings_dates: list,
+                                grid: dict = None, n_jobs: int = -1) -> dict:
+        """Walk-forward hyperparameter search; the winner is stored and used by later fits."""
+        from sklearn.preprocessing import StandardScaler
+        X, y, _, entry_t, exit_t = self._earnings_samples(prices_df, earnings_dates)
+        if len(X) < 5:
+            return {"error": "Not enough earnings history", "n_samples": len(X)}
+        Xs = StandardScaler().fit_transform(X)
+        result = tune_classifier(Xs, (y > 0).astype(int), entry_t, exit_t, grid=grid, n_jobs=n_jobs)
+        if "error" not in result and self.registry is not None and symbol:
+            self.registry.put(symbol, "earnings_tuning", {}, data_version(prices_df, earnings_dates), result)
+        return result
+
+    def regime_model(self, symbol: str, prices_df: pd.DataFrame) -> dict:
+        return self._model(symbol, "regime", REGIME_PARAMS, data_version(prices_df),
+                           lambda: self.fit_regime_model(prices_df))
+
+    def anomaly_model(self, symbol: str, prices_df: pd.DataFrame) -> dict:
+        return self._model(symbol, "anomaly", ANOMALY_PARAMS, data_version(prices_df),
+                           lambda: self.fit_anomaly_model(prices_df))
+
+    def pooled_earnings_model(self, panel: dict, sectors: dict) -> dict:
+        """Universe-wide earnings bundle; versioned by every member's bars + earnings."""
+        return self._model(POOLED_SYMBOL, "pooled_earnings", EARNINGS_PARAMS, panel_version(panel),
+                           lambda: self.fit_pooled_earnings_predictor(panel, sectors))
+
+    def signals(self, symbol: str, prices_df: pd.DataFrame, earnings_dates: list) -> tuple:
+        """Earnings prediction, regime and anomalies; fits only when the data version is new."""
+        bundle = self.earnings_model(symbol, prices_df, earnings_dates)
+        pooled = None
+        if "error" in bundle and self.registry is not None:
+            # Thin per-ticker history: fall back to the last fitted pooled model
+            pooled = self.registry.latest(POOLED_SYMBOL, "pooled_earnings", EARNINGS_PARAMS)
+        if pooled and "error" not in pooled:
+            pred = self.predict_pooled_earnings({symbol: prices_df}, pooled).get(symbol) \
+                or self.predict_next_earnings(prices_df, bundle)
+        else:
+            pred = self.predict_next_earnings(prices_df, bundle)
+        regime = self.regimes.update(symbol, prices_df)
+        anomalies = self.detect_anomalies(prices_df, self.anomaly_model(symbol, prices_df))
+        return pred, regime, anomalies
+
+    # ── Features ───────────────────────────────────────────────────────────────
+
+    @traced('pandas.features')
     def compute_features(self, prices_df: pd.DataFrame) -> pd.DataFrame:
-        """Engineer a feature DataFrame from OHLCV data."""
-        df = prices_df.copy()
-        close = df["close"]
-        volume = df["volume"] if "volume" in df.columns else pd.Series(1, index=df.index)
+        """Engineer a feature DataFrame (engineered columns + close) from OHLCV data.
 
-        df["ret_1d"] = close.pct_change(1)
-        df["ret_5d"] = close.pct_change(5)
-        df["ret_20d"] = close.pct_change(20)
-        df["ret_60d"] = close.pct_change(60)
+        Builds only the derived columns instead of copying the input frame.
+        """
+        close = prices_df["close"]
+        volume = prices_df["volume"] if "volume" in prices_df.columns else pd.Series(1, index=prices_df.index)
 
-        vol_5d = df["ret_1d"].rolling(5).std() * np.sqrt(252)
-        vol_20d = df["ret_1d"].rolling(20).std() * np.sqrt(252)
-        df["vol_5d"] = vol_5d
-        df["vol_20d"] = vol_20d
-        df["vol_ratio"] = vol_5d / (vol_20d + 1e-9)
-
-        df["mom_10d"] = close / close.shift(10) - 1
-        df["mom_30d"] = close / close.shift(30) - 1
+        ret_1d = close.pct_change(1)
+        vol_5d = ret_1d.rolling(5).std() * np.sqrt(252)
+        vol_20d = ret_1d.rolling(20).std() * np.sqrt(252)
 
         delta = close.diff()
         gain = delta.where(delta > 0, 0).rolling(14).mean()
         loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-        df["rsi_14"] = 100 - 100 / (1 + gain / (loss + 1e-9))
-
-        df["vol_zscore"] = (volume - volume.rolling(20).mean()) / (volume.rolling(20).std() + 1e-9)
 
-        hi = df["high"].rolling(20).max() if "high" in df.columns else close.rolling(20).max()
-        lo = df["low"].rolling(20).min() if "low" in df.columns else close.rolling(20).min()
-        df["price_position"] = (close - lo) / (hi - lo + 1e-9)
-
-        df.dropna(inplace=True)
-        return df
-
-    def fit_earnings_predictor(self, prices_df: pd.DataFrame, earnings_dates: list) -> dict:
+        hi = prices_df["high"].rolling(20).max() if "high" in prices_df.columns else close.rolling(20).max()
+        lo = prices_df["low"].rolling(20).min() if "low" in prices_df.columns else close.rolling(20).min()
+
+        df = pd.DataFrame({
+            "close": close,
+            "ret_1d": ret_1d,
+            "ret_5d": close.pct_change(5),
+            "ret_20d": close.pct_change(20),
+            "ret_60d": close.pct_change(60),
+            "vol_5d": vol_5d,
+            "vol_20d": vol_20d,
+            "vol_ratio": vol_5d / (vol_20d + 1e-9),
+            "mom_10d": close / close.shift(10) - 1,
+            "mom_30d": close / close.shift(30) - 1,
+            "rsi_14": 100 - 100 / (1 + gain / (loss + 1e-9)),
+            "vol_zscore": (volume - volume.rolling(20).mean()) / (volume.rolling(20).std() + 1e-9),
+            "price_position": (close - lo) / (hi - lo + 1e-9),
+        }, index=prices_df.index)
+        return df.dropna()
+
+    def _earnings_samples(self, prices_df: pd.DataFrame, earnings_dates: list) -> tuple:
+        """(X, y, feat_cols, entry_t, exit_t): features 3 bars before each event,
+        return to 3 bars after, plus each sample's label window for purged CV.
+
+        One searchsorted over all event dates, then array gathers for the
+        entry rows (3rd feature bar at/before the event) and exit rows
+        (3rd price bar after it).
+        """
+        features_df = self.compute_features(prices_df)
+        feat_cols = [c for c in FEATURE_COLS if c in features_df.columns]
+        if not earnings_dates:
+            no_t = np.empty(0, dtype="datetime64[ns]")
+            return np.empty((0, len(feat_cols))), np.empty(0), feat_cols, no_t, no_t
+
+        events = pd.DatetimeIndex(pd.to_datetime([ed["date"] for ed in earnings_dates]))
+        n_before = features_df.index.searchsorted(events, side="right")  # feature bars <= event
+        first_after = prices_df.index.searchsorted(events, side="right")  # first price bar > event
+        ok = (n_before >= 4) & (len(prices_df) - first_after >= 3)
+
+        entry = n_before[ok] - 3
+        exit_ = first_after[ok] + 2
+        X = features_df[feat_cols].to_numpy(dtype=float)[entry]
+        entry_price = features_df["close"].to_numpy(dtype=float)[entry]
+        exit_price = prices_df["close"].to_numpy(dtype=float)[exit_]
+        y = (exit_price - entry_price) / entry_price
+
+        entry_t = features_df.index.values[entry]
+        exit_t = prices_df.index.values[exit_]
+
+        keep = ~np.isnan(X).any(axis=1)
+        return X[keep], y[keep], feat_cols, entry_t[keep], exit_t[keep]
+
+    def _fit_forests(self, X: np.ndarray, y: np.ndarray, entry_t: np.ndarray, exit_t: np.ndarray,
+                     params: dict = None) -> tuple:
+        """Fit the direction classifier (with walk-forward CV accuracy) and the return regressor.
+
+        CV folds are purged and embargoed on each sample's entry → exit window,
+        so overlapping earnings plays never straddle a train/test boundary.
+        """
+        from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+        from sklearn.model_selection import cross_val_score
+        params = params or EARNINGS_PARAMS
+        y_class = (y > 0).astype(int)
+
+        clf = RandomForestClassifier(**params, n_jobs=self.n_jobs)
+        clf.fit(X, y_class)
+        splits = PurgedWalkForward(entry_t, exit_t, min_train=2)
+        cv_acc = 0.0
+        if splits.get_n_splits():
+            cv_acc = float(np.mean(cross_val_score(clf, X, y_class, cv=splits, scoring="accuracy",
+                                                   n_jobs=self.n_jobs)))
+
+        reg = RandomForestRegressor(**params, n_jobs=self.n_jobs)
+        reg.fit(X, y)
+        return clf, reg, cv_acc
+
+    @staticmethod
+    def _forest_predict(model_bundle: dict, Xs: np.ndarray) -> tuple:
+        """(buy probabilities, predicted returns), via the flat export when the bundle has one."""
+        clf = model_bundle.get("classifier_flat") or model_bundle["classifier"]
+        reg = model_bundle.get("regressor_flat") or model_bundle["regressor"]
+        proba = clf.predict_proba(Xs)
+        buy = proba[:, 1] if proba.shape[1] > 1 else np.full(len(Xs), 0.5)
+        return buy, reg.predict(Xs)
+
+    def fit_earnings_predictor(self, prices_df: pd.DataFrame, earnings_dates: list, params: dict = None) -> dict:
         """Train Random Forest classifier + regressor on historical earnings plays."""
+        from sklearn.preprocessing import StandardScaler
         try:
-            features_df = self.compute_features(prices_df)
-            feat_cols = [c for c in FEATURE_COLS if c in features_df.columns]
-
-            X, y = [], []
-            for ed in earnings_dates:
-                event_date = pd.to_datetime(ed["date"])
-                before = features_df.index[features_df.index <= event_date]
-                after = prices_df.index[prices_df.index > event_date]
-
-                if len(before) < 4 or len(after) < 3:
-                    continue
-
-                entry_date = before[-3]
-                exit_date = after[2]
-
-                if entry_date not in prices_df.index or exit_date not in prices_df.index:
-                    continue
-
-                entry_price = prices_df.loc[entry_date, "close"]
-                exit_price = prices_df.loc[exit_date, "close"]
-                post_return = float((exit_price - entry_price) / entry_price)
-
-                row = features_df.loc[entry_date, feat_cols].values
-                if np.any(np.isnan(row)):
-                    continue
-
-                X.append(row)
-                y.append(post_return)
+            X, y, feat_cols, entry_t, exit_t = self._earnings_samples(prices_df, earnings_dates)
 
             if len(X) < 5:
                 return {"error": "Not enough earnings history", "n_samples": len(X)}
 
-            X = np.array(X)
-            y = np.array(y)
-            y_class = (y > 0).astype(int)
-
             scaler = StandardScaler()
             Xs = scaler.fit_transform(X)
-
-            clf = RandomForestClassifier(n_estimators=100, max_depth=5, random_state=42)
-            clf.fit(Xs, y_class)
-            cv = int(min(3, len(X)))
-            cv_acc = float(np.mean(cross_val_score(clf, Xs, y_class, cv=cv, scoring="accuracy")))
-
-            reg = RandomForestRegressor(n_estimators=100, max_depth=5, random_state=42)
-            reg.fit(Xs, y)
+            clf, reg, cv_acc = self._fit_forests(Xs, y, entry_t, exit_t, params)
 
             importances = dict(zip(feat_cols, [float(v) for v in clf.feature_importances_]))
 
             return {
                 "classifier": clf,
                 "regressor": reg,
+                "classifier_flat": FlatForest.from_sklearn(clf),
+                "regressor_flat": FlatForest.from_sklearn(reg),
                 "scaler": scaler,
                 "feature_cols": feat_cols,
                 "cv_accuracy": cv_acc,
@@ -119,6 +238,19 @@ class MLSignalEngine:
         except Exception as e:
             return {"error": str(e), "n_samples": 0}
 
+    @staticmethod
+    def _signal(buy_prob: float, predicted_return: float, model_bundle: dict) -> dict:
+        signal = "BUY" if buy_prob >= 0.62 else ("SELL" if buy_prob <= 0.38 else "HOLD")
+        return {
+            "signal": signal,
+            "confidence": float(max(buy_prob, 1 - buy_prob)),
+            "predicted_return": predicted_return,
+            "buy_probability": buy_prob,
+            "cv_accuracy": model_bundle.get("cv_accuracy", 0),
+            "n_training_samples": model_bundle.get("n_samples", 0),
+            "feature_importances": model_bundle.get("feature_importances", {}),
+        }
+
     def predict_next_earnings(self, prices_df: pd.DataFrame, model_bundle: dict) -> dict:
         """Apply trained model to current features to get a forward signal."""
         if "error" in model_bundle:
@@ -131,50 +263,136 @@ class MLSignalEngine:
             features_df = self.compute_features(prices_df)
             feat_cols = model_bundle["feature_cols"]
             scaler = model_bundle["scaler"]
-            clf = model_bundle["classifier"]
-            reg = model_bundle["regressor"]
 
             row = features_df.iloc[-1][feat_cols].values.reshape(1, -1)
             if np.any(np.isnan(row)):
                 return {"signal": "HOLD", "confidence": 0.5, "predicted_return": 0.0, "feature_importances": {}}
 
-            Xs = scaler.transform(row)
-            proba = clf.predict_proba(Xs)[0]
-            predicted_return = float(reg.predict(Xs)[0])
-            buy_prob = float(proba[1]) if len(proba) > 1 else 0.5
-
-            signal = "BUY" if buy_prob >= 0.62 else ("SELL" if buy_prob <= 0.38 else "HOLD")
-
-            return {
-                "signal": signal,
-                "confidence": float(max(buy_prob, 1 - buy_prob)),
-                "predicted_return": predicted_return,
-                "buy_probability": buy_prob,
-                "cv_accuracy": model_bundle.get("cv_accuracy", 0),
-                "n_training_samples": model_bundle.get("n_samples", 0),
-                "feature_importances": model_bundle.get("feature_importances", {}),
-            }
+            buy, predicted = self._forest_predict(model_bundle, scaler.transform(row))
+            return self._signal(float(buy[0]), float(predicted[0]), model_bundle)
         except Exception as e:
             return {"signal": "HOLD", "confidence": 0.5, "predicted_return": 0.0, "error": str(e)}
 
-    def detect_market_regime(self, prices_df: pd.DataFrame) -> dict:
-        """3-state regime detection using Gaussian Mixture Model."""
+    # ── Pooled cross-sectional earnings model ──────────────────────────────────
+
+    @staticmethod
+    def _one_hot(symbols: list, model_bundle: dict) -> np.ndarray:
+        """Sector + ticker indicator columns; unseen tickers get an all-zero ticker block."""
+        sector_ix = {sec: i for i, sec in enumerate(model_bundle["sector_levels"])}
+        ticker_ix = {sym: i for i, sym in enumerate(model_bundle["ticker_levels"])}
+        n_sec = len(sector_ix)
+        out = np.zeros((len(symbols), n_sec + len(ticker_ix)))
+        for r, sym in enumerate(symbols):
+            sec = model_bundle["sector_of"].get(sym, "Other")
+            if sec in sector_ix:
+                out[r, sector_ix[sec]] = 1.0
+            if sym in ticker_ix:
+                out[r, n_sec + ticker_ix[sym]] = 1.0
+        return out
+
+    def fit_pooled_earnings_predictor(self, panel: dict, sectors: dict) -> dict:
+        """Train one model on earnings plays from every symbol.
+
+        panel: {symbol: (prices_df, earnings_dates)}; sectors: {symbol: sector}.
+        Features are the per-ticker FEATURE_COLS plus sector and ticker indicators.
+        """
+        from sklearn.preprocessing import StandardScaler
         try:
-            close = prices_df["close"]
-            ret_20d = close.pct_change(20)
-            vol_20d = close.pct_change().rolling(20).std() * np.sqrt(252)
+            blocks, targets, entries, exits, row_syms = [], [], [], [], []
+            feat_cols = FEATURE_COLS
+            for sym in sorted(panel):
+                prices_df, earnings_dates = panel[sym]
+                X, y, feat_cols, entry_t, exit_t = self._earnings_samples(prices_df, earnings_dates)
+                if len(X):
+                    blocks.append(X)
+                    targets.append(y)
+                    entries.append(entry_t)
+                    exits.append(exit_t)
+                    row_syms += [sym] * len(X)
+
+            if len(row_syms) < 20:
+                return {"error": "Not enough pooled earnings history", "n_samples": len(row_syms)}
+
+            X_num = np.vstack(blocks)
+            y = np.concatenate(targets)
+            bundle = {
+                "feature_cols": feat_cols,
+                "sector_of": {sym: sectors.get(sym, "Other") for sym in panel},
+                "sector_levels": sorted({sectors.get(sym, "Other") for sym in set(row_syms)}),
+                "ticker_levels": sorted(set(row_syms)),
+            }
+
+            scaler = StandardScaler()
+            X = np.hstack([scaler.fit_transform(X_num), self._one_hot(row_syms, bundle)])
+            clf, reg, cv_acc = self._fit_forests(X, y, np.concatenate(entries), np.concatenate(exits))
+
+            imp = clf.feature_importances_
+            n_num, n_sec = len(feat_cols), len(bundle["sector_levels"])
+            importances = dict(zip(feat_cols, [float(v) for v in imp[:n_num]]))
+            importances["sector"] = float(imp[n_num:n_num + n_sec].sum())
+            importances["ticker"] = float(imp[n_num + n_sec:].sum())
+
+            bundle.update({
+                "classifier": clf,
+                "regressor": reg,
+                "classifier_flat": FlatForest.from_sklearn(clf),
+                "regressor_flat": FlatForest.from_sklearn(reg),
+                "scaler": scaler,
+                "cv_accuracy": cv_acc,
+                "n_samples": len(row_syms),
+                "n_symbols": len(bundle["ticker_levels"]),
+                "feature_importances": importances,
+            })
+            return bundle
+        except Exception as e:
+            return {"error": str(e), "n_samples": 0}
 
-            df = pd.DataFrame({"ret": ret_20d, "vol": vol_20d}).dropna()
+    def predict_pooled_earnings(self, latest: dict, model_bundle: dict) -> dict:
+        """Score every symbol in `latest` ({symbol: prices_df}) with one batched forest pass."""
+        if "error" in model_bundle:
+            return {}
+        feat_cols = model_bundle["feature_cols"]
+        symbols, rows = [], []
+        for sym, prices_df in latest.items():
+            try:
+                features_df = self.compute_features(prices_df)
+                row = features_df[feat_cols].to_numpy(dtype=float)[-1]
+            except Exception:
+                continue
+            if not np.any(np.isnan(row)):
+                symbols.append(sym)
+                rows.append(row)
+        if not rows:
+            return {}
+
+        X = np.hstack([model_bundle["scaler"].transform(np.vstack(rows)),
+                       self._one_hot(symbols, model_bundle)])
+        buy, predicted = self._forest_predict(model_bundle, X)
+        return {sym: self._signal(float(b), float(r), model_bundle)
+                for sym, b, r in zip(symbols, buy, predicted)}
+
+    @staticmethod
+    def _regime_frame(prices_df: pd.DataFrame) -> pd.DataFrame:
+        close = prices_df["close"]
+        ret_20d = close.pct_change(20)
+        vol_20d = close.pct_change().rolling(20).std() * np.sqrt(252)
+        return pd.DataFrame({"ret": ret_20d, "vol": vol_20d}).dropna()
+
+    def fit_regime_model(self, prices_df: pd.DataFrame) -> dict:
+        """Fit the 3-state Gaussian Mixture and name clusters by average return rank."""
+        from sklearn.mixture import GaussianMixture
+        from sklearn.preprocessing import StandardScaler
+        try:
+            df = self._regime_frame(prices_df)
             if len(df) < 30:
-                return {"current_regime": "unknown", "confidence": 0.0, "regime_history": []}
+                return {"error": "Not enough price history"}
 
             scaler = StandardScaler()
             X = scaler.fit_transform(df.values)
 
-            gm = GaussianMixture(n_components=3, random_state=42, n_init=5)
+            gm = GaussianMixture(**REGIME_PARAMS)
             gm.fit(X)
             labels = gm.predict(X)
-            proba = gm.predict_proba(X)
 
             # Map cluster indices to regime names by average return rank
             cluster_means = {i: df["ret"][labels == i].mean() for i in range(3)}
@@ -184,6 +402,24 @@ class MLSignalEngine:
                 sorted_c[1]: "neutral",
                 sorted_c[2]: "bull_low_vol",
             }
+            return {"scaler": scaler, "gmm": gm, "regime_map": regime_map}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def detect_market_regime(self, prices_df: pd.DataFrame, model_bundle: dict = None) -> dict:
+        """3-state regime detection using Gaussian Mixture Model."""
+        try:
+            if model_bundle is None:
+                model_bundle = self.fit_regime_model(prices_df)
+            if "error" in model_bundle:
+                return {"current_regime": "unknown", "confidence": 0.0, "regime_history": []}
+
+            df = self._regime_frame(prices_df)
+            X = model_bundle["scaler"].transform(df.values)
+            gm = model_bundle["gmm"]
+            regime_map = model_bundle["regime_map"]
+            labels = gm.predict(X)
+            proba = gm.predict_proba(X)
 
             current_label = int(labels[-1])
             current_regime = regime_map[current_label]
@@ -204,20 +440,38 @@ class MLSignalEngine:
         except Exception as e:
             return {"current_regime": "unknown", "confidence": 0.0, "regime_history": [], "error": str(e)}
 
-    def detect_anomalies(self, prices_df: pd.DataFrame) -> dict:
-        """Detect unusual price/volume behaviour using Isolation Forest."""
+    def fit_anomaly_model(self, prices_df: pd.DataFrame) -> dict:
+        """Fit an Isolation Forest on daily price/volume features."""
+        from sklearn.ensemble import IsolationForest
         try:
             features_df = self.compute_features(prices_df)
-            cols = [c for c in ["ret_1d", "vol_20d", "vol_zscore", "rsi_14"] if c in features_df.columns]
+            cols = [c for c in ANOMALY_COLS if c in features_df.columns]
             X = features_df[cols].values
             if len(X) < 20:
+                return {"error": "Not enough price history"}
+
+            iso = IsolationForest(**ANOMALY_PARAMS, n_jobs=self.n_jobs)
+            iso.fit(X)
+            return {"iso": iso, "cols": cols}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def detect_anomalies(self, prices_df: pd.DataFrame, model_bundle: dict = None,
+                         date_format: str = "%Y-%m-%d") -> dict:
+        """Detect unusual price/volume behaviour using Isolation Forest."""
+        try:
+            if model_bundle is None:
+                model_bundle = self.fit_anomaly_model(prices_df)
+            if "error" in model_bundle:
                 return {"anomaly_dates": [], "anomaly_scores": [], "total_anomalies": 0}
 
-            iso = IsolationForest(contamination=0.05, random_state=42)
-            preds = iso.fit_predict(X)
+            features_df = self.compute_features(prices_df)
+            iso = model_bundle["iso"]
+            X = features_df[model_bundle["cols"]].values
+            preds = iso.predict(X)
             scores = iso.decision_function(X)
 
-            anomaly_dates = [features_df.index[i].strftime("%Y-%m-%d") for i, p in enumerate(preds) if p == -1]
+            anomaly_dates = [features_df.index[i].strftime(date_format) for i, p in enumerate(preds) if p == -1]
             anomaly_scores = [float(scores[i]) for i, p in enumerate(preds) if p == -1]
 
             return {
@@ -227,3 +481,255 @@ class MLSignalEngine:
             }
         except Exception as e:
             return {"anomaly_dates": [], "anomaly_scores": [], "total_anomalies": 0, "error": str(e)}
+
+
+class RegimeTracker:
+    """Per-symbol regime filter on top of the fitted 3-state GMM.
+
+    The GMM components act as HMM emission densities, with a transition matrix
+    estimated from the fitted label sequence. Each new completed session costs
+    one forward step; the GMM is refitted only every `refit_every` sessions.
+    Today's unfinished bar is never committed: `peek` scores it (or a live
+    price) on top of the filtered state, so regimes can ride the live feed.
+    """
+
+    WINDOW = 21  # closes needed for ret_20d / 20-return vol
+
+    def __init__(self, engine: MLSignalEngine, refit_every: int = 21, history: int = 60):
+        self.engine = engine
+        self.refit_every = refit_every
+        self.history = history
+        self._states: dict = {}
+        self._fit_locks: dict = {}  # symbol → lock held through a cold fit / refit
+        self._lock = threading.Lock()
+
+    # ── Filtering math ─────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _features(closes) -> np.ndarray:
+        c = np.asarray(closes, dtype=float)
+        rets = c[1:] / c[:-1] - 1
+        return np.array([[c[-1] / c[0] - 1, rets.std(ddof=1) * np.sqrt(252)]])
+
+    @staticmethod
+    def _loglik(st: dict, X: np.ndarray) -> np.ndarray:
+        """Per-component Gaussian log-density of scaled rows, shape (n, k)."""
+        gm = st["gmm"]
+        out = np.empty((len(X), gm.n_components))
+        for k, (mu, chol) in enumerate(zip(gm.means_, gm.precisions_cholesky_)):
+            y = X @ chol - mu @ chol
+            out[:, k] = st["log_norm"][k] - 0.5 * np.sum(y * y, axis=1)
+        return out
+
+    @staticmethod
+    def _scale(st: dict, x: np.ndarray) -> np.ndarray:
+        # Same as scaler.transform without sklearn's per-call validation overhead
+        return (x - st["scaler"].mean_) / st["scaler"].scale_
+
+    @staticmethod
+    def _forward(alpha: np.ndarray, trans: np.ndarray, loglik: np.ndarray) -> np.ndarray:
+        w = np.log(alpha @ trans + 1e-300) + loglik
+        w = np.exp(w - w.max())
+        return w / w.sum()
+
+    def _init_state(self, symbol: str, prices_df: pd.DataFrame):
+        bundle = self.engine.regime_model(symbol, prices_df)
+        if "error" in bundle:
+            return None
+        gm, scaler = bundle["gmm"], bundle["scaler"]
+        df = self.engine._regime_frame(prices_df)
+        X = scaler.transform(df.values)
+        labels = gm.predict(X)
+
+        k = gm.n_components
+        counts = np.ones((k, k))  # Laplace-smoothed transition counts
+        np.add.at(counts, (labels[:-1], labels[1:]), 1)
+        d = X.shape[1]
+        st = {
+            "gmm": gm,
+            "scaler": scaler,
+            "regime_map": bundle["regime_map"],
+            "trans": counts / counts.sum(axis=1, keepdims=True),
+            "log_norm": np.sum(np.log(np.diagonal(gm.precisions_cholesky_, axis1=1, axis2=2)), axis=1)
+                        - 0.5 * d * np.log(2 * np.pi),
+            "closes": deque(prices_df["close"].iloc[-self.WINDOW:].astype(float), maxlen=self.WINDOW),
+            "labels": deque(maxlen=self.history),
+            "alpha": gm.weights_.copy(),
+            "last_date": prices_df.index[-1],
+            "last_x": df.values[-1],
+            "bars_since_fit": 0,
+        }
+        for date, ll in zip(df.index, self._loglik(st, X)):
+            st["alpha"] = self._forward(st["alpha"], st["trans"], ll)
+            st["labels"].append((date, int(np.argmax(st["alpha"]))))
+        return st
+
+    def _step(self, st: dict, date, close: float):
+        st["closes"].append(float(close))
+        st["last_date"] = date
+        st["bars_since_fit"] += 1
+        if len(st["closes"]) < self.WINDOW:
+            return
+        x = self._features(st["closes"])
+        st["alpha"] = self._forward(st["alpha"], st["trans"], self._loglik(st, self._scale(st, x))[0])
+        st["labels"].append((date, int(np.argmax(st["alpha"]))))
+        st["last_x"] = x[0]
+
+    def _result(self, st: dict) -> dict:
+        label = int(np.argmax(st["alpha"]))
+        return {
+            "current_regime": st["regime_map"][label],
+            "confidence": float(st["alpha"][label]),
+            "regime_history": [{"date": d.strftime("%Y-%m-%d"), "regime": st["regime_map"][l]}
+                               for d, l in st["labels"]],
+            "current_return_20d": float(st["last_x"][0]),
+            "current_vol_20d": float(st["last_x"][1]),
+            "as_of": st["last_date"].strftime("%Y-%m-%d"),
+        }
+
+    # ── Public API ─────────────────────────────────────────────────────────────
+
+    def update(self, symbol: str, prices_df: pd.DataFrame, today=None) -> dict:
+        """Advance the filter over completed sessions newer than the last seen one; refit on schedule.
+
+        A bar for `today` (default: the IST date) is scored with `peek` and reported as provisional.
+        """
+        try:
+            done = completed_bars(prices_df, today)
+            partial = prices_df["close"].iloc[-1] if len(done) < len(prices_df) else None
+            with self._lock:
+                fit_lock = self._fit_locks.setdefault(symbol, threading.Lock())
+            with fit_lock:  # one fit per symbol; other symbols and peek() carry on meanwhile
+                with self._lock:
+                    st = self._states.get(symbol)
+                    if st is not None:
+                        new = done["close"][done.index > st["last_date"]]
+                        if st["bars_since_fit"] + len(new) >= self.refit_every:
+                            st = None
+                        else:
+                            for date, close in new.items():
+                                self._step(st, date, close)
+                if st is None:
+                    st = self._init_state(symbol, done)
+                    if st is None:
+                        return {"current_regime": "unknown", "confidence": 0.0, "regime_history": []}
+                    with self._lock:
+                        self._states[symbol] = st
+                with self._lock:
+                    out = self._result(st)
+            live = self.peek(symbol, partial) if partial is not None else None
+            if live:
+                out.update(current_regime=live["regime"], confidence=live["confidence"], provisional=True)
+            return out
+        except Exception as e:
+            return {"current_regime": "unknown", "confidence": 0.0, "regime_history": [], "error": str(e)}
+
+    def peek(self, symbol: str, price: float):
+        """Provisional regime if the current session closed at `price`; None for untracked symbols."""
+        with self._lock:
+            st = self._states.get(symbol)
+            if st is None or not price or len(st["closes"]) < self.WINDOW:
+                return None
+            closes = list(st["closes"])[1:] + [float(price)]  # state holds completed sessions only
+            x = self._scale(st, self._features(closes))
+            alpha = self._forward(st["alpha"], st["trans"], self._loglik(st, x)[0])
+            label = int(np.argmax(alpha))
+            return {"regime": st["regime_map"][label], "confidence": round(float(alpha[label]), 3)}
+
+    def snapshot(self) -> dict:
+        """Latest filtered regime for every tracked symbol."""
+        with self._lock:
+            out = {}
+            for sym, st in self._states.items():
+                label = int(np.argmax(st["alpha"]))
+                out[sym] = {"regime": st["regime_map"][label],
+                            "confidence": round(float(st["alpha"][label]), 3),
+                            "as_of": st["last_date"].strftime("%Y-%m-%d")}
+            return out
+
+
+class TickAnomalyDetector:
+    """Streaming anomaly scoring on live quote ticks.
+
+    O(1) state per symbol: EWMA mean/variance of tick log-returns and of the
+    traded-volume rate. A tick is flagged when its z-score passes `threshold`
+    after `warmup` ticks; alerts per (symbol, kind) are rate-limited by `cooldown`.
+    Subscribers are plain callables invoked with each alert dict.
+    """
+
+    def __init__(self, halflife: float = 30, threshold: float = 4.0, warmup: int = 20,
+                 cooldown: float = 300, max_alerts: int = 200):
+        self.a = 1 - 0.5 ** (1 / halflife)
+        self.threshold = threshold
+        self.warmup = warmup
+        self.cooldown = cooldown
+        self.recent = deque(maxlen=max_alerts)
+        self._states: dict = {}
+        self._subscribers: list = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """Register `callback(alert)`; returns an unsubscribe function."""
+        self._subscribers.append(callback)
+        return lambda: self._subscribers.remove(callback) if callback in self._subscribers else None
+
+    def _score(self, st: dict, key: str, x: float) -> float:
+        """z-score of x against the running EWMA, then fold x into it."""
+        mean, var = st[key]
+        z = (x - mean) / math.sqrt(var) if var > 0 else 0.0
+        diff = x - mean
+        incr = self.a * diff
+        st[key] = (mean + incr, (1 - self.a) * (var + diff * incr))
+        return z
+
+    def update(self, symbol: str, price: float, volume: float = None, ts: float = None) -> list:
+        """Score one tick; returns (and publishes) any alerts it raised."""
+        if not price:
+            return []
+        ts = ts or time.time()
+        with self._lock:
+            st = self._states.get(symbol)
+            if st is None:
+                self._states[symbol] = {"price": price, "volume": volume, "ts": ts, "vol_ts": ts,
+                                        "n": 0, "ret": (0.0, 0.0), "vrate": (0.0, 0.0), "alerted": {}}
+                return []
+            if price == st["price"] and (volume is None or volume == st["volume"]):
+                return []  # repeated poll of an unchanged quote carries no information
+
+            scores = {"price": self._score(st, "ret", math.log(price / st["price"]))}
+            if volume is not None and st["volume"] is not None and volume > st["volume"]:
+                rate = (volume - st["volume"]) / max(ts - st["vol_ts"], 1e-3)
+                scores["volume"] = self._score(st, "vrate", math.log1p(rate))
+                st["vol_ts"] = ts
+            elif volume is not None and st["volume"] is not None and volume < st["volume"]:
+                st["vol_ts"] = ts  # cumulative volume reset: new session
+
+            prev = st["price"]
+            st["n"] += 1
+            st.update(price=price, volume=volume if volume is not None else st["volume"], ts=ts)
+            if st["n"] <= self.warmup:
+                return []
+
+            alerts = []
+            for kind, z in scores.items():
+                if abs(z) < self.threshold or ts - st["alerted"].get(kind, 0) < self.cooldown:
+                    continue
+                st["alerted"][kind] = ts
+                alerts.append({
+                    "symbol": symbol,
+                    "kind": kind,
+                    "z_score": round(z, 2),
+                    "price": price,
+                    "tick_change_pct": round((price / prev - 1) * 100, 3),
+                    "volume": volume,
+                    "timestamp": ts,
+                })
+            self.recent.extend(alerts)
+
+        for alert in alerts:
+            for cb in list(self._subscribers):
+                try:
+                    cb(alert)
+                except Exception as e:
+                    print(f"[anomaly] subscriber error: {e}")
+        return alerts
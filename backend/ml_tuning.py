@@ -0,0 +1,117 @@
+"""
+Time-series-aware model selection for the ML signal engine.
+Purged, embargoed walk-forward splits plus a bounded hyperparameter search
+that runs every (candidate, fold) fit in parallel and caches fold scores on disk.
+"""
+import os
+
+import numpy as np
+
+from config import CACHE_DIR
+
+PARAM_GRID = {
+    "n_estimators": [100, 200, 400],
+    "max_depth": [3, 5, 8],
+    "min_samples_leaf": [1, 3, 5],
+}
+MAX_CANDIDATES = 12
+
+TUNING_CACHE_DIR = os.path.join(CACHE_DIR, "tuning")
+
+
+class PurgedWalkForward:
+    """Expanding-window walk-forward splits over event-time-ordered samples.
+
+    Test folds are the last `n_splits` consecutive blocks in time. A training
+    sample is kept only if its label window (entry → exit) closes more than
+    `embargo_days` before the test block opens, so no training label overlaps
+    or leaks into the period being scored.
+    """
+
+    def __init__(self, entry_times, exit_times, n_splits: int = 3,
+                 embargo_days: int = 5, min_train: int = 5):
+        self.entry_times = np.asarray(entry_times, dtype="datetime64[ns]")
+        self.exit_times = np.asarray(exit_times, dtype="datetime64[ns]")
+        self.n_splits = n_splits
+        self.embargo = np.timedelta64(embargo_days, "D")
+        self.min_train = min_train
+
+    def split(self, X=None, y=None, groups=None):
+        order = np.argsort(self.entry_times, kind="stable")
+        n = len(order)
+        block = n // (self.n_splits + 1)
+        if block == 0:
+            return
+        for k in range(self.n_splits):
+            start = n - (self.n_splits - k) * block
+            stop = start + block if k < self.n_splits - 1 else n
+            test = order[start:stop]
+            opens = self.entry_times[test].min()
+            before = order[:start]
+            train = before[self.exit_times[before] < opens - self.embargo]
+            if len(train) >= self.min_train:
+                yield train, test
+
+    def get_n_splits(self, X=None, y=None, groups=None) -> int:
+        return sum(1 for _ in self.split())
+
+
+def _fold_score(params: dict, X: np.ndarray, y: np.ndarray, train: np.ndarray, test: np.ndarray) -> float:
+    from sklearn.ensemble import RandomForestClassifier
+    clf = RandomForestClassifier(**params, n_jobs=1)
+    clf.fit(X[train], y[train])
+    return float(np.mean(clf.predict(X[test]) == y[test]))
+
+
+_cached_fold_score = None
+
+
+def _fold_scorer():
+    """_fold_score memoised on disk (joblib is imported on first use, not at startup)."""
+    global _cached_fold_score
+    if _cached_fold_score is None:
+        from joblib import Memory
+        _cached_fold_score = Memory(TUNING_CACHE_DIR, verbose=0).cache(_fold_score)
+    return _cached_fold_score
+
+
+def candidate_params(grid: dict = None, max_candidates: int = MAX_CANDIDATES, random_state: int = 42) -> list:
+    """Deterministic, bounded subset of the grid (whole grid if it is small enough)."""
+    from sklearn.model_selection import ParameterGrid
+    grid = list(ParameterGrid(grid or PARAM_GRID))
+    if len(grid) > max_candidates:
+        pick = np.random.default_rng(random_state).choice(len(grid), max_candidates, replace=False)
+        grid = [grid[i] for i in sorted(pick)]
+    return [{**p, "random_state": random_state} for p in grid]
+
+
+def tune_classifier(X: np.ndarray, y_class: np.ndarray, entry_times, exit_times,
+                    grid: dict = None, max_candidates: int = MAX_CANDIDATES, n_jobs: int = -1) -> dict:
+    """Walk-forward search over the candidate grid; every fold fit runs in parallel.
+
+    Fold scores are memoised on disk, so re-running a search on unchanged
+    samples (or with an overlapping grid) only fits the new (candidate, fold) pairs.
+    """
+    cv = PurgedWalkForward(entry_times, exit_times)
+    splits = list(cv.split())
+    if not splits:
+        return {"error": "Not enough samples for walk-forward validation", "n_samples": len(X)}
+
+    from joblib import Parallel, delayed
+    candidates = candidate_params(grid, max_candidates)
+    scorer = _fold_scorer()
+    scores = Parallel(n_jobs=n_jobs)(
+        delayed(scorer)(p, X, y_class, train, test)
+        for p in candidates for train, test in splits
+    )
+    scores = np.asarray(scores).reshape(len(candidates), len(splits))
+    means = scores.mean(axis=1)
+    best = int(np.argmax(means))  # ties → earliest (smallest) candidate
+    return {
+        "best_params": candidates[best],
+        "best_score": float(means[best]),
+        "n_folds": len(splits),
+        "n_samples": len(X),
+        "results": [{"params": p, "mean_accuracy": float(m), "std": float(s)}
+                    for p, m, s in zip(candidates, means, scores.std(axis=1))],
+    }
@@ -0,0 +1,191 @@
+"""
+Fitted-model registry for MLSignalEngine bundles.
+Bundles are kept in memory and on disk, keyed by symbol, model type,
+hyperparameters and a data-version hash. A stale version triggers a refit.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from config import CACHE_DIR
+
+MODEL_DIR = os.path.join(CACHE_DIR, "models")
+IST = ZoneInfo("Asia/Kolkata")
+ERROR_TTL = 300  # seconds a failed fit is remembered before it is retried
+
+
+def params_hash(params: dict) -> str:
+    """Stable short hash of a hyperparameter dict."""
+    blob = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode()).hexdigest()[:12]
+
+
+def completed_bars(prices_df: pd.DataFrame, today=None) -> pd.DataFrame:
+    """Bars of sessions before `today` (IST); today's bar is still being updated in place."""
+    today = pd.Timestamp(today or datetime.now(IST).date())
+    idx = prices_df.index.tz_convert(IST).tz_localize(None) if prices_df.index.tz else prices_df.index
+    return prices_df[idx < today]  # index is exchange-local (IST) once the tz is stripped
+
+
+def data_version(prices_df: pd.DataFrame, events: list = None, today=None) -> str:
+    """Hash of the completed bars (and optional event dates) a model was fitted on.
+
+    Hashes the close series and index up to the last completed session, so a
+    new session, a late print or a split/dividend re-adjustment of history all
+    produce a new version. Today's bar is left out: yfinance updates it in place
+    during market hours, and it would otherwise change on every cache refresh.
+    """
+    h = hashlib.sha1()
+    if prices_df is not None and len(prices_df):
+        done = completed_bars(prices_df, today)
+        h.update(np.ascontiguousarray(done.index.asi8).tobytes())
+        h.update(np.ascontiguousarray(done["close"].to_numpy(dtype=np.float64)).tobytes())
+    if events:
+        h.update("|".join(sorted(str(e["date"]) for e in events)).encode())
+    return h.hexdigest()[:16]
+
+
+def panel_version(panel: dict) -> str:
+    """Version of a multi-symbol training panel ({symbol: (prices_df, events)})."""
+    h = hashlib.sha1()
+    for sym in sorted(panel):
+        prices_df, events = panel[sym]
+        h.update(f"{sym}:{data_version(prices_df, events)};".encode())
+    return h.hexdigest()[:16]
+
+
+class ModelRegistry:
+    """Two-level (memory LRU → joblib file) store for fitted model bundles.
+
+    One slot per (symbol, kind, params); the slot remembers the data version
+    it was fitted on, so storing a newer version replaces the old bundle.
+    Failed fits ({'error': ...} bundles) are not stored in the slot: they are
+    remembered in memory for ERROR_TTL seconds so a data outage is retried.
+    """
+
+    def __init__(self, root: str = MODEL_DIR, max_memory: int = 256, error_ttl: float = ERROR_TTL):
+        self.root = root
+        self.max_memory = max_memory
+        self.error_ttl = error_ttl
+        self._mem: "OrderedDict[str, dict]" = OrderedDict()
+        self._failed: dict = {}  # slot → (version, failed_at, bundle)
+        self._lock = threading.Lock()
+        self.counts = {"hits": 0, "misses": 0, "evictions": 0}
+
+    # ── Keys / paths ─────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _slot(symbol: str, kind: str, params: dict) -> str:
+        return f"{symbol}:{kind}:{params_hash(params)}"
+
+    def _path(self, symbol: str, kind: str, params: dict) -> str:
+        safe = re.sub(r"[^A-Za-z0-9._-]", "_", symbol)
+        return os.path.join(self.root, safe, f"{kind}-{params_hash(params)}.joblib")
+
+    def _entry(self, symbol: str, kind: str, params: dict, version: str = None):
+        """Slot entry from memory, else from disk (and promoted to memory).
+
+        With a `version`, a memory entry for another version is checked against
+        the file too: pretrain.py or another worker may have stored a newer fit.
+        """
+        slot = self._slot(symbol, kind, params)
+        with self._lock:
+            entry = self._mem.get(slot)
+            if entry is not None:
+                self._mem.move_to_end(slot)
+                if version is None or entry.get("version") == version:
+                    return entry
+
+        path = self._path(symbol, kind, params)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return entry
+        if entry is not None and mtime <= entry.get("fitted_at", 0):
+            return entry  # the file is this entry, or older
+        import joblib  # deferred with scikit-learn: only needed once a bundle is read or written
+        try:
+            loaded = joblib.load(path)
+        except Exception as e:
+            print(f"[registry] load failed {path}: {e}")
+            return entry
+        if entry is not None and loaded.get("fitted_at", 0) <= entry.get("fitted_at", 0):
+            return entry
+        self._remember(slot, loaded)
+        return loaded
+
+    # ── Public API ───────────────────────────────────────────────────────────
+
+    def get(self, symbol: str, kind: str, params: dict, version: str):
+        """Return the bundle fitted on `version`, or None if missing/stale."""
+        entry = self._entry(symbol, kind, params, version)
+        if not entry or entry.get("version") != version or "error" in entry["bundle"]:
+            return None  # error bundles persisted by older versions are refitted
+        return entry["bundle"]
+
+    def put(self, symbol: str, kind: str, params: dict, version: str, bundle: dict) -> dict:
+        """Store a bundle in memory and atomically on disk."""
+        entry = {"version": version, "fitted_at": time.time(), "bundle": bundle}
+        self._remember(self._slot(symbol, kind, params), entry)
+
+        path = self._path(symbol, kind, params)
+        import joblib
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            joblib.dump(entry, tmp)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"[registry] save failed {path}: {e}")
+        return bundle
+
+    def latest(self, symbol: str, kind: str, params: dict):
+        """Most recently stored bundle for the slot, whatever its data version."""
+        entry = self._entry(symbol, kind, params)
+        return entry["bundle"] if entry else None
+
+    def get_or_fit(self, symbol: str, kind: str, params: dict, version: str, fit_fn) -> dict:
+        """Return the cached bundle for `version`, fitting and storing it on a miss."""
+        bundle = self.get(symbol, kind, params, version)
+        if bundle is not None:
+            self.counts["hits"] += 1
+            return bundle
+        slot = self._slot(symbol, kind, params)
+        with self._lock:
+            failed = self._failed.get(slot)
+        if failed and failed[0] == version and time.time() - failed[1] < self.error_ttl:
+            self.counts["hits"] += 1
+            return failed[2]
+        self.counts["misses"] += 1
+        bundle = fit_fn()
+        if isinstance(bundle, dict) and "error" in bundle:
+            now = time.time()
+            with self._lock:
+                self._failed = {k: v for k, v in self._failed.items() if now - v[1] < self.error_ttl}
+                self._failed[slot] = (version, now, bundle)
+            return bundle
+        with self._lock:
+            self._failed.pop(slot, None)
+        return self.put(symbol, kind, params, version, bundle)
+
+    def _remember(self, slot: str, entry: dict):
+        with self._lock:
+            self._mem[slot] = entry
+            self._mem.move_to_end(slot)
+            while len(self._mem) > self.max_memory:
+                self._mem.popitem(last=False)
+                self.counts["evictions"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._mem)
+        return {"entries_in_memory": size, **self.counts}
@@ -0,0 +1,183 @@
+"""
+Universe-wide ML pretraining job.
+Fits the earnings predictor, regime model and anomaly model for every symbol
+over a process pool, then the pooled cross-sectional earnings model on the bars
+those workers already fetched, and writes the bundles to the model registry, so
+the ML tab only runs inference.
+
+    python pretrain.py                                # all NIFTY50, one process per core
+    python pretrain.py --symbols TCS INFY --workers 2 --n-jobs 2
+"""
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from model_registry import MODEL_DIR
+
+
+def resolve_symbols(symbols: list = None) -> list:
+    """The requested symbols, or the whole NIFTY50 universe."""
+    if symbols:
+        return list(symbols)
+    from indian_market import NIFTY50_STOCKS
+    return list(NIFTY50_STOCKS)
+
+
+def _fit_status(errors: dict, n_models: int) -> str:
+    """'ok' when every model fitted, 'failed' when none did, else 'partial'."""
+    if not errors:
+        return 'ok'
+    return 'failed' if len(errors) >= n_models else 'partial'
+
+
+def _pretrain_symbol(symbol: str, n_jobs: int, root: str) -> dict:
+    """Worker entry point: fetch bars + earnings and fit all three models.
+
+    The fetched data rides back under '_panel' for the pooled fit.
+    """
+    from indian_market import get_historical_prices, get_earnings_history, normalize_ticker
+    from ml_signals import MLSignalEngine
+    from model_registry import ModelRegistry
+
+    t0 = time.time()
+    try:
+        prices_df = get_historical_prices(symbol, period='2y')
+        earnings = get_earnings_history(symbol, prices_df.index.min(), prices_df.index.max())
+        yf_sym = normalize_ticker(symbol)
+
+        engine = MLSignalEngine(registry=ModelRegistry(root), n_jobs=n_jobs)
+        em = engine.earnings_model(yf_sym, prices_df, earnings)
+        rm = engine.regime_model(yf_sym, prices_df)
+        am = engine.anomaly_model(yf_sym, prices_df)
+        errors = {k: m['error'] for k, m in (('earnings', em), ('regime', rm), ('anomaly', am)) if 'error' in m}
+        return {
+            'symbol': symbol,
+            'status': _fit_status(errors, 3),
+            'seconds': round(time.time() - t0, 2),
+            'n_samples': em.get('n_samples', 0),
+            'errors': errors,
+            '_panel': (yf_sym, prices_df, earnings),
+        }
+    except Exception as e:
+        return {'symbol': symbol, 'status': 'failed', 'seconds': round(time.time() - t0, 2), 'error': str(e)}
+
+
+def _pretrain_pooled(panel: dict, sectors: dict, n_jobs: int, root: str) -> dict:
+    """Worker entry point: fit the cross-sectional earnings model on an already fetched panel."""
+    from ml_signals import MLSignalEngine, POOLED_SYMBOL
+    from model_registry import ModelRegistry
+
+    t0 = time.time()
+    try:
+        engine = MLSignalEngine(registry=ModelRegistry(root), n_jobs=n_jobs)
+        bundle = engine.pooled_earnings_model(panel, sectors)
+        errors = {'pooled_earnings': bundle['error']} if 'error' in bundle else {}
+        return {'symbol': POOLED_SYMBOL, 'status': _fit_status(errors, 1), 'seconds': round(time.time() - t0, 2),
+                'n_samples': bundle.get('n_samples', 0), 'errors': errors}
+    except Exception as e:
+        return {'symbol': POOLED_SYMBOL, 'status': 'failed', 'seconds': round(time.time() - t0, 2), 'error': str(e)}
+
+
+def pretrain_universe(symbols: list = None, workers: int = None, n_jobs: int = 1,
+                      root: str = MODEL_DIR, progress=None) -> list:
+    """Fit every symbol's models, then the pooled earnings model, over a process pool.
+
+    Each symbol's bars are fetched once, by its worker; the pooled fit reuses
+    them. Workers are spawned, not forked, since the API calls this from a
+    threaded server. `progress(done, total, result)` is called as each task finishes.
+    """
+    from indian_market import SECTOR_OF
+
+    symbols = resolve_symbols(symbols)
+    n_jobs = max(1, n_jobs or 1)
+    workers = workers or max(1, (os.cpu_count() or 1) // n_jobs)
+
+    results, panel, sectors = [], {}, {}
+    total = len(symbols) + 1
+
+    def _done(res):
+        results.append(res)
+        if progress:
+            progress(len(results), total, res)
+
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(workers, len(symbols) or 1), mp_context=ctx) as pool:
+        futures = {pool.submit(_pretrain_symbol, s, n_jobs, root): s for s in symbols}
+        for fut in as_completed(futures):
+            res = fut.result()
+            data = res.pop('_panel', None)
+            if data is not None:
+                yf_sym, prices_df, earnings = data
+                panel[yf_sym] = (prices_df, earnings)
+                sectors[yf_sym] = SECTOR_OF.get(futures[fut], 'Other')
+            _done(res)
+        _done(pool.submit(_pretrain_pooled, panel, sectors, n_jobs, root).result())
+    return results
+
+
+class PretrainJob:
+    """Single background pretraining run with pollable progress (used by the API)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = {'status': 'idle', 'done': 0, 'total': 0, 'results': [],
+                      'started_at': None, 'finished_at': None}
+
+    def start(self, symbols: list = None, workers: int = None, n_jobs: int = 1) -> bool:
+        """Launch a run in a background thread; False if one is already running."""
+        symbols = resolve_symbols(symbols)
+        with self._lock:
+            if self.state['status'] == 'running':
+                return False
+            self.state = {'status': 'running', 'done': 0, 'total': len(symbols) + 1,
+                          'results': [], 'started_at': time.time(), 'finished_at': None}
+        threading.Thread(target=self._run, args=(symbols, workers, n_jobs), daemon=True).start()
+        return True
+
+    def _progress(self, done: int, total: int, result: dict):
+        with self._lock:
+            self.state['done'] = done
+            self.state['total'] = total
+            self.state['results'].append(result)
+
+    def _run(self, symbols, workers, n_jobs):
+        try:
+            pretrain_universe(symbols, workers=workers, n_jobs=n_jobs, progress=self._progress)
+            status = 'finished'
+        except Exception as e:
+            print(f"[pretrain] job failed: {e}")
+            status = 'failed'
+        with self._lock:
+            self.state['status'] = status
+            self.state['finished_at'] = time.time()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.state, 'results': list(self.state['results'])}
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Pretrain ML signal models for the universe.')
+    ap.add_argument('--symbols', nargs='*', help='NSE symbols (default: NIFTY50)')
+    ap.add_argument('--workers', type=int, default=None, help='worker processes (default: cores / n-jobs)')
+    ap.add_argument('--n-jobs', type=int, default=1, help='sklearn n_jobs inside each worker')
+    ap.add_argument('--root', default=MODEL_DIR, help='model store directory')
+    args = ap.parse_args()
+
+    def report(done, total, res):
+        extra = res.get('error') or ', '.join(f"{k}: {v}" for k, v in res.get('errors', {}).items())
+        print(f"[pretrain] {done}/{total} {res['symbol']:<12} {res['status']:<7} {res['seconds']:>6.2f}s {extra}")
+
+    t0 = time.time()
+    results = pretrain_universe(args.symbols or None, args.workers, args.n_jobs, args.root, report)
+    ok = sum(r['status'] == 'ok' for r in results)
+    partial = sum(r['status'] == 'partial' for r in results)
+    print(f"[pretrain] {ok}/{len(results)} symbols fitted cleanly ({partial} partial) "
+          f"in {time.time() - t0:.1f}s → {args.root}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""
+Cache pre-warming for the symbol universe.
+Fetches prices, quote + fundamentals + news, technicals and earnings dates and
+fits (or loads) the ML models for every configured symbol, plus the indices,
+so the first user after a deploy or the market open is served from cache.
+Symbols are warmed in small concurrent batches with a pause between them;
+the pause doubles whenever Yahoo/NSE start rate-limiting and relaxes again
+once batches come back clean.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+IST = ZoneInfo("Asia/Kolkata")
+INDEX_SYMBOLS = ('^NSEI', '^NSEBANK', '^BSESN')
+_RATE_LIMIT_MARKERS = ('too many requests', 'rate limit', '429')
+
+
+def _rate_limited(err: str) -> bool:
+    err = err.lower()
+    return any(m in err for m in _RATE_LIMIT_MARKERS)
+
+
+def _warm_symbol(symbol: str, engine) -> dict:
+    """Run every warm step for one symbol; {step: error} for the ones that failed."""
+    from indian_market import (get_historical_prices, get_stock_data, get_technicals,
+                               get_earnings_history, normalize_ticker)
+    errors = {}
+    try:
+        prices_df = get_historical_prices(symbol, period='2y')
+    except Exception as e:
+        return {'prices': str(e)}  # everything else is derived from the bars
+
+    for step, fn in (('quote', lambda: get_stock_data(symbol)),
+                     ('technicals', lambda: get_technicals(symbol))):
+        try:
+            out = fn()
+            if isinstance(out, dict) and out.get('error'):
+                errors[step] = str(out['error'])
+        except Exception as e:
+            errors[step] = str(e)
+    try:
+        earnings = get_earnings_history(symbol, prices_df.index.min(), prices_df.index.max())
+        if engine is not None:
+            engine.signals(normalize_ticker(symbol), prices_df, earnings)
+    except Exception as e:
+        errors['models'] = str(e)
+    return errors
+
+
+def _warm_index(symbol: str, engine=None) -> dict:
+    from indian_market import get_historical_prices
+    try:
+        get_historical_prices(symbol, period='2y')
+        return {}
+    except Exception as e:
+        return {'prices': str(e)}
+
+
+class PrewarmJob:
+    """Background warm-up run with pollable readiness, optionally repeated daily before the open."""
+
+    def __init__(self, engine=None, symbols: list = None, batch_size: int = 5, pause: float = 2.0,
+                 max_pause: float = 60.0, claim=None, release=None):
+        self.engine = engine
+        self.symbols = list(symbols or [])
+        self.batch_size = max(1, batch_size)
+        self.pause = pause
+        self.max_pause = max_pause
+        self.claim = claim  # → bool; with several workers only the holder warms
+        self.release = release  # drops the claim once the holder's run ends
+        self._lock = threading.Lock()
+        self._scheduler = None
+        self.state = {'status': 'idle', 'done': 0, 'total': 0, 'failed': {}, 'rate_limited': 0,
+                      'started_at': None, 'finished_at': None, 'next_run': None}
+
+    def start(self, symbols: list = None, force: bool = False) -> bool:
+        """Launch a warm-up in a background thread; False if one is already running.
+
+        Unless `force`d, the run is skipped when another worker holds the claim.
+        """
+        symbols = list(symbols or self.symbols)
+        with self._lock:
+            if self.state['status'] == 'warming':
+                return False
+            claimed = not force and self.claim is not None
+            if claimed and not self.claim():
+                self.state.update(status='skipped', finished_at=time.time())
+                return False
+            self.state.update(status='warming', done=0, total=len(symbols) + len(INDEX_SYMBOLS),
+                              failed={}, rate_limited=0, started_at=time.time(), finished_at=None)
+        threading.Thread(target=self._run_claimed, args=(symbols, claimed), daemon=True, name="prewarm").start()
+        return True
+
+    def _run_claimed(self, symbols: list, claimed: bool):
+        try:
+            self._run(symbols)
+        finally:
+            if claimed and self.release is not None:
+                self.release()
+
+    def _run(self, symbols: list):
+        jobs = [(s, _warm_index) for s in INDEX_SYMBOLS] + [(s, _warm_symbol) for s in symbols]
+        retried = set()
+        pause = self.pause
+        try:
+            from indian_market import get_indices
+            get_indices()
+        except Exception as e:
+            print(f"[prewarm] indices failed: {e}")
+
+        with ThreadPoolExecutor(max_workers=self.batch_size) as pool:
+            while jobs:
+                batch, jobs = jobs[:self.batch_size], jobs[self.batch_size:]
+                results = list(pool.map(lambda job: job[1](job[0], self.engine), batch))
+                throttled = False
+                with self._lock:
+                    for (sym, fn), errors in zip(batch, results):
+                        if any(_rate_limited(e) for e in errors.values()):
+                            throttled = True
+                            self.state['rate_limited'] += 1
+                            if sym not in retried:  # one more try once the backoff has passed
+                                retried.add(sym)
+                                jobs.append((sym, fn))
+                                continue
+                        self.state['done'] += 1
+                        if errors:
+                            self.state['failed'][sym] = errors
+                        else:
+                            self.state['failed'].pop(sym, None)
+                pause = min(pause * 2, self.max_pause) if throttled else max(self.pause, pause / 2)
+                if jobs:
+                    time.sleep(pause)
+
+        with self._lock:
+            self.state['status'] = 'ready' if not self.state['failed'] else 'partial'
+            self.state['finished_at'] = time.time()
+            took = self.state['finished_at'] - self.state['started_at']
+            print(f"[prewarm] {self.state['done']} symbols in {took:.0f}s, "
+                  f"{len(self.state['failed'])} with failures, {self.state['rate_limited']} rate-limited")
+
+    # ── Pre-market schedule ──────────────────────────────────────────────────
+
+    @staticmethod
+    def next_run(at: str, now: datetime = None) -> datetime:
+        """Next weekday occurrence of `at` ('HH:MM', IST)."""
+        now = now or datetime.now(IST)
+        hh, mm = (int(x) for x in at.split(':'))
+        run = now.replace(hour=hh, minute=mm, second=0, microsecond=0)
+        if run <= now:
+            run += timedelta(days=1)
+        while run.weekday() >= 5:  # NSE is shut on weekends
+            run += timedelta(days=1)
+        return run
+
+    def schedule(self, at: str = '09:00'):
+        """Re-warm every weekday at `at` IST, in a daemon thread."""
+        if self._scheduler is not None:
+            return
+
+        def _loop():
+            while True:
+                run = self.next_run(at)
+                with self._lock:
+                    self.state['next_run'] = run.isoformat()
+                time.sleep(max(0.0, (run - datetime.now(IST)).total_seconds()))
+                self.start()
+
+        self._scheduler = threading.Thread(target=_loop, daemon=True, name="prewarm-schedule")
+        self._scheduler.start()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.state, 'failed': dict(self.state['failed'])}
+
+    def readiness(self) -> dict:
+        """Compact summary for the health endpoint."""
+        with self._lock:
+            s = self.state
+            return {
+                'status': s['status'],
+                'ready': s['status'] in ('ready', 'partial', 'skipped'),
+                'progress': round(s['done'] / s['total'], 3) if s['total'] else 0.0,
+                'warmed': s['done'] - len(s['failed']),
+                'failed': len(s['failed']),
+                'total': s['total'],
+                'next_run': s['next_run'],
+            }
@@ -0,0 +1,240 @@
+"""
+Cache tier shared by every uvicorn worker on a host.
+Entries are (stored_at, value) pairs; freshness is decided by the reader's TTL,
+exactly like the old per-process dict. A small in-process dict (L1) sits in
+front of a pluggable shared backend (L2):
+
+    memory  — process-local only (single worker, the default)
+    sqlite  — one WAL-mode SQLite file, shared by all workers on the host
+    redis   — any Redis-protocol server (redis-server, KeyDB, Dragonfly, ...)
+
+Values are pickled, so the shared store must only be reachable by this app.
+`claim` is a set-if-absent lease used to let one worker refresh a hot key
+while the others wait for its result instead of calling upstream too.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from config import CACHE_DIR
+from tracing import span
+
+SQLITE_PATH = os.path.join(CACHE_DIR, "shared.sqlite")
+EXPIRE = 86400        # L2 entries are dropped this long after they were written
+L1_MAX_ENTRIES = 4096
+
+
+class MemoryBackend:
+    name = "memory"
+
+    def __init__(self):
+        self._d: dict = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        e = self._d.get(key)
+        return e[1] if e and e[0] > time.time() else None
+
+    def set_many(self, items: list, expire: float):
+        deadline = time.time() + expire
+        for key, entry in items:
+            self._d[key] = (deadline, entry)
+
+    def claim(self, key: str, ttl: float) -> bool:
+        with self._lock:
+            if self.get(key) is not None:
+                return False
+            self._d[key] = (time.time() + ttl, (0.0, True))
+            return True
+
+    def release(self, key: str):
+        self._d.pop(key, None)
+
+
+class SQLiteBackend:
+    name = "sqlite"
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache "
+                         "(key TEXT PRIMARY KEY, expires REAL NOT NULL, value BLOB NOT NULL)")
+            self._local.conn = conn
+        return conn
+
+    def _tx(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def get(self, key: str):
+        row = self._conn().execute("SELECT value FROM cache WHERE key = ? AND expires > ?",
+                                   (key, time.time())).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set_many(self, items: list, expire: float):
+        now = time.time()
+        rows = [(key, now + expire, pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)) for key, entry in items]
+        conn = self._tx()  # one transaction for the whole batch
+        try:
+            conn.executemany("INSERT OR REPLACE INTO cache (key, expires, value) VALUES (?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._writes += len(rows)
+        if self._writes >= 1000:
+            self._writes = 0
+            conn.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+
+    def claim(self, key: str, ttl: float) -> bool:
+        now = time.time()
+        conn = self._tx()
+        try:
+            conn.execute("DELETE FROM cache WHERE key = ? AND expires <= ?", (key, now))
+            cur = conn.execute("INSERT OR IGNORE INTO cache (key, expires, value) VALUES (?, ?, ?)",
+                               (key, now + ttl, pickle.dumps((0.0, True))))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cur.rowcount == 1
+
+    def release(self, key: str):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+
+class RedisBackend:
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "quantiq:"):
+        import redis  # optional: only needed for CACHE_BACKEND=redis
+        self._r = redis.Redis.from_url(url, socket_timeout=2)
+        self.prefix = prefix
+
+    def get(self, key: str):
+        raw = self._r.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set_many(self, items: list, expire: float):
+        pipe = self._r.pipeline(transaction=False)
+        for key, entry in items:
+            pipe.set(self.prefix + key, pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL), ex=int(expire))
+        pipe.execute()
+
+    def claim(self, key: str, ttl: float) -> bool:
+        return bool(self._r.set(self.prefix + key, b"1", nx=True, px=int(ttl * 1000)))
+
+    def release(self, key: str):
+        self._r.delete(self.prefix + key)
+
+
+class SharedCache:
+    """In-process L1 dict in front of a shared L2 backend; L2 errors degrade to L1-only."""
+
+    def __init__(self, backend=None, expire: float = EXPIRE):
+        self.backend = backend or MemoryBackend()
+        self.expire = expire
+        self._l1: dict = {}
+        self._lock = threading.Lock()
+        self.counts = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "errors": 0}
+        self.namespaces: dict = {}  # key prefix ('hist', 'nse', 'info', ...) → hit/miss/eviction counts
+
+    def _count(self, key: str, what: str):
+        ns = self.namespaces.get(key.split(":", 1)[0])
+        if ns is None:
+            ns = self.namespaces.setdefault(key.split(":", 1)[0],
+                                            {"l1_hits": 0, "l2_hits": 0, "misses": 0, "evictions": 0})
+        ns[what] += 1
+
+    def _fresh(self, entry, ttl: float) -> bool:
+        return entry is not None and time.time() - entry[0] < ttl
+
+    def get(self, key: str, ttl: float):
+        entry = self._l1.get(key)
+        if self._fresh(entry, ttl):
+            self.counts["l1_hits"] += 1
+            self._count(key, "l1_hits")
+            return entry[1]
+        if self.backend.name != "memory":
+            try:
+                with span("cache.l2_get", namespace=key.split(":", 1)[0], backend=self.backend.name):
+                    entry = self.backend.get(key)
+            except Exception as e:
+                self.counts["errors"] += 1
+                print(f"[cache] {self.backend.name} get failed {key}: {e}")
+                entry = None
+            if self._fresh(entry, ttl):
+                self.counts["l2_hits"] += 1
+                self._count(key, "l2_hits")
+                self._remember(key, entry)
+                return entry[1]
+        self.counts["misses"] += 1
+        self._count(key, "misses")
+        return None
+
+    def put(self, key: str, val):
+        self.put_many({key: val})
+        return val
+
+    def put_many(self, items: dict):
+        now = time.time()
+        entries = [(key, (now, val)) for key, val in items.items()]
+        for key, entry in entries:
+            self._remember(key, entry)
+        if self.backend.name != "memory":
+            try:
+                self.backend.set_many(entries, self.expire)
+            except Exception as e:
+                self.counts["errors"] += 1
+                print(f"[cache] {self.backend.name} set failed: {e}")
+
+    def _remember(self, key: str, entry):
+        with self._lock:
+            if len(self._l1) >= L1_MAX_ENTRIES and key not in self._l1:
+                # Drop the oldest-written tenth; refetch is the worst case
+                for k in sorted(self._l1, key=lambda k: self._l1[k][0])[:L1_MAX_ENTRIES // 10]:
+                    del self._l1[k]
+                    self._count(k, "evictions")
+            self._l1[key] = entry
+
+    def claim(self, key: str, ttl: float = 10.0) -> bool:
+        """Set-if-absent lease on `key` across workers; False while another holder has it."""
+        try:
+            return self.backend.claim("claim:" + key, ttl)
+        except Exception as e:
+            print(f"[cache] {self.backend.name} claim failed {key}: {e}")
+            return True  # fail open: fetching ourselves beats returning nothing
+
+    def release(self, key: str):
+        try:
+            self.backend.release("claim:" + key)
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        return {"backend": self.backend.name, "l1_entries": len(self._l1), **self.counts}
+
+
+def make_cache(kind: str = "memory", url: str = "") -> SharedCache:
+    """SharedCache for CACHE_BACKEND / CACHE_URL; falls back to memory if the backend is unavailable."""
+    try:
+        if kind == "sqlite":
+            return SharedCache(SQLiteBackend(url or SQLITE_PATH))
+        if kind == "redis":
+            return SharedCache(RedisBackend(url or "redis://localhost:6379/0"))
+    except Exception as e:
+        print(f"[cache] {kind} backend unavailable ({e}); using per-process memory")
+    return SharedCache(MemoryBackend())
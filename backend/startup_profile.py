@@ -0,0 +1,84 @@
+"""
+Start-up cost report for the API process.
+Imports the app in a fresh interpreter under `python -X importtime` and folds
+the per-module timings into top-level packages, so a heavy import creeping
+back to module level shows up by name instead of as a slower cold start.
+
+    python startup_profile.py             # slowest packages and direct imports
+    python startup_profile.py --json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+# Deferred to first use; none of these should be loaded by `import app`
+DEFERRED = ('sklearn', 'scipy', 'joblib', 'yfinance', 'groq', 'vaderSentiment')
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def profile_imports(target: str = 'app', top: int = 15) -> dict:
+    """Import `target` in a subprocess and report where the time went (ms)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {target}'],
+                          capture_output=True, text=True, cwd=here, timeout=300)
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2, m.group(4)))
+    if not rows:
+        return {'target': target, 'error': proc.stderr.strip()[-500:] or 'no importtime output'}
+
+    total = next((cum for _, cum, depth, name in rows if name == target and depth == 0), sum(r[0] for r in rows))
+    packages: dict = {}
+    for self_us, _, _, name in rows:
+        pkg = name.split('.')[0]
+        packages[pkg] = packages.get(pkg, 0) + self_us
+    direct = [(name, cum) for _, cum, depth, name in rows if depth == 1]
+    loaded = {name.split('.')[0] for *_, name in rows}
+
+    return {
+        'target': target,
+        'total_ms': round(total / 1000, 1),
+        'modules': len(rows),
+        'packages': [{'package': p, 'self_ms': round(us / 1000, 1)}
+                     for p, us in sorted(packages.items(), key=lambda kv: -kv[1])[:top]],
+        'direct_imports': [{'module': n, 'cumulative_ms': round(us / 1000, 1)}
+                           for n, us in sorted(direct, key=lambda kv: -kv[1])[:top]],
+        'deferred_but_loaded': [p for p in DEFERRED if p in loaded],
+    }
+
+
+def deferred_loaded() -> list:
+    """Deferred packages the current process has imported so far."""
+    return [p for p in DEFERRED if p in sys.modules]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('target', nargs='?', default='app')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    report = profile_imports(args.target, args.top)
+    if args.json or 'error' in report:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"import {report['target']}: {report['total_ms']:.0f} ms over {report['modules']} modules")
+    print("\nby package (self time):")
+    for p in report['packages']:
+        print(f"  {p['self_ms']:8.1f} ms  {p['package']}")
+    print(f"\ndirect imports of {report['target']} (cumulative):")
+    for d in report['direct_imports']:
+        print(f"  {d['cumulative_ms']:8.1f} ms  {d['module']}")
+    if report['deferred_but_loaded']:
+        print(f"\nWARNING: loaded at import time despite being deferred: {', '.join(report['deferred_but_loaded'])}")
+
+
+if __name__ == '__main__':
+    main()
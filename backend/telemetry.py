@@ -0,0 +1,206 @@
+"""
+Process metrics in the Prometheus text format, served on /metrics.
+Counters, gauges and histograms are plain in-process objects (no client
+library). With several uvicorn workers each scrape sees the worker that
+answered it, so rates stay correct but absolute values are per worker.
+Components that already keep their own counts (caches, the live hub) are read
+at scrape time through collectors instead of being instrumented twice.
+"""
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+
+from tracing import span
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(names, escaped)) + '}'
+
+
+def _num(v: float) -> str:
+    if v == float('inf'):
+        return '+Inf'
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._series: dict = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(k, '') for k in self.label_names)
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, value in series:
+            lines.extend(self._sample_lines(key, value))
+        return lines
+
+    def _sample_lines(self, key: tuple, value) -> list:
+        return [f'{self.name}{_labels(self.label_names, key)} {_num(value)}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._series[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    s[0][i] += 1
+                    break
+            s[1] += value
+            s[2] += 1
+
+    def _sample_lines(self, key: tuple, value) -> list:
+        counts, total, n = value
+        names = self.label_names + ('le',)
+        lines, cum = [], 0
+        for b, c in zip(self.buckets, counts):
+            cum += c
+            lines.append(f'{self.name}_bucket{_labels(names, key + (_num(b),))} {cum}')
+        lines.append(f'{self.name}_bucket{_labels(names, key + ("+Inf",))} {n}')
+        lines.append(f'{self.name}_sum{_labels(self.label_names, key)} {_num(total)}')
+        lines.append(f'{self.name}_count{_labels(self.label_names, key)} {n}')
+        return lines
+
+
+# ── Registry ──────────────────────────────────────────────────────────────────
+
+_metrics: list = []
+_collectors: list = []
+
+
+def _register(metric):
+    _metrics.append(metric)
+    return metric
+
+
+def collector(fn):
+    """Register fn() → [(name, kind, help, [(labels_dict, value), ...])], called at scrape time."""
+    _collectors.append(fn)
+    return fn
+
+
+def render() -> str:
+    """Every registered metric and collector in Prometheus text exposition format 0.0.4."""
+    lines = []
+    for m in _metrics:
+        lines.extend(m.render())
+    for fn in _collectors:
+        try:
+            families = fn()
+        except Exception as e:
+            print(f"[telemetry] collector {fn.__name__} failed: {e}")
+            continue
+        for name, kind, help, samples in families:
+            lines += [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+            for labels, value in samples:
+                names = tuple(labels)
+                lines.append(f'{name}{_labels(names, tuple(labels[k] for k in names))} {_num(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+# ── Standard series ───────────────────────────────────────────────────────────
+
+http_latency = _register(Histogram(
+    'quantiq_http_request_duration_seconds',
+    'Time to response start per route (streams: until the first byte)', ('method', 'route', 'status')))
+upstream_latency = _register(Histogram(
+    'quantiq_upstream_request_duration_seconds', 'Upstream call latency', ('upstream', 'op')))
+upstream_calls = _register(Counter(
+    'quantiq_upstream_requests_total', 'Upstream calls by outcome', ('upstream', 'op', 'outcome')))
+loop_lag = _register(Histogram(
+    'quantiq_event_loop_lag_seconds', 'Event-loop scheduling delay of a periodic probe', buckets=LAG_BUCKETS))
+active_streams = _register(Gauge(
+    'quantiq_active_streams', 'Open WebSocket connections and SSE responses', ('kind',)))
+process_start = _register(Gauge('quantiq_process_start_time_seconds', 'Worker start time, unix seconds'))
+process_start.set(time.time())
+
+
+@contextmanager
+def upstream(name: str, op: str):
+    """Time one call to an upstream (yfinance, nse, groq). Set call['ok'] = False for soft failures.
+
+    Also recorded as a `<name>.<op>` span when the caller is inside a trace.
+    """
+    call = {'ok': True}
+    t0 = time.perf_counter()
+    try:
+        with span(f'{name}.{op}') as s:
+            yield call
+            if s is not None and not call['ok']:
+                s.attrs['error'] = 'bad response'
+    except Exception:  # not cancellation or a closed stream
+        call['ok'] = False
+        raise
+    finally:
+        upstream_latency.observe(time.perf_counter() - t0, upstream=name, op=op)
+        upstream_calls.inc(upstream=name, op=op, outcome='ok' if call['ok'] else 'error')
+
+
+@contextmanager
+def stream(kind: str):
+    """Count an open WebSocket / SSE response for its lifetime."""
+    active_streams.inc(kind=kind)
+    try:
+        yield
+    finally:
+        active_streams.dec(kind=kind)
+
+
+async def monitor_loop_lag(interval: float = 0.5):
+    """Sleep `interval` forever and record how late each wake-up was."""
+    loop = asyncio.get_running_loop()
+    while True:
+        t0 = loop.time()
+        await asyncio.sleep(interval)
+        loop_lag.observe(max(0.0, loop.time() - t0 - interval))
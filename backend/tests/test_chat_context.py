@@ -0,0 +1,25 @@
+from chat_context import build_chat_context
+
+
+def test_section_header_kept_when_body_is_under_a_sub_header():
+    context = {'backtest': {'ticker': 'TCS', 'metrics_by_event': {
+        'earnings': {'total_events': 8, 'avg_return': 0.012, 'win_rate': 0.6, 'std_dev': 0.03, 'sharpe': 1.1},
+    }}}
+    lines = build_chat_context(context).splitlines()
+    assert lines[:2] == ['## Backtest: TCS', 'By event type:']
+    assert lines[2].startswith('- earnings:')
+
+
+def test_headers_without_body_are_dropped():
+    context = {
+        'backtest': {'ticker': 'TCS', 'metrics_by_event': {
+            'earnings': {'total_events': 8, 'avg_return': 0.012, 'win_rate': 0.6, 'std_dev': 0.03, 'sharpe': 1.1}},
+                     'event_returns': [{'date': '2024-01-10', 'total_return': 0.02}]},
+        'stock': {'company': 'Infosys', 'quote': {'current': 1500.0}},
+    }
+    full = build_chat_context(context).splitlines()
+    assert 'Best trades:' in full and '## Stock: Infosys' in full
+
+    # Both backtest headers fit, but none of their body lines do
+    tight = build_chat_context(context, budget_tokens=20).splitlines()
+    assert tight == ['## Stock: Infosys', 'Price ₹1,500.00']
@@ -0,0 +1,44 @@
+import numpy as np
+
+from event_calendar import EventCalendar
+
+
+def test_curated_preferred_over_series_loaded_from_disk(tmp_path):
+    path = str(tmp_path / 'calendar.npz')
+    fetched = EventCalendar(path, fetchers={('earnings', 'yfinance'): lambda s: ['2030-01-20']})
+    fetched.dates('earnings', 'TCS', 'yfinance')
+    fetched.save()
+
+    cal = EventCalendar(path, fetchers={('earnings', 'yfinance'): lambda s: ['2030-01-20']})
+    cal.seed('earnings', 'curated', {'TCS': ['2030-01-10']})
+    assert cal.sources('earnings', 'TCS') == ['curated', 'yfinance']
+    assert cal.upcoming('TCS', kinds=('earnings',), now='2030-01-01') == [{'date': '2030-01-10', 'type': 'earnings'}]
+    assert cal.dates('earnings', 'TCS', 'yfinance', fetch=False)[0] == np.datetime64('2030-01-20')
+
+
+def test_off_universe_symbols_are_not_tracked_or_persisted(tmp_path):
+    path = str(tmp_path / 'calendar.npz')
+    upstream = {'TCS': ['2030-01-20'], 'ZOMATO': ['2030-02-01']}
+    fetchers = {('earnings', 'yfinance'): lambda s: upstream.get(s, [])}
+    cal = EventCalendar(path, fetchers=fetchers, universe={'TCS'})
+    for symbol in ('TCS', 'ZOMATO', 'NOTATICKER'):
+        cal.dates('earnings', symbol, 'yfinance')
+    assert cal._tracked == {'TCS'}
+    assert cal.stats()['series'] == 2  # the empty junk result is not kept
+
+    reloaded = EventCalendar(path, fetchers=fetchers, universe={'TCS'})
+    assert reloaded._tracked == {'TCS'}
+    assert len(reloaded.dates('earnings', 'ZOMATO', 'yfinance', fetch=False)) == 1
+
+
+def test_follower_reloads_when_the_refreshing_worker_saves(tmp_path):
+    path = str(tmp_path / 'calendar.npz')
+    fetchers = {('earnings', 'yfinance'): lambda s: ['2030-01-20']}
+    follower = EventCalendar(path, fetchers=fetchers)
+    assert not follower.reload_if_changed()  # nothing written yet
+
+    writer = EventCalendar(path, fetchers=fetchers)
+    writer.dates('earnings', 'TCS', 'yfinance')  # first lookup fetches and saves
+    assert follower.reload_if_changed()
+    assert len(follower.dates('earnings', 'TCS', 'yfinance', fetch=False)) == 1
+    assert not follower.reload_if_changed()
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+import flat_forest
+from flat_forest import FlatForest
+
+
+def _data(n=400, n_feat=6, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, n_feat))
+    return X, X[:, 0] + 0.5 * rng.normal(size=n)
+
+
+@pytest.mark.parametrize("max_depth", [3, None])
+def test_classifier_proba_bit_identical(max_depth, monkeypatch):
+    X, y = _data()
+    clf = RandomForestClassifier(n_estimators=30, max_depth=max_depth, random_state=0).fit(X, y > 0)
+    flat = FlatForest.from_sklearn(clf)
+    Xt, _ = _data(n=700, seed=1)
+    # Small blocks so the batch spans several, including a ragged last one
+    monkeypatch.setattr(flat_forest, "BLOCK_ELEMS", 30 * 64)
+    assert np.array_equal(flat.predict_proba(Xt), clf.predict_proba(Xt))
+    assert np.array_equal(flat.predict(Xt), clf.predict(Xt))
+
+
+def test_regressor_bit_identical():
+    X, y = _data()
+    reg = RandomForestRegressor(n_estimators=30, max_depth=6, random_state=0).fit(X, y)
+    Xt, _ = _data(n=50, seed=2)
+    assert np.array_equal(FlatForest.from_sklearn(reg).predict(Xt), reg.predict(Xt))
+
+
+def test_missing_values_follow_sklearn():
+    X, y = _data()
+    X[::7, 1] = np.nan
+    try:
+        clf = RandomForestClassifier(n_estimators=20, max_depth=5, random_state=0).fit(X, y > 0)
+    except ValueError:
+        pytest.skip("this sklearn cannot fit forests on NaN")
+    Xt, _ = _data(n=100, seed=3)
+    Xt[::3, 1] = np.nan
+    assert np.array_equal(FlatForest.from_sklearn(clf).predict_proba(Xt), clf.predict_proba(Xt))
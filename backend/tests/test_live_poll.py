@@ -0,0 +1,19 @@
+import itertools
+
+import app
+
+
+def test_each_fresh_nse_quote_reaches_bars_and_detector(monkeypatch):
+    ticks = itertools.count()
+    monkeypatch.setattr(app, 'get_stock_data', lambda s: {'quote': {'current': 100.0, 'previous_close': 99.0}})
+
+    def live(sym):
+        i = next(ticks)
+        return {'current': 100.0 + i, 'previous_close': 99.0, 'volume': 1000 + 10 * i}
+    monkeypatch.setattr(app, 'get_nse_live_quote', live)
+
+    prices = [app._poll_live('LIVETEST.NS')[0]['data']['current'] for _ in range(5)]
+    assert prices == [100.0, 101.0, 102.0, 103.0, 104.0]
+    assert app.tick_anomalies._states['LIVETEST.NS']['n'] == 4  # first sighting seeds the state
+    bar = app.bars.frame('LIVETEST', '1m').iloc[-1]
+    assert (bar['high'], bar['close']) == (104.0, 104.0)
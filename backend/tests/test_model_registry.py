@@ -0,0 +1,48 @@
+import pandas as pd
+
+from model_registry import ModelRegistry, data_version
+
+
+def _bars(days):
+    idx = pd.bdate_range('2024-01-01', periods=days)
+    return pd.DataFrame({'close': range(100, 100 + days)}, index=idx, dtype=float)
+
+
+def test_data_version_ignores_todays_bar():
+    df = _bars(10)
+    today = df.index[-1]
+    live = df.copy()
+    live.iloc[-1, 0] += 3.5  # in-progress bar updated by a cache refresh
+    assert data_version(df, today=today) == data_version(live, today=today)
+    assert data_version(df, today=today) != data_version(df, today=today + pd.Timedelta(days=1))
+    edited = df.copy()
+    edited.iloc[0, 0] += 1  # re-adjusted history
+    assert data_version(df, today=today) != data_version(edited, today=today)
+
+
+def test_stale_memory_entry_reloads_newer_file(tmp_path):
+    a, b = ModelRegistry(str(tmp_path)), ModelRegistry(str(tmp_path))
+    a.put('X', 'regime', {}, 'v1', {'model': 1})
+    assert b.get('X', 'regime', {}, 'v1') == {'model': 1}
+    a.put('X', 'regime', {}, 'v2', {'model': 2})  # e.g. pretrain.py in another process
+
+    def refit():
+        raise AssertionError('should load the stored v2 bundle')
+    assert b.get_or_fit('X', 'regime', {}, 'v2', refit) == {'model': 2}
+
+
+def test_failed_fit_is_not_persisted(tmp_path):
+    reg = ModelRegistry(str(tmp_path), error_ttl=60)
+    calls = []
+
+    def failing():
+        calls.append(1)
+        return {'error': 'Not enough data'}
+    assert 'error' in reg.get_or_fit('X', 'anomaly', {}, 'v1', failing)
+    assert 'error' in reg.get_or_fit('X', 'anomaly', {}, 'v1', failing)
+    assert len(calls) == 1
+    assert reg.latest('X', 'anomaly', {}) is None
+    assert ModelRegistry(str(tmp_path)).latest('X', 'anomaly', {}) is None
+
+    reg.error_ttl = 0
+    assert reg.get_or_fit('X', 'anomaly', {}, 'v1', lambda: {'model': 1}) == {'model': 1}
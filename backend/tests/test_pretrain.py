@@ -0,0 +1,27 @@
+import pandas as pd
+
+import indian_market
+import pretrain
+from ml_signals import MLSignalEngine
+
+
+def _patch(monkeypatch, earnings=None, regime=None, anomaly=None):
+    prices = pd.DataFrame({'close': [1.0, 2.0]}, index=pd.date_range('2024-01-01', periods=2))
+    monkeypatch.setattr(indian_market, 'get_historical_prices', lambda s, period: prices)
+    monkeypatch.setattr(indian_market, 'get_earnings_history', lambda s, a, b: [])
+    monkeypatch.setattr(MLSignalEngine, 'earnings_model', lambda self, *a: earnings or {'n_samples': 8})
+    monkeypatch.setattr(MLSignalEngine, 'regime_model', lambda self, *a: regime or {})
+    monkeypatch.setattr(MLSignalEngine, 'anomaly_model', lambda self, *a: anomaly or {})
+
+
+def test_symbol_status_reflects_fit_errors(monkeypatch, tmp_path):
+    _patch(monkeypatch)
+    assert pretrain._pretrain_symbol('TCS', 1, str(tmp_path))['status'] == 'ok'
+
+    _patch(monkeypatch, regime={'error': 'too short'})
+    res = pretrain._pretrain_symbol('TCS', 1, str(tmp_path))
+    assert (res['status'], res['errors']) == ('partial', {'regime': 'too short'})
+
+    err = {'error': 'no data'}
+    _patch(monkeypatch, earnings=err, regime=err, anomaly=err)
+    assert pretrain._pretrain_symbol('TCS', 1, str(tmp_path))['status'] == 'failed'
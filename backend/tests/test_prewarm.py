@@ -0,0 +1,27 @@
+from prewarm import PrewarmJob
+
+
+def _job(held: set) -> PrewarmJob:
+    def claim():
+        if 'prewarm' in held:
+            return False
+        held.add('prewarm')
+        return True
+    job = PrewarmJob(claim=claim, release=lambda: held.discard('prewarm'))
+    job._run = lambda symbols: None
+    return job
+
+
+def test_claim_is_released_when_the_run_ends():
+    held = set()
+    job = _job(held)
+    job._run_claimed([], claimed=job.claim())
+    assert held == set()
+    assert _job(held).start(['TCS'])  # the next run can take the claim again
+
+
+def test_forced_run_leaves_another_holders_claim_alone():
+    held = {'prewarm'}
+    job = _job(held)
+    job._run_claimed([], claimed=False)
+    assert held == {'prewarm'}
@@ -0,0 +1,56 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from ml_signals import MLSignalEngine, RegimeTracker
+
+
+def _bars(days, seed=0):
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range('2023-01-02', periods=days)
+    return pd.DataFrame({'close': 1000 * np.exp(np.cumsum(rng.normal(0, 0.015, days)))}, index=idx)
+
+
+def test_partial_session_is_peeked_not_committed():
+    df = _bars(300)
+    today = df.index[-1]
+    tracker = MLSignalEngine().regimes
+    first = tracker.update('X', df, today=today)
+    st = tracker._states['X']
+    assert st['last_date'] == df.index[-2]
+    assert list(st['closes'])[-1] == df['close'].iloc[-2]
+    assert first['provisional'] and first['as_of'] == df.index[-2].strftime('%Y-%m-%d')
+
+    moved = df.copy()
+    moved.iloc[-1, 0] *= 1.2  # the same session, later in the day
+    tracker.update('X', moved, today=today)
+    assert tracker._states['X'] is st and list(st['closes'])[-1] == df['close'].iloc[-2]
+
+    tracker.update('X', moved, today=today + pd.Timedelta(days=1))  # the session has closed
+    assert st['last_date'] == df.index[-1]
+    assert list(st['closes'])[-1] == moved['close'].iloc[-1]
+
+
+def test_cold_fit_does_not_block_other_symbols():
+    engine = MLSignalEngine()
+    tracker = RegimeTracker(engine)
+    df = _bars(300)
+    tracker.update('WARM', df)
+    fit = engine.regime_model
+    started = threading.Event()
+
+    def slow_fit(symbol, prices_df):
+        started.set()
+        time.sleep(0.5)
+        return fit(symbol, prices_df)
+    engine.regime_model = slow_fit
+    worker = threading.Thread(target=tracker.update, args=('COLD', _bars(300, seed=1)))
+    worker.start()
+    started.wait(2)
+    t0 = time.perf_counter()
+    assert tracker.peek('WARM', float(df['close'].iloc[-1])) is not None
+    assert time.perf_counter() - t0 < 0.2
+    worker.join()
+    assert 'COLD' in tracker._states
@@ -0,0 +1,36 @@
+import asyncio
+
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+import app
+from tracing import span
+
+
+@app.app.get('/api/test/stream')
+async def _stream():
+    async def generate():
+        for i in range(3):
+            with span('stream.chunk', i=i):
+                await asyncio.sleep(0.02)
+            yield f"data: {i}\n\n"
+    return StreamingResponse(generate(), media_type="text/event-stream")
+
+
+def test_sse_spans_land_in_the_stored_trace():
+    client = TestClient(app.app)
+    resp = client.get('/api/test/stream', headers={'X-Trace': '1'})
+    assert resp.text.count('data:') == 3
+    tr = client.get(f"/api/debug/traces/{resp.headers['X-Trace-Id']}").json()
+    assert [s['name'] for s in tr['span_tree']].count('stream.chunk') == 3
+    assert not any(s.get('open') for s in tr['span_tree'])
+    assert tr['duration_ms'] >= 60  # the trace covers the streamed body, not just the handler
+
+
+def test_trace_profile_needs_debug_token(monkeypatch):
+    monkeypatch.setattr(app, 'DEBUG_TOKEN', 'secret')
+    client = TestClient(app.app)
+    resp = client.get('/api/test/stream', headers={'X-Profile': '1', 'X-Debug-Token': 'secret'})
+    url = f"/api/debug/traces/{resp.headers['X-Trace-Id']}"
+    assert client.get(url).json()['profile'] == app._DEBUG_DENIED
+    assert 'samples' in client.get(url, headers={'X-Debug-Token': 'secret'}).json()['profile']
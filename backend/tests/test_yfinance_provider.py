@@ -0,0 +1,8 @@
+import yfinance_provider
+
+
+def test_sentiment_analyzer_builds_once():
+    yfinance_provider._analyzer = None
+    analyzer = yfinance_provider._sentiment_analyzer()
+    assert analyzer is yfinance_provider._sentiment_analyzer()
+    assert analyzer.polarity_scores('Profits surge to a record high')['compound'] > 0
@@ -0,0 +1,317 @@
+"""
+Per-request span tracing and on-demand sampling profiles.
+A trace is opened per request by the HTTP middleware; `span()` blocks nest
+under whatever span is current in the calling context. The current span lives
+in a ContextVar, so it follows asyncio tasks, asyncio.to_thread and
+FastAPI's threadpool for sync routes; for a hand-made executor or thread,
+submit `bind(fn)` to carry the context across.
+
+Outside a trace `span()` is a ContextVar lookup (~2µs). Finished traces are
+kept in a ring of recent ones plus a list of the slowest. A trace started with
+profile=True also runs a stack sampler over every thread that entered one of
+its spans, so the time inside a single opaque call (t.info, a model fit) can
+be attributed to the functions underneath it.
+"""
+import contextvars
+import functools
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+_span: contextvars.ContextVar = contextvars.ContextVar('span', default=None)
+
+SAMPLE_INTERVAL = 0.005
+MAX_SPANS = 2000      # per trace; a runaway loop of spans stops recording, not the request
+MAX_STACK = 64
+
+
+class Span:
+    __slots__ = ('trace', 'parent', 'name', 'attrs', 'start', 'end', 'thread')
+
+    def __init__(self, trace, parent, name: str, attrs: dict):
+        self.trace = trace
+        self.parent = parent
+        self.name = name
+        self.attrs = attrs
+        self.thread = threading.get_ident()
+        self.start = time.perf_counter()
+        self.end = None
+
+
+class Trace:
+    def __init__(self, name: str, profile: bool = False):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.spans: list = []
+        self.threads: set = set()
+        self.attrs: dict = {}
+        self.duration = None
+        self.sampler = StackSampler(self) if profile else None
+
+    def to_dict(self, spans: bool = True) -> dict:
+        out = {
+            'id': self.id,
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_ms': round(self.duration * 1000, 2) if self.duration is not None else None,
+            'spans': len(self.spans),
+            'profiled': self.sampler is not None,
+            **self.attrs,
+        }
+        if not spans:
+            return out
+        ids = {id(s): i for i, s in enumerate(self.spans)}
+        out['breakdown'] = self.breakdown()
+        out['span_tree'] = [{
+            'id': i,
+            'parent': ids.get(id(s.parent)),
+            'name': s.name,
+            'start_ms': round((s.start - self.t0) * 1000, 2),
+            'duration_ms': round(((s.end or time.perf_counter()) - s.start) * 1000, 2),
+            'thread': s.thread,
+            **({'attrs': s.attrs} if s.attrs else {}),
+            **({'open': True} if s.end is None else {}),
+        } for i, s in enumerate(self.spans)]
+        if self.sampler is not None:
+            out['profile'] = self.sampler.report()
+        return out
+
+    def breakdown(self) -> list:
+        """Self time per span name (ms): a span's duration minus its children's."""
+        child = {}
+        for s in self.spans:
+            if s.parent is not None and s.end is not None:
+                child[id(s.parent)] = child.get(id(s.parent), 0.0) + (s.end - s.start)
+        by_name: dict = {}
+        for s in self.spans:
+            if s.end is None:
+                continue
+            total, own, n = by_name.get(s.name, (0.0, 0.0, 0))
+            dur = s.end - s.start
+            # Children on other threads can overlap their parent; clamp self time at zero
+            by_name[s.name] = (total + dur, own + max(0.0, dur - child.get(id(s), 0.0)), n + 1)
+        return [{'name': k, 'count': n, 'total_ms': round(t * 1000, 2), 'self_ms': round(o * 1000, 2)}
+                for k, (t, o, n) in sorted(by_name.items(), key=lambda kv: -kv[1][1])]
+
+    def server_timing(self, top: int = 8) -> str:
+        """Server-Timing header value: the largest self-time span names."""
+        parts = []
+        for b in self.breakdown()[:top]:
+            name = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in b['name'])
+            parts.append(f"{name};dur={b['self_ms']}")
+        return ', '.join(parts)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block as a child of the current span; a no-op outside a trace."""
+    parent = _span.get()
+    if parent is None or len(parent.trace.spans) >= MAX_SPANS:
+        yield None
+        return
+    s = Span(parent.trace, parent, name, attrs)
+    parent.trace.spans.append(s)
+    parent.trace.threads.add(s.thread)
+    token = _span.set(s)
+    try:
+        yield s
+    except Exception as e:
+        s.attrs['error'] = type(e).__name__
+        raise
+    finally:
+        s.end = time.perf_counter()
+        _span.reset(token)
+
+
+def traced(name: str = None):
+    """Decorator form of span(); defaults to the function's qualified name."""
+    def wrap(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with span(label):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def bind(fn):
+    """fn bound to the caller's context, for executor.submit / threading.Thread targets."""
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
+
+def current_trace():
+    s = _span.get()
+    return s.trace if s is not None else None
+
+
+# ── Stack sampler ─────────────────────────────────────────────────────────────
+
+class StackSampler:
+    """Samples the stacks of a trace's threads at a fixed interval while it runs.
+
+    The event-loop thread is shared with other requests, so samples taken there
+    while this request is awaiting belong to whatever else was running.
+    """
+
+    def __init__(self, trace: Trace, interval: float = SAMPLE_INTERVAL):
+        self.trace = trace
+        self.interval = interval
+        self.stacks: dict = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"sampler-{self.trace.id}")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for tid in list(self.trace.threads):
+                frame = frames.get(tid)
+                if frame is None or tid == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                key = tuple(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+                self.samples += 1
+
+    def report(self, top: int = 25) -> dict:
+        own: dict = {}
+        inclusive: dict = {}
+        for stack, n in self.stacks.items():
+            leaf = stack[-1].rsplit(':', 1)[0] + ')'
+            own[leaf] = own.get(leaf, 0) + n
+            for fn in {f.rsplit(':', 1)[0] + ')' for f in stack}:
+                inclusive[fn] = inclusive.get(fn, 0) + n
+        ms = self.interval * 1000
+
+        def _top(d):
+            return [{'function': k, 'samples': v, 'approx_ms': round(v * ms, 1)}
+                    for k, v in sorted(d.items(), key=lambda kv: -kv[1])[:top]]
+        return {
+            'interval_ms': ms,
+            'samples': self.samples,
+            'self': _top(own),
+            'inclusive': _top(inclusive),
+            # flamegraph.pl / speedscope "collapsed" format
+            'collapsed': [f"{';'.join(s)} {n}" for s, n in sorted(self.stacks.items(), key=lambda kv: -kv[1])[:top]],
+        }
+
+
+# ── Trace store ───────────────────────────────────────────────────────────────
+
+class TraceStore:
+    """Recent and slowest finished traces, plus profile requests armed for upcoming requests."""
+
+    def __init__(self, sample_rate: float = 1.0, keep: int = 200):
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.recent: deque = deque(maxlen=keep)
+        self.slowest: list = []
+        self._by_id: dict = {}
+        self._armed: list = []  # [path_prefix, remaining]
+        self._lock = threading.Lock()
+
+    def should_trace(self) -> bool:
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def arm(self, path_prefix: str, count: int = 1):
+        """Profile the next `count` requests whose path starts with `path_prefix`."""
+        with self._lock:
+            self._armed.append([path_prefix, max(1, count)])
+
+    def take_armed(self, path: str) -> bool:
+        with self._lock:
+            for entry in self._armed:
+                if path.startswith(entry[0]):
+                    entry[1] -= 1
+                    if entry[1] <= 0:
+                        self._armed.remove(entry)
+                    return True
+        return False
+
+    def armed(self) -> list:
+        with self._lock:
+            return [{'path_prefix': p, 'remaining': n} for p, n in self._armed]
+
+    @contextmanager
+    def trace(self, name: str, profile: bool = False, finish: bool = True):
+        """Open a trace with a root span, current for the block.
+
+        It is stored when the block exits or, with finish=False, when `finish`
+        is called: work that outlives the block (a streamed response body)
+        still runs under the root span and is recorded.
+        """
+        tr = Trace(name, profile)
+        root = Span(tr, None, 'handler', {})
+        tr.spans.append(root)
+        tr.threads.add(root.thread)
+        token = _span.set(root)
+        if tr.sampler is not None:
+            tr.sampler.start()
+        try:
+            yield tr
+        finally:
+            _span.reset(token)
+            if finish:
+                self.finish(tr)
+
+    def finish(self, tr: Trace):
+        """End a trace's root span and store it; later calls are no-ops."""
+        with self._lock:
+            if tr.duration is not None:
+                return
+            root = tr.spans[0]
+            root.end = time.perf_counter()
+            tr.duration = root.end - root.start
+        if tr.sampler is not None:
+            tr.sampler.stop()
+        self._add(tr)
+
+    def _add(self, tr: Trace):
+        with self._lock:
+            if len(self.recent) == self.recent.maxlen:
+                old = self.recent[0]
+                if old not in self.slowest:
+                    self._by_id.pop(old.id, None)
+            self.recent.append(tr)
+            self._by_id[tr.id] = tr
+            self.slowest.append(tr)
+            self.slowest.sort(key=lambda t: -t.duration)
+            for dropped in self.slowest[self.keep // 4:]:
+                if dropped not in self.recent:
+                    self._by_id.pop(dropped.id, None)
+            del self.slowest[self.keep // 4:]
+
+    def get(self, trace_id: str):
+        with self._lock:
+            return self._by_id.get(trace_id)
+
+    def list(self, limit: int = 20, slow: bool = False, name: str = None) -> list:
+        with self._lock:
+            pool = list(self.slowest) if slow else list(reversed(self.recent))
+        if name:
+            pool = [t for t in pool if name in t.name]
+        return [t.to_dict(spans=False) for t in pool[:limit]]
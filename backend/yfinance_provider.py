@@ -6,10 +6,18 @@ import yfinance as yf
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 import time
 
-_sentiment_analyzer = SentimentIntensityAnalyzer()
+_analyzer = None
+
+
+def _sentiment_analyzer():
+    """VADER analyzer, built on first use (loading its lexicon is not free)."""
+    global _analyzer
+    if _analyzer is None:
+        from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+        _analyzer = SentimentIntensityAnalyzer()
+    return _analyzer
 
 # Simple TTL cache: {key: (timestamp, value)}
 _cache: dict = {}
@@ -110,7 +118,7 @@ def get_news_yf(ticker: str, n: int = 10) -> list:
         result = []
         for article in articles[:n]:
             title = article.get("title", "")
-            sentiment = _sentiment_analyzer.polarity_scores(title)["compound"]
+            sentiment = _sentiment_analyzer().polarity_scores(title)["compound"]
             result.append({
                 "title": title,
                 "publisher": article.get("publisher", ""),
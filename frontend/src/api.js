@@ -36,7 +36,7 @@ export const api = {
     new EventSource(`${API_BASE}/api/ai/research/${ticker}`),
 
   // ── WebSocket ─────────────────────────────────────────────────────────────
-  connectWebSocket: (ticker) => new WebSocket(`${WS_BASE}/ws/${ticker}`),
+  connectWebSocket: (ticker) => new WebSocket(`${WS_BASE}/ws/${ticker}?v=2`),
 };
 
 export default api;
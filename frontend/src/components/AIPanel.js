@@ -83,7 +83,7 @@ function ChatTab({ backtestData, ticker }) {
         ticker,
         overall_metrics: backtestData.overall_metrics,
         metrics_by_event: backtestData.metrics_by_event,
-        top_trades: backtestData.event_returns?.slice(0, 5),
+        event_returns: backtestData.event_returns,
       } : null;
 
       const res = await api.streamChat(updated, context);
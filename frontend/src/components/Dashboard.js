@@ -51,7 +51,8 @@ function Dashboard({ activeTab }) {
     websocket.onmessage = (event) => {
       try {
         const data = JSON.parse(event.data);
-        if (data.type === 'price_update') {
+        // v2 feed: a snapshot on subscribe, then deltas with only the changed fields
+        if (data.type === 'snapshot' || data.type === 'delta') {
           setStockData(prev => prev ? {
             ...prev,
             quote: { ...prev.quote, ...data.data }